@@ -1 +1,190 @@
-# Python package
\ No newline at end of file
+"""
+APP FACTORY - Builds the Flask application
+==========================================
+
+Rules:
+1. create_app() only wires routes: it opens no connections, files or
+   threads, so it is safe under `gunicorn --preload` and boots while the
+   database is down
+2. Per-process resources (connection pool, fan-out threads, history
+   journal) are created lazily, on first use, by the process that uses
+   them; anything inherited across fork is discarded
+3. init_worker() starts the background work of a worker process. The
+   gunicorn post_fork hook calls it; otherwise the first request does
+4. /healthz answers while the process is alive; /readyz only once the
+   database answers (see health_controller)
+5. Every request is timed into core.metrics under its blueprint and URL
+   rule; /metrics serves the histograms (see metrics_controller)
+6. NODE_ROLE=edge: init_worker() also starts the push agent that syncs
+   this node's scans to central (see core/edge_sync.py, sync_controller)
+"""
+
+import os
+import time
+from dotenv import load_dotenv
+from flask import Flask, render_template, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+from flask_cors import CORS
+from core.metrics import metrics
+
+load_dotenv()
+
+PAGES = {
+    'index': ('/', 'index.html'),
+    'login': ('/login', 'login.html'),
+    'reset_password': ('/reset-password', 'reset-password.html'),
+    'barcode_page': ('/barcode', 'barcode.html'),
+    'process_page': ('/process', 'process.html'),
+    'history_page': ('/history', 'history.html'),
+    'users_page': ('/users', 'users.html'),
+    'settings_page': ('/settings', 'settings.html'),
+}
+
+_worker_pid = None
+
+
+def init_worker():
+    """Start this process's background work (idempotent, fork-aware)"""
+    global _worker_pid
+    if _worker_pid == os.getpid():
+        return
+    _worker_pid = os.getpid()
+
+    metrics.start()
+
+    from core.edge_sync import edge_sync
+    # Edge nodes: push queued scans to central in the background
+    edge_sync.start()
+
+    from core.wip_registry import wip_registry
+    # Running stations in memory, following the other workers' transfers
+    wip_registry.start()
+
+    from core.history_recorder import HistoryRecorder, history_journal
+    # Write-behind history: start this worker's flusher, replaying journals left by crashed workers
+    if HistoryRecorder.journaled():
+        try:
+            history_journal.start()
+        except OSError as e:
+            print(f"History journal unavailable in worker {_worker_pid}: {e}")
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """jsonify() encoder that reports its time as the request's serialization time"""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            metrics.observe_serialize(time.perf_counter() - started)
+
+
+def _begin_request():
+    metrics.begin_request()
+
+
+def _finish_request(response):
+    # Observed when the body has been sent, so streamed exports count in full
+    blueprint = request.blueprint or 'app'
+    route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+    method = request.method
+    status = response.status_code
+    response.call_on_close(lambda: metrics.finish_request(blueprint, route, method, status))
+    return response
+
+
+def _page(template):
+    def view():
+        return render_template(template)
+    return view
+
+
+def create_app(config=None):
+    """
+    Args:
+        config: optional dict applied over the environment defaults
+
+    Returns:
+        Flask application
+    """
+    from app.controllers.auth_controller import auth_bp
+    from app.controllers.trolley_controller import trolley_bp
+    from app.controllers.process_controller import process_bp
+    from app.controllers.barcode_controller import barcode_bp
+    from app.controllers.history_controller import history_bp
+    from app.controllers.users_controller import users_bp
+    from app.controllers.settings_controller import settings_bp
+    from app.controllers.events_controller import events_bp
+    from app.controllers.health_controller import health_bp
+    from app.controllers.metrics_controller import metrics_bp
+    from app.controllers.sync_controller import sync_bp
+    from config.database import db
+
+    app = Flask(__name__, template_folder='templates', static_folder='static')
+    app.json = TimedJSONProvider(app)
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key')
+    if config:
+        app.config.update(config)
+    CORS(app)
+
+    app.register_blueprint(health_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(trolley_bp, url_prefix='/api/trolley')
+    app.register_blueprint(process_bp, url_prefix='/api/process')
+    app.register_blueprint(barcode_bp, url_prefix='/api/barcode')
+    app.register_blueprint(history_bp, url_prefix='/api/history')
+    app.register_blueprint(users_bp, url_prefix='/api/users')
+    app.register_blueprint(settings_bp, url_prefix='/api/settings')
+    app.register_blueprint(events_bp, url_prefix='/api/events')
+    app.register_blueprint(sync_bp, url_prefix='/api/sync')
+
+    # Servers without a post_fork hook (flask run, python app.py, waitress)
+    app.before_request(init_worker)
+    if metrics.enabled:
+        app.before_request(_begin_request)
+        app.after_request(_finish_request)
+
+    for endpoint, (path, template) in PAGES.items():
+        view = _page(template)
+        app.add_url_rule(path, endpoint, view)
+        if path != '/':
+            app.add_url_rule(f'{path}.html', endpoint, view)
+
+    @app.route('/api-info')
+    def api_info():
+        return jsonify({
+            'message': 'Trolley Tracking System API',
+            'version': '1.0.0',
+            'endpoints': {
+                'auth': '/api/auth',
+                'trolley': '/api/trolley',
+                'process': '/api/process',
+                'barcode': '/api/barcode',
+                'history': '/api/history',
+                'users': '/api/users',
+                'settings': '/api/settings',
+                'events': '/api/events',
+                'sync': '/api/sync',
+                'health': '/healthz',
+                'ready': '/readyz',
+                'metrics': '/metrics'
+            }
+        })
+
+    @app.route('/api-info/db-pool')
+    def db_pool_info():
+        return jsonify({'success': True, 'pool': db.pool_stats()})
+
+    @app.errorhandler(404)
+    def not_found(error):
+        if request.path.startswith('/api/'):
+            return jsonify({'success': False, 'message': 'Endpoint not found'}), 404
+        return render_template('index.html'), 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        return jsonify({'success': False, 'message': 'Internal server error'}), 500
+
+    return app
@@ -3,10 +3,10 @@ import bcrypt
 import jwt
 import os
 from datetime import datetime, timedelta, timezone
-from config.database import Database
+from config.database import db
+from core.event_bus import event_bus
 
 auth_bp = Blueprint('auth', __name__)
-db = Database()
 
 @auth_bp.route('/login', methods=['POST'])
 def login():
@@ -27,6 +27,7 @@ def login():
             return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
 
         db.execute_query('UPDATE users SET last_login = NOW() WHERE id = %s', (user['id'],))
+        event_bus.publish('user.changed', {'action': 'login', 'id': user['id']})
 
         token = jwt.encode({
             'user_id': user['id'],
@@ -1,8 +1,55 @@
 from flask import Blueprint, request, jsonify
-from config.database import Database
+import os
+from config.database import db
+from core.barcode_cache import barcode_cache
+from core.fanout import gather
+from core.history_partitions import history_window
 
 barcode_bp = Blueprint('barcode', __name__)
-db = Database()
+
+# Seconds the whole search may wait for its lookups
+SEARCH_TIMEOUT = float(os.getenv('BARCODE_SEARCH_TIMEOUT', 5))
+
+
+def barcode_history(barcode):
+    """
+    Latest 50 history events mentioning the barcode within the default
+    history window (one range scan on barcode_events, pruned by month)
+    """
+    since = history_window()[0]
+    return db.fetch_all(
+        f'''SELECT 
+            h.id, h.event_type, h.process_code, h.process_name,
+            h.input_trolley, h.output_trolley,
+            h.process_input_barcode, h.process_output_barcode,
+            h.customer_name, h.lot_number, h.design_name, h.design_number,
+            h.grey_width, h.finish_width, h.fabric_quality, h.total_trolley,
+            h.meters, h.matching, h.order_receive_date, h.grey_receive_date,
+            h.remarks, h.pack_instructions,
+            h.process_start_time, h.process_end_time, h.duration_seconds,
+            h.status, h.created_at,
+            CASE 
+                WHEN h.duration_seconds IS NOT NULL THEN
+                    CONCAT(
+                        FLOOR(h.duration_seconds / 3600), 'h ',
+                        FLOOR((h.duration_seconds % 3600) / 60), 'm ',
+                        h.duration_seconds % 60, 's'
+                    )
+                ELSE NULL
+            END as duration_formatted
+        FROM (
+            SELECT DISTINCT event_id, created_at
+            FROM barcode_events
+            WHERE barcode = %s {'AND created_at >= %s' if since else ''}
+            ORDER BY created_at DESC, event_id DESC
+            LIMIT 50
+        ) be
+        JOIN view_history h ON h.id = be.event_id AND h.created_at = be.created_at
+        ORDER BY be.created_at DESC, be.event_id DESC''',
+        (barcode, since) if since else (barcode,),
+        prepared=True
+    )
+
 
 @barcode_bp.route('/search/<barcode>', methods=['GET'])
 def search_barcode(barcode):
@@ -13,54 +60,32 @@ def search_barcode(barcode):
     - Process data (if exists and IN_PROCESS)
     - History records
     - Current state
+    
+    Lookups that fail or time out are listed in `errors` and the
+    response is marked `partial`.
     """
     try:
-        # Search in trolley barcodes
-        trolley = db.fetch_one(
-            'SELECT * FROM trolley_barcodes WHERE barcode = %s', 
-            (barcode,)
-        )
+        # Independent lookups run concurrently: latency is the slowest one, not the sum
+        results, errors = gather({
+            'trolley': lambda: barcode_cache.trolley(db, barcode),
+            'process': lambda: barcode_cache.process(db, barcode),
+            'history': lambda: barcode_history(barcode),
+            'current_process': lambda: db.fetch_one(
+                "SELECT * FROM view_processes WHERE source_trolley_barcode = %s AND state = 'IN_PROCESS'",
+                (barcode,), prepared=True
+            ),
+        }, SEARCH_TIMEOUT)
         
-        # Search in process barcodes
-        process = db.fetch_one(
-            'SELECT * FROM process_barcodes WHERE barcode = %s', 
-            (barcode,)
-        )
+        if not results:
+            return jsonify({
+                'success': False,
+                'message': 'Barcode search unavailable',
+                'errors': errors
+            }), 503
         
-        # Get complete history for this barcode
-        history = db.fetch_all(
-            '''SELECT 
-                id, event_type, process_code, process_name,
-                input_trolley, output_trolley,
-                process_input_barcode, process_output_barcode,
-                customer_name, lot_number, design_name, design_number,
-                grey_width, finish_width, fabric_quality, total_trolley,
-                meters, matching, order_receive_date, grey_receive_date,
-                remarks, pack_instructions,
-                process_start_time, process_end_time, duration_seconds,
-                status, created_at,
-                CASE 
-                    WHEN duration_seconds IS NOT NULL THEN
-                        CONCAT(
-                            FLOOR(duration_seconds / 3600), 'h ',
-                            FLOOR((duration_seconds % 3600) / 60), 'm ',
-                            duration_seconds % 60, 's'
-                        )
-                    ELSE NULL
-                END as duration_formatted
-            FROM tracking_history 
-            WHERE trolley_barcode = %s 
-               OR process_barcode = %s 
-               OR from_barcode = %s 
-               OR to_barcode = %s
-               OR input_trolley = %s
-               OR output_trolley = %s
-               OR process_input_barcode = %s
-               OR process_output_barcode = %s
-            ORDER BY created_at DESC 
-            LIMIT 50''',
-            (barcode, barcode, barcode, barcode, barcode, barcode, barcode, barcode)
-        )
+        trolley = results.get('trolley')
+        process = results.get('process')
+        history = results.get('history') or []
         
         # Determine barcode type and state
         barcode_type = None
@@ -82,12 +107,9 @@ def search_barcode(barcode):
                 data = process
         
         # Check if trolley is currently in a process
-        current_process = None
-        if trolley:
-            current_process = db.fetch_one(
-                "SELECT * FROM process_barcodes WHERE source_trolley_barcode = %s AND state = 'IN_PROCESS'", 
-                (barcode,)
-            )
+        current_process = results.get('current_process') if trolley else None
+        if not trolley and 'trolley' not in errors:
+            errors.pop('current_process', None)
         
         return jsonify({
             'success': True,
@@ -98,7 +120,9 @@ def search_barcode(barcode):
             'process': data if barcode_type == 'process' else None,
             'currentProcess': current_process,
             'history': history,
-            'historyCount': len(history)
+            'historyCount': len(history),
+            'partial': bool(errors),
+            'errors': errors
         })
     except Exception as e:
         print(f"Barcode search error: {str(e)}")
@@ -114,10 +138,7 @@ def get_barcode_info(barcode):
     """
     try:
         # Try trolley first
-        trolley = db.fetch_one(
-            'SELECT * FROM trolley_barcodes WHERE barcode = %s',
-            (barcode,)
-        )
+        trolley = barcode_cache.trolley(db, barcode)
         
         if trolley and trolley['state'] == 'FULL':
             return jsonify({
@@ -145,10 +166,7 @@ def get_barcode_info(barcode):
             })
         
         # Try process
-        process = db.fetch_one(
-            'SELECT * FROM process_barcodes WHERE barcode = %s',
-            (barcode,)
-        )
+        process = barcode_cache.process(db, barcode)
         
         if process and process['state'] == 'IN_PROCESS':
             return jsonify({
@@ -0,0 +1,82 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import json
+import os
+import time
+from core.event_bus import event_bus
+
+events_bp = Blueprint('events', __name__)
+
+# An SSE response ends after this long and the browser reconnects with
+# Last-Event-ID, so sync workers are handed back regularly
+STREAM_MAX_SECONDS = int(os.getenv('EVENTS_STREAM_MAX_SECONDS', 300))
+HEARTBEAT_SECONDS = 15
+RECONNECT_MS = 2000
+MAX_POLL_TIMEOUT = 25
+
+
+def sse_frame(event_type, data, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {json.dumps(data, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def generate_stream(after):
+    """Yield SSE frames until STREAM_MAX_SECONDS pass"""
+    yield f'retry: {RECONNECT_MS}\n\n'
+    deadline = time.monotonic() + STREAM_MAX_SECONDS
+    while time.monotonic() < deadline:
+        events, after, resync = event_bus.wait(after, HEARTBEAT_SECONDS)
+        if resync:
+            yield sse_frame('resync', {}, after)
+        for event in events:
+            yield sse_frame(event['type'], {'data': event['data'], 'ts': event['ts']}, event['id'])
+        if not events and not resync:
+            yield ': keepalive\n\n'
+
+
+@events_bp.route('/stream', methods=['GET'])
+def event_stream():
+    """
+    Server-Sent Events: live deltas of floor state
+
+    Resumes after Last-Event-ID (sent by EventSource on reconnect) or
+    ?after=; without either, only events from now on are sent.
+    """
+    after = request.headers.get('Last-Event-ID') or request.args.get('after') or event_bus.latest_id()
+    return Response(
+        stream_with_context(generate_stream(after)),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+
+@events_bp.route('/poll', methods=['GET'])
+def event_poll():
+    """
+    Long-poll fallback for clients without EventSource
+
+    Query: after (event id), timeout (seconds, max 25)
+    Without `after` it returns immediately with the current position.
+    """
+    try:
+        after = request.args.get('after')
+        if not after:
+            return jsonify({'success': True, 'events': [], 'lastEventId': event_bus.latest_id(), 'resync': False})
+        try:
+            timeout = min(max(float(request.args.get('timeout', MAX_POLL_TIMEOUT)), 0), MAX_POLL_TIMEOUT)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'timeout must be a number'}), 400
+
+        events, last_id, resync = event_bus.wait(after, timeout)
+        return jsonify({'success': True, 'events': events, 'lastEventId': last_id, 'resync': resync})
+    except Exception as e:
+        print(f"Event poll error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
@@ -0,0 +1,44 @@
+from flask import Blueprint, jsonify
+import os
+from config.database import db
+from core.edge_sync import edge_sync
+
+health_bp = Blueprint('health', __name__)
+
+
+@health_bp.route('/healthz', methods=['GET'])
+def healthz():
+    """
+    Liveness: the worker is up and serving requests
+
+    Never touches the database, so an outage does not get healthy
+    workers restarted.
+    """
+    return jsonify({'success': True, 'status': 'alive', 'pid': os.getpid()})
+
+
+@health_bp.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Readiness: the worker can serve real traffic (database reachable)
+
+    Returns 503 until MySQL answers, so load balancers hold traffic back
+    without the worker being killed. An edge node whose sync is halted
+    (central needs ops it has pruned) is also reported unready.
+    """
+    try:
+        latency = db.ping()
+    except Exception as e:
+        print(f"Readiness check failed: {str(e)}")
+        return jsonify({
+            'success': False,
+            'status': 'unavailable',
+            'checks': {'database': {'ok': False, 'error': str(e)}}
+        }), 503
+    checks = {'database': {'ok': True, 'latency_ms': round(latency * 1000, 1)}}
+    if edge_sync.enabled:
+        halted = edge_sync.halted()
+        checks['sync'] = {'ok': True} if halted is None else {'ok': False, 'error': halted['message']}
+        if halted:
+            return jsonify({'success': False, 'status': 'sync_halted', 'checks': checks}), 503
+    return jsonify({'success': True, 'status': 'ready', 'checks': checks})
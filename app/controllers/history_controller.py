@@ -1,33 +1,24 @@
-from flask import Blueprint, request, jsonify
-from config.database import Database
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import base64
+import csv
+import io
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from config.database import db
+from core.time_engine import TimeEngine
+from core.history_stats import HistoryStats
+from core.history_recorder import HISTORY_FIELDS
+from core.history_partitions import history_window
+from core.lineage import Lineage
+from core.analytics import process_analytics, ANALYTICS_GROUPS
+from core.wip_registry import wip_registry
 
 history_bp = Blueprint('history', __name__)
-db = Database()
 
-@history_bp.route('/', methods=['GET'])
-@history_bp.route('', methods=['GET'])
-def get_history():
-    """Default history endpoint - redirects to /all"""
-    return get_all_history()
-
-@history_bp.route('/all', methods=['GET'])
-def get_all_history():
-    """
-    Get all history records with pagination
-    Now includes: start time, end time, duration
-    """
-    try:
-        page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 50))
-        offset = (page - 1) * limit
-        
-        # Get total count
-        count = db.fetch_one('SELECT COUNT(*) as total FROM tracking_history')
-        total = count['total'] if count else 0
-        
-        # Fetch history with formatted duration
-        history = db.fetch_all(
-            '''SELECT 
+# Read from view_history: lot payload fields come from lots (see core/lots.py)
+HISTORY_COLUMNS = """
                 id, event_type, process_code, process_name,
                 input_trolley, output_trolley,
                 process_input_barcode, process_output_barcode,
@@ -46,95 +37,458 @@ def get_all_history():
                         )
                     ELSE '-'
                 END as duration_formatted,
-                status, created_by, created_at
-            FROM tracking_history 
-            ORDER BY created_at DESC 
-            LIMIT %s OFFSET %s''',
-            (limit, offset)
+                status, created_by, created_at"""
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+TROLLEY_HISTORY_LIMIT = 100
+DEFAULT_JOURNEYS = 10
+MAX_JOURNEYS = 50
+
+# ============================================================================
+# KEYSET PAGINATION HELPERS
+# ============================================================================
+
+class HistoryQueryError(ValueError):
+    """Bad cursor or date filter supplied by the client"""
+
+
+def encode_cursor(row, direction):
+    """Opaque cursor pointing just past `row` in the given direction"""
+    created_at = row['created_at']
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    raw = json.dumps({'t': created_at, 'i': row['id'], 'd': direction})
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns: (created_at, id, direction)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        direction = data['d']
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        return datetime.fromisoformat(data['t']), int(data['i']), direction
+    except (ValueError, KeyError, TypeError):
+        raise HistoryQueryError('Invalid pagination cursor')
+
+
+def parse_pakistan_bound(value, end_of_range=False):
+    """
+    Convert a Pakistan-time filter (YYYY-MM-DD or ISO datetime) to UTC
+    A bare date used as the upper bound covers that whole day.
+    """
+    if not value:
+        return None
+    try:
+        if len(value) == 10:
+            day = datetime.strptime(value, '%Y-%m-%d')
+            if end_of_range:
+                day += timedelta(days=1)
+            return TimeEngine.to_utc(day.isoformat())
+        return TimeEngine.to_utc(value)
+    except ValueError:
+        raise HistoryQueryError(f'Invalid date: {value}')
+
+
+def date_range_clause(from_utc, to_utc):
+    """Returns: (sql fragments list, params list) for a created_at window"""
+    clauses, params = [], []
+    if from_utc:
+        clauses.append('created_at >= %s')
+        params.append(from_utc)
+    if to_utc:
+        clauses.append('created_at < %s')
+        params.append(to_utc)
+    return clauses, params
+
+
+def window_info(from_utc, to_utc, defaulted):
+    """Date window a response covers (partition pruning bounds)"""
+    return {
+        'from': from_utc.isoformat() if from_utc else None,
+        'to': to_utc.isoformat() if to_utc else None,
+        'isDefault': defaulted
+    }
+
+
+_total_cache = {}
+_total_cache_lock = threading.Lock()
+TOTAL_CACHE_TTL = 60
+
+
+def history_total(from_utc=None, to_utc=None):
+    """
+    Approximate row count for the pagination footer
+
+    Unfiltered: InnoDB's table statistics (O(1), approximate).
+    Date window: exact COUNT over the created_at range, cached for
+    TOTAL_CACHE_TTL seconds so paging through a window counts once.
+    """
+    key = (from_utc, to_utc)
+    now = time.monotonic()
+    with _total_cache_lock:
+        cached = _total_cache.get(key)
+        if cached and now - cached[1] < TOTAL_CACHE_TTL:
+            return cached[0]
+
+    if from_utc or to_utc:
+        clauses, params = date_range_clause(from_utc, to_utc)
+        row = db.fetch_one(
+            f"SELECT COUNT(*) as total FROM tracking_history WHERE {' AND '.join(clauses)}",
+            tuple(params), prepared=True
         )
-        
+        total = int(row['total'] or 0) if row else 0
+    else:
+        total = db.estimated_rows('tracking_history')
+
+    with _total_cache_lock:
+        if len(_total_cache) > 256:
+            _total_cache.clear()
+        _total_cache[key] = (total, now)
+    return total
+
+
+@history_bp.route('/', methods=['GET'])
+@history_bp.route('', methods=['GET'])
+def get_history():
+    """Default history endpoint - redirects to /all"""
+    return get_all_history()
+
+@history_bp.route('/all', methods=['GET'])
+def get_all_history():
+    """
+    Get history records with keyset pagination, newest first
+    Now includes: start time, end time, duration
+
+    Query params:
+        limit: page size (default 50, max 500)
+        cursor: nextCursor / prevCursor from a previous response
+        from, to: optional Pakistan-time bounds (YYYY-MM-DD or ISO datetime);
+                  without either, the last HISTORY_WINDOW_DAYS days
+
+    Pages are seeked on (created_at, id), so every page costs the same
+    index range scan regardless of how deep it is.
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', DEFAULT_PAGE_SIZE)), 1), MAX_PAGE_SIZE)
+        from_utc = parse_pakistan_bound(request.args.get('from'))
+        to_utc = parse_pakistan_bound(request.args.get('to'), end_of_range=True)
+        cursor = request.args.get('cursor')
+        # Bounded by date so only the matching monthly partitions are read
+        from_utc, to_utc, defaulted = history_window(from_utc, to_utc)
+
+        clauses, params = date_range_clause(from_utc, to_utc)
+        direction = 'next'
+        if cursor:
+            cursor_time, cursor_id, direction = decode_cursor(cursor)
+            comparator = '<' if direction == 'next' else '>'
+            clauses.append(f'(created_at {comparator} %s OR (created_at = %s AND id {comparator} %s))')
+            params.extend([cursor_time, cursor_time, cursor_id])
+
+        order = 'DESC' if direction == 'next' else 'ASC'
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        params.append(limit + 1)
+
+        # Fetch one extra row to learn whether another page exists
+        history = db.fetch_all(
+            f"""SELECT {HISTORY_COLUMNS}
+            FROM view_history 
+            {where}
+            ORDER BY created_at {order}, id {order}
+            LIMIT %s""",
+            tuple(params), prepared=True
+        )
+
+        has_more = len(history) > limit
+        history = history[:limit]
+        if direction == 'prev':
+            history.reverse()
+
+        if direction == 'next':
+            has_next, has_prev = has_more, bool(cursor)
+        else:
+            has_next, has_prev = True, has_more
+
+        # The default window moves with every request: count it from the
+        # minute so the cached COUNT is shared (off by under a minute of events)
+        count_from = from_utc.replace(second=0, microsecond=0) if defaulted else from_utc
+
         return jsonify({
             'success': True,
             'data': history,
+            'window': window_info(from_utc, to_utc, defaulted),
             'pagination': {
-                'total': total,
-                'page': page,
+                'total': history_total(count_from, to_utc),
+                'totalIsApproximate': defaulted or not (from_utc or to_utc),
                 'limit': limit,
-                'pages': (total + limit - 1) // limit if total > 0 else 0
+                'hasNext': has_next,
+                'hasPrev': has_prev,
+                'nextCursor': encode_cursor(history[-1], 'next') if history and has_next else None,
+                'prevCursor': encode_cursor(history[0], 'prev') if history and has_prev else None
             }
         })
+    except HistoryQueryError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         print(f"History all error: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
 
+# ============================================================================
+# FULL-TEXT SEARCH
+# ============================================================================
+
+# Must list exactly the columns of history_search.ft_history_search, in order
+SEARCH_MATCH = """MATCH(customer_name, lot_number, design_name, design_number, fabric_quality,
+                  trolley_barcode, process_barcode, input_trolley, output_trolley,
+                  process_code, process_name)"""
+
+# ngram_token_size (server default 2): shorter terms cannot hit the index
+MIN_SEARCH_TERM_LENGTH = 2
+SEARCH_OPERATOR_CHARS = '+-<>()~*"@'
+
+
+def build_search_expression(query):
+    """
+    Turn free text into a BOOLEAN MODE expression
+
+    Every term is required and searched as a quoted ngram phrase, so
+    'TR-0' matches TR-01, TR-02, ... and 'ali tr-01' needs both terms.
+    Returns: expression string, or None if no term is long enough
+    """
+    terms = []
+    for term in query.split():
+        term = term.strip(SEARCH_OPERATOR_CHARS)
+        # Hyphens are safe inside a quoted phrase (barcodes use them)
+        for char in SEARCH_OPERATOR_CHARS.replace('-', ''):
+            term = term.replace(char, ' ')
+        term = ' '.join(term.split())
+        if len(term) >= MIN_SEARCH_TERM_LENGTH:
+            terms.append(f'+"{term}"')
+    return ' '.join(terms) or None
+
+
 @history_bp.route('/search', methods=['GET'])
 def search_history():
     """
-    Search history by various parameters
+    Search history by customer, lot, design, barcode, quality and process
+
+    Query params:
+        query: free text; every term must match (substring/prefix match)
+        sort: 'relevance' (default) or 'recent'
+        page, limit: paging over the match set (limit max 500)
+        from, to: optional Pakistan-time bounds; without either, the last
+                  HISTORY_WINDOW_DAYS days
+
+    Matches come from the ngram FULLTEXT index on history_search; only
+    the page of matches is joined back to its tracking_history partition,
+    so cost follows the number of matches rather than the table size.
     """
     try:
-        query = request.args.get('query', '')
-        
-        history = db.fetch_all(
-            """SELECT 
-                id, event_type, process_code, process_name,
-                input_trolley, output_trolley,
-                process_input_barcode, process_output_barcode,
-                customer_name, lot_number, design_name, design_number,
-                grey_width, finish_width, fabric_quality, total_trolley,
-                meters, matching, order_receive_date, grey_receive_date,
-                remarks, pack_instructions,
-                trolley_barcode, process_barcode, from_barcode, to_barcode,
-                process_start_time, process_end_time, duration_seconds,
-                CASE 
-                    WHEN duration_seconds IS NOT NULL THEN
-                        CONCAT(
-                            FLOOR(duration_seconds / 3600), 'h ',
-                            FLOOR((duration_seconds % 3600) / 60), 'm ',
-                            duration_seconds % 60, 's'
-                        )
-                    ELSE '-'
-                END as duration_formatted,
-                status, created_at
-            FROM tracking_history 
-            WHERE customer_name LIKE %s 
-               OR lot_number LIKE %s
-               OR design_name LIKE %s
-               OR trolley_barcode LIKE %s 
-               OR process_barcode LIKE %s 
-               OR fabric_quality LIKE %s
-               OR input_trolley LIKE %s
-               OR output_trolley LIKE %s
-               OR process_code LIKE %s
-               OR process_name LIKE %s
-            ORDER BY created_at DESC 
-            LIMIT 100""",
-            (f'%{query}%', f'%{query}%', f'%{query}%', f'%{query}%', 
-             f'%{query}%', f'%{query}%', f'%{query}%', f'%{query}%',
-             f'%{query}%', f'%{query}%')
-        )
-        
+        query = request.args.get('query', '').strip()
+        sort = request.args.get('sort', 'relevance')
+        page = max(int(request.args.get('page', 1)), 1)
+        limit = min(max(int(request.args.get('limit', 100)), 1), MAX_PAGE_SIZE)
+        offset = (page - 1) * limit
+        from_utc = parse_pakistan_bound(request.args.get('from'))
+        to_utc = parse_pakistan_bound(request.args.get('to'), end_of_range=True)
+
+        if sort not in ('relevance', 'recent'):
+            raise HistoryQueryError("Sort must be 'relevance' or 'recent'")
+        from_utc, to_utc, defaulted = history_window(from_utc, to_utc)
+
+        clauses, params = date_range_clause(from_utc, to_utc)
+        expression = build_search_expression(query) if query else None
+
+        if query and not expression:
+            return jsonify({
+                'success': True,
+                'data': [],
+                'count': 0,
+                'message': f'Search terms need at least {MIN_SEARCH_TERM_LENGTH} characters'
+            })
+
+        if expression:
+            # Page through matches in history_search, then fetch just those rows
+            score = f'{SEARCH_MATCH} AGAINST (%s IN BOOLEAN MODE)'
+            order = 'relevance DESC, created_at DESC, event_id DESC' if sort == 'relevance' else 'created_at DESC, event_id DESC'
+            outer_order = ('m.relevance DESC, m.match_created_at DESC, m.match_id DESC' if sort == 'relevance'
+                           else 'm.match_created_at DESC, m.match_id DESC')
+            # Fetch one extra row to learn whether another page exists
+            history = db.fetch_all(
+                f"""SELECT {HISTORY_COLUMNS},
+                    m.relevance
+                FROM (
+                    SELECT event_id as match_id, created_at as match_created_at, {score} as relevance
+                    FROM history_search
+                    WHERE {' AND '.join([score] + clauses)}
+                    ORDER BY {order}
+                    LIMIT %s OFFSET %s
+                ) m
+                JOIN view_history ON id = m.match_id AND created_at = m.match_created_at
+                ORDER BY {outer_order}""",
+                tuple([expression, expression] + params + [limit + 1, offset]), prepared=True
+            )
+        else:
+            # Empty query: latest events, same as before
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+            history = db.fetch_all(
+                f"""SELECT {HISTORY_COLUMNS},
+                    0 as relevance
+                FROM view_history 
+                {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s OFFSET %s""",
+                tuple(params + [limit + 1, offset]), prepared=True
+            )
+
+        has_more = len(history) > limit
+        history = history[:limit]
+
         return jsonify({
             'success': True,
             'data': history,
-            'count': len(history)
+            'count': len(history),
+            'window': window_info(from_utc, to_utc, defaulted),
+            'pagination': {
+                'page': page,
+                'limit': limit,
+                'hasMore': has_more
+            }
         })
+    except HistoryQueryError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         print(f"History search error: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
 
+# ============================================================================
+# STREAMING EXPORT
+# ============================================================================
+
+EXPORT_COLUMNS = ('id',) + HISTORY_FIELDS
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+EXPORT_CHUNK_ROWS = 500
+
+
+def export_value(value):
+    """JSON/CSV-safe value: timestamps as ISO-8601 UTC, dates as YYYY-MM-DD"""
+    if isinstance(value, datetime):
+        return TimeEngine.parse_datetime(value).isoformat()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def generate_export(export_format, columns, where, params):
+    """Yield the export body in chunks while rows stream from MySQL"""
+    rows = db.stream(
+        f"""SELECT {', '.join(columns)}
+        FROM view_history
+        {where}
+        ORDER BY created_at, id""",
+        tuple(params)
+    )
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if export_format == 'csv' else None
+    if writer:
+        writer.writerow(columns)
+
+    pending = 0
+    for row in rows:
+        values = [export_value(row[column]) for column in columns]
+        if writer:
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, values)), default=str))
+            buffer.write('\n')
+        pending += 1
+        if pending >= EXPORT_CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@history_bp.route('/export', methods=['GET'])
+def export_history():
+    """
+    Stream tracking_history as CSV or NDJSON, oldest first
+
+    Query params:
+        format: 'csv' (default) or 'ndjson'
+        from, to: optional Pakistan-time bounds (YYYY-MM-DD or ISO datetime)
+        columns: optional comma-separated projection (default: all columns)
+
+    Rows are read through an unbuffered cursor and written out as they
+    arrive, so worker memory stays constant regardless of export size.
+    """
+    try:
+        export_format = request.args.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            raise HistoryQueryError(f"Format must be one of {', '.join(EXPORT_FORMATS)}")
+
+        requested = request.args.get('columns')
+        if requested:
+            columns = [column.strip() for column in requested.split(',') if column.strip()]
+            unknown = [column for column in columns if column not in EXPORT_COLUMNS]
+            if unknown or not columns:
+                raise HistoryQueryError(f"Unknown export columns: {', '.join(unknown) or requested}")
+        else:
+            columns = list(EXPORT_COLUMNS)
+
+        from_value = request.args.get('from')
+        to_value = request.args.get('to')
+        clauses, params = date_range_clause(
+            parse_pakistan_bound(from_value),
+            parse_pakistan_bound(to_value, end_of_range=True)
+        )
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+        filename = f"history_{from_value or 'start'}_{to_value or 'now'}.{export_format}".replace(':', '-')
+        return Response(
+            stream_with_context(generate_export(export_format, columns, where, params)),
+            mimetype=EXPORT_FORMATS[export_format],
+            headers={
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+    except HistoryQueryError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        print(f"History export error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+
 @history_bp.route('/process/<process_code>', methods=['GET'])
 def get_process_history(process_code):
     """
     Get history for a specific process code (e.g., PR-01)
+    Query params: from, to (default: the last HISTORY_WINDOW_DAYS days)
     """
     try:
+        from_utc, to_utc, defaulted = history_window(
+            parse_pakistan_bound(request.args.get('from')),
+            parse_pakistan_bound(request.args.get('to'), end_of_range=True)
+        )
+        clauses, params = date_range_clause(from_utc, to_utc)
         history = db.fetch_all(
-            """SELECT 
+            f"""SELECT 
                 id, event_type, process_code, process_name,
                 input_trolley, output_trolley,
                 process_input_barcode, process_output_barcode,
@@ -153,19 +507,22 @@ def get_process_history(process_code):
                     ELSE '-'
                 END as duration_formatted,
                 status, created_at
-            FROM tracking_history 
-            WHERE process_code = %s
+            FROM view_history 
+            WHERE {' AND '.join(['process_code = %s'] + clauses)}
             ORDER BY created_at DESC 
             LIMIT 100""",
-            (process_code,)
+            tuple([process_code] + params), prepared=True
         )
         
         return jsonify({
             'success': True,
             'processCode': process_code,
             'data': history,
-            'count': len(history)
+            'count': len(history),
+            'window': window_info(from_utc, to_utc, defaulted)
         })
+    except HistoryQueryError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         print(f"Process history error: {str(e)}")
         import traceback
@@ -175,99 +532,149 @@ def get_process_history(process_code):
 @history_bp.route('/trolley/<trolley_barcode>', methods=['GET'])
 def get_trolley_history(trolley_barcode):
     """
-    Get complete journey of a trolley barcode
+    Get the events in which a trolley barcode appears, newest first
+    Query params: from, to (default: the last HISTORY_WINDOW_DAYS days),
+                  limit (default 100, max 500),
+                  cursor (nextCursor of the previous page)
+    Pages are seeked on (created_at, event_id) like /all.
+    For the lots' full paths across other trolleys and stations, see
+    /trolley/<barcode>/lineage
     """
     try:
+        limit = min(max(request.args.get('limit', TROLLEY_HISTORY_LIMIT, type=int), 1), MAX_PAGE_SIZE)
+        from_utc, to_utc, defaulted = history_window(
+            parse_pakistan_bound(request.args.get('from')),
+            parse_pakistan_bound(request.args.get('to'), end_of_range=True)
+        )
+        clauses, params = date_range_clause(from_utc, to_utc)
+        cursor = request.args.get('cursor')
+        if cursor:
+            cursor_time, cursor_id, direction = decode_cursor(cursor)
+            if direction != 'next':
+                raise HistoryQueryError('Trolley history pages forward only')
+            clauses.append('(created_at < %s OR (created_at = %s AND event_id < %s))')
+            params.extend([cursor_time, cursor_time, cursor_id])
+
+        # Fetch one extra row to learn whether another page exists
         history = db.fetch_all(
-            """SELECT 
-                id, event_type, process_code, process_name,
-                input_trolley, output_trolley,
-                process_input_barcode, process_output_barcode,
-                customer_name, lot_number, design_name, design_number,
-                grey_width, finish_width, fabric_quality, total_trolley,
-                meters, matching, order_receive_date, grey_receive_date,
-                remarks, pack_instructions,
-                process_start_time, process_end_time, duration_seconds,
+            f"""SELECT 
+                h.id, h.event_type, h.process_code, h.process_name,
+                h.input_trolley, h.output_trolley,
+                h.process_input_barcode, h.process_output_barcode,
+                h.customer_name, h.lot_number, h.design_name, h.design_number,
+                h.grey_width, h.finish_width, h.fabric_quality, h.total_trolley,
+                h.meters, h.matching, h.order_receive_date, h.grey_receive_date,
+                h.remarks, h.pack_instructions,
+                h.process_start_time, h.process_end_time, h.duration_seconds,
                 CASE 
-                    WHEN duration_seconds IS NOT NULL THEN
+                    WHEN h.duration_seconds IS NOT NULL THEN
                         CONCAT(
-                            FLOOR(duration_seconds / 3600), 'h ',
-                            FLOOR((duration_seconds % 3600) / 60), 'm ',
-                            duration_seconds % 60, 's'
+                            FLOOR(h.duration_seconds / 3600), 'h ',
+                            FLOOR((h.duration_seconds % 3600) / 60), 'm ',
+                            h.duration_seconds % 60, 's'
                         )
                     ELSE '-'
                 END as duration_formatted,
-                status, created_at
-            FROM tracking_history 
-            WHERE trolley_barcode = %s
-               OR input_trolley = %s
-               OR output_trolley = %s
-            ORDER BY created_at DESC""",
-            (trolley_barcode, trolley_barcode, trolley_barcode)
+                h.status, h.created_at
+            FROM (
+                SELECT DISTINCT event_id, created_at
+                FROM barcode_events
+                WHERE {' AND '.join(["barcode = %s AND role IN ('trolley', 'input_trolley', 'output_trolley')"] + clauses)}
+                ORDER BY created_at DESC, event_id DESC
+                LIMIT %s
+            ) be
+            JOIN view_history h ON h.id = be.event_id AND h.created_at = be.created_at
+            ORDER BY be.created_at DESC, be.event_id DESC""",
+            tuple([trolley_barcode] + params + [limit + 1]), prepared=True
         )
+        has_more = len(history) > limit
+        history = history[:limit]
         
         return jsonify({
             'success': True,
             'trolleyBarcode': trolley_barcode,
             'data': history,
-            'count': len(history)
+            'count': len(history),
+            'limit': limit,
+            'hasMore': has_more,
+            'nextCursor': encode_cursor(history[-1], 'next') if has_more else None,
+            'window': window_info(from_utc, to_utc, defaulted)
         })
+    except HistoryQueryError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         print(f"Trolley history error: {str(e)}")
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
 
+@history_bp.route('/trolley/<trolley_barcode>/lineage', methods=['GET'])
+def get_trolley_lineage(trolley_barcode):
+    """
+    Full path of every lot this trolley carried, across all the trolleys
+    and stations the lot went through, with per-hop durations
+    Query params: from, to (default: the last HISTORY_WINDOW_DAYS days;
+                  selects the lots the trolley carried in that window,
+                  each journey is returned whole),
+                  limit (journeys, most recent first; default 10, max 50)
+    """
+    try:
+        limit = min(max(request.args.get('limit', DEFAULT_JOURNEYS, type=int), 1), MAX_JOURNEYS)
+        from_utc, to_utc, defaulted = history_window(
+            parse_pakistan_bound(request.args.get('from')),
+            parse_pakistan_bound(request.args.get('to'), end_of_range=True)
+        )
+        clauses, params = date_range_clause(from_utc, to_utc)
+        lot_ids = Lineage.lots_of_trolley(db, trolley_barcode, clauses, params, limit)
+        journeys = Lineage.journeys(db, lot_ids)
+
+        return jsonify({
+            'success': True,
+            'trolleyBarcode': trolley_barcode,
+            'data': journeys,
+            'count': len(journeys),
+            'limit': limit,
+            'window': window_info(from_utc, to_utc, defaulted)
+        })
+    except HistoryQueryError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Trolley lineage error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+
 @history_bp.route('/stats', methods=['GET'])
 def get_stats():
     """
     Get statistics about the system
+    History figures come from the precomputed history_stats counters
     """
     try:
-        # Total events
-        total_events = db.fetch_one('SELECT COUNT(*) as count FROM tracking_history')
-        
-        # Active processes
-        active_processes = db.fetch_one(
-            "SELECT COUNT(*) as count FROM process_barcodes WHERE state = 'IN_PROCESS'"
-        )
-        
-        # Full trolleys
-        full_trolleys = db.fetch_one(
-            "SELECT COUNT(*) as count FROM trolley_barcodes WHERE state = 'FULL'"
-        )
+        # Event totals and duration aggregates (maintained on write)
+        stats = HistoryStats.read(db)
         
-        # Events by type
-        events_by_type = db.fetch_all(
-            """SELECT event_type, COUNT(*) as count 
-            FROM tracking_history 
-            GROUP BY event_type"""
+        # Full trolleys (small state table, idx_state); running stations from the WIP registry
+        live = db.fetch_one(
+            "SELECT COUNT(*) as full_trolleys FROM trolley_barcodes WHERE state = 'FULL'"
         )
         
-        # Average process duration
-        avg_duration = db.fetch_one(
-            """SELECT 
-                AVG(duration_seconds) as avg_seconds,
-                MIN(duration_seconds) as min_seconds,
-                MAX(duration_seconds) as max_seconds
-            FROM tracking_history 
-            WHERE duration_seconds IS NOT NULL"""
-        )
+        avg_seconds = stats['duration_sum'] / stats['duration_count'] if stats['duration_count'] else 0
         
         return jsonify({
             'success': True,
             'stats': {
-                'totalEvents': total_events['count'] if total_events else 0,
-                'activeProcesses': active_processes['count'] if active_processes else 0,
-                'fullTrolleys': full_trolleys['count'] if full_trolleys else 0,
-                'eventsByType': events_by_type or [],
+                'totalEvents': stats['total_events'],
+                'activeProcesses': wip_registry.count(),
+                'fullTrolleys': live['full_trolleys'] if live else 0,
+                'eventsByType': stats['events_by_type'],
                 'averageDuration': {
-                    'seconds': avg_duration['avg_seconds'] if avg_duration and avg_duration['avg_seconds'] else 0,
-                    'minutes': round(avg_duration['avg_seconds'] / 60, 2) if avg_duration and avg_duration['avg_seconds'] else 0,
-                    'formatted': f"{int(avg_duration['avg_seconds'] // 3600)}h {int((avg_duration['avg_seconds'] % 3600) // 60)}m" if avg_duration and avg_duration['avg_seconds'] else 'N/A'
+                    'seconds': avg_seconds,
+                    'minutes': round(avg_seconds / 60, 2) if avg_seconds else 0,
+                    'formatted': f"{int(avg_seconds // 3600)}h {int((avg_seconds % 3600) // 60)}m" if avg_seconds else 'N/A'
                 },
-                'minDuration': avg_duration['min_seconds'] if avg_duration and avg_duration['min_seconds'] else 0,
-                'maxDuration': avg_duration['max_seconds'] if avg_duration and avg_duration['max_seconds'] else 0
+                'minDuration': stats['duration_min'] or 0,
+                'maxDuration': stats['duration_max'] or 0
             }
         })
     except Exception as e:
@@ -275,3 +682,39 @@ def get_stats():
         import traceback
         traceback.print_exc()
         return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+
+@history_bp.route('/analytics', methods=['GET'])
+def get_process_analytics():
+    """
+    Per-process duration percentiles (p50/p90/p99), throughput per hour
+    and meters per day over completed processes
+    Query params: from, to (default: the last HISTORY_WINDOW_DAYS days),
+                  groupBy = 'process_code' (default) or 'process_name'
+    Served from the worker's columnar cache (see core/analytics.py), so
+    it costs the database at most one incremental read per refresh
+    interval, whatever the window
+    """
+    try:
+        group_by = request.args.get('groupBy', 'process_code')
+        if group_by not in ANALYTICS_GROUPS:
+            return jsonify({'success': False, 'message': f"groupBy must be one of {', '.join(ANALYTICS_GROUPS)}"}), 400
+        from_utc, to_utc, defaulted = history_window(
+            parse_pakistan_bound(request.args.get('from')),
+            parse_pakistan_bound(request.args.get('to'), end_of_range=True)
+        )
+        analytics = process_analytics.query(db, from_utc, to_utc, group_by)
+
+        return jsonify({
+            'success': True,
+            'groupBy': group_by,
+            'data': analytics,
+            'cache': process_analytics.info(),
+            'window': window_info(from_utc, to_utc, defaulted)
+        })
+    except HistoryQueryError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        print(f"Process analytics error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
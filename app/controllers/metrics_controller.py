@@ -0,0 +1,15 @@
+from flask import Blueprint, Response
+from core.metrics import metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Request and database histograms of every worker on this host,
+    in Prometheus text format (see core/metrics.py)
+    """
+    if not metrics.enabled:
+        return Response('# metrics disabled (METRICS_ENABLED=false)\n', status=404, mimetype='text/plain')
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
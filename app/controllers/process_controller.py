@@ -1,14 +1,42 @@
 from flask import Blueprint, request, jsonify
-from config.database import Database
+from mysql.connector import Error
+from config.database import db, DEADLOCK_ERRNO
 from core.time_engine import TimeService
+from core.history_recorder import HistoryRecorder
+from core.barcode_cache import barcode_cache
+from core.settings_store import settings_store, MAINTENANCE_RESULT
+from core.event_bus import event_bus
+from core.lots import Lots
+from core.edge_sync import edge_sync, snapshot
+from core.wip_registry import wip_registry
 
 process_bp = Blueprint('process', __name__)
-db = Database()
 
 # ============================================================================
 # WORKFLOW ENGINE - STATE MACHINE WITH TIME ENGINE
 # ============================================================================
 
+class WorkflowError(Exception):
+    """
+    A transfer rejected by the state machine
+
+    Raised inside the transfer transaction so that every row lock taken
+    during validation is released by the rollback.
+    """
+
+    def __init__(self, error_type, message):
+        super().__init__(message)
+        self.error_type = error_type
+        self.message = message
+
+    def to_result(self):
+        return {
+            'success': False,
+            'message': self.message,
+            'error_type': self.error_type
+        }
+
+
 class WorkflowEngine:
     """
     Proper workflow engine with centralized time management
@@ -19,6 +47,26 @@ class WorkflowEngine:
     - Display: Pakistan time (UI)
     - NO SQL time functions
     - NO JavaScript time generation
+
+    Payload Rules:
+    - The 14 order fields live once in `lots`; trolleys, stations and
+      history reference them by lot_id, so a transfer moves the pointer
+    - Reads go through view_trolleys / view_processes (row + lot fields)
+
+    Concurrency Rules:
+    - Validation and writes run in ONE transaction on ONE connection
+    - Rows are validated with locking reads (SELECT ... FOR UPDATE), so two
+      scanners racing for the same trolley or station are serialized and
+      the loser sees the winner's committed state
+    - apply_* methods run inside a caller-supplied transaction and raise
+      WorkflowError; transfer_* methods wrap them in their own transaction
+    - Caches (barcode cache, WIP registry) and live screens are updated
+      only after COMMIT
+
+    Edge Rules:
+    - On an edge node apply_* also queue the transfer for central in the
+      same transaction (core/edge_sync.py); central replays it through
+      apply_* with the edge's timestamp (now)
     """
     
     @staticmethod
@@ -27,335 +75,338 @@ class WorkflowEngine:
         FLOW STAGE 1: Carrier → Processor
         TR-01(FULL) → PR-01-in(EMPTY)
         """
+        try:
+            return db.run_in_transaction(
+                WorkflowEngine.apply_trolley_to_process,
+                trolley_barcode, process_barcode, process_name,
+                prepared=True
+            )
+        except WorkflowError as e:
+            return e.to_result()
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'Flow transaction failed: {str(e)}',
+                'error_type': 'TRANSACTION_FAILED'
+            }
+
+    @staticmethod
+    def apply_trolley_to_process(cursor, trolley_barcode, process_barcode, process_name, now=None):
+        """
+        Carrier → Processor inside the caller's transaction
+        Lock order: trolley, process input, paired process output
+        now: timestamp of a replayed transfer (default TimeService)
+        """
         
-        # Validate trolley state
-        trolley = db.fetch_one(
-            "SELECT * FROM trolley_barcodes WHERE barcode = %s AND state = 'FULL'",
+        # Validate trolley state (row stays locked until commit)
+        cursor.execute(
+            "SELECT * FROM view_trolleys WHERE barcode = %s AND state = 'FULL' FOR UPDATE",
             (trolley_barcode,)
         )
+        trolley = cursor.fetchone()
         
         if not trolley:
-            return {
-                'success': False, 
-                'message': 'Trolley must be FULL with data before connecting to process',
-                'error_type': 'CARRIER_EMPTY'
-            }
+            raise WorkflowError(
+                'CARRIER_EMPTY',
+                'Trolley must be FULL with data before connecting to process'
+            )
         
         # Validate process state
-        process_input = db.fetch_one(
-            "SELECT * FROM process_barcodes WHERE barcode = %s AND process_type = 'input'",
+        cursor.execute(
+            "SELECT * FROM process_barcodes WHERE barcode = %s AND process_type = 'input' FOR UPDATE",
             (process_barcode,)
         )
+        process_input = cursor.fetchone()
         
         if not process_input:
-            return {
-                'success': False,
-                'message': 'Process input barcode not found',
-                'error_type': 'PROCESSOR_NOT_FOUND'
-            }
+            raise WorkflowError('PROCESSOR_NOT_FOUND', 'Process input barcode not found')
         
         if process_input['state'] != 'EMPTY':
-            return {
-                'success': False,
-                'message': f'Process is already {process_input["state"]}. Clear it first.',
-                'error_type': 'PROCESSOR_BUSY'
-            }
+            raise WorkflowError(
+                'PROCESSOR_BUSY',
+                f'Process is already {process_input["state"]}. Clear it first.'
+            )
         
-        # Extract trolley data (payload)
-        payload = {
-            'customer_name': trolley['customer_name'],
-            'lot_number': trolley['lot_number'],
-            'design_name': trolley['design_name'],
-            'design_number': trolley['design_number'],
-            'grey_width': trolley['grey_width'],
-            'finish_width': trolley['finish_width'],
-            'fabric_quality': trolley['fabric_quality'],
-            'total_trolley': trolley['total_trolley'],
-            'meters': trolley['meters'],
-            'matching': trolley['matching'],
-            'order_receive_date': trolley['order_receive_date'],
-            'grey_receive_date': trolley['grey_receive_date'],
-            'remarks': trolley['remarks'],
-            'pack_instructions': trolley['pack_instructions']
-        }
+        # Trolley data (payload) moves by reference
+        lot_id = trolley['lot_id']
+        payload = Lots.payload(trolley)
         
-        # Get paired output barcode
-        paired_output = process_input.get('paired_barcode')
+        # Get paired output barcode (not filled when auto-mirror is disabled)
+        paired_output = process_input.get('paired_barcode') if settings_store.auto_mirror_enabled() else None
         process_code = process_barcode.rsplit('-', 1)[0] if '-' in process_barcode else process_barcode
         
         # ⭐ TIME ENGINE: Get current timestamp from TimeService
-        current_time = TimeService.get_db_timestamp()
-        
-        # Build transaction
-        operations = []
-        
-        # Migrate data to input process
-        operations.append((
-            """UPDATE process_barcodes SET 
-            state = 'IN_PROCESS',
-            process_name = %s,
-            source_trolley_barcode = %s,
-            customer_name = %s, lot_number = %s, design_name = %s, design_number = %s,
-            grey_width = %s, finish_width = %s, fabric_quality = %s, total_trolley = %s,
-            meters = %s, matching = %s, order_receive_date = %s, grey_receive_date = %s,
-            remarks = %s, pack_instructions = %s,
-            process_start_time = %s,
-            attached_at = %s
-            WHERE barcode = %s""",
-            (process_name, trolley_barcode, 
-             payload['customer_name'], payload['lot_number'], payload['design_name'], payload['design_number'],
-             payload['grey_width'], payload['finish_width'], payload['fabric_quality'], payload['total_trolley'],
-             payload['meters'], payload['matching'], payload['order_receive_date'], payload['grey_receive_date'],
-             payload['remarks'], payload['pack_instructions'],
-             current_time, current_time, process_barcode)
-        ))
-        
-        # Auto-mirror to output process
-        if paired_output:
-            operations.append((
+        current_time = now or TimeService.get_db_timestamp()
+        
+        # Migrate data to input process, auto-mirror to output process.
+        # The output row must still be EMPTY: a mismatch means the pair is
+        # out of sync and the whole transfer is rolled back.
+        for target in filter(None, (process_barcode, paired_output)):
+            cursor.execute(
                 """UPDATE process_barcodes SET 
                 state = 'IN_PROCESS',
                 process_name = %s,
                 source_trolley_barcode = %s,
-                customer_name = %s, lot_number = %s, design_name = %s, design_number = %s,
-                grey_width = %s, finish_width = %s, fabric_quality = %s, total_trolley = %s,
-                meters = %s, matching = %s, order_receive_date = %s, grey_receive_date = %s,
-                remarks = %s, pack_instructions = %s,
+                lot_id = %s,
                 process_start_time = %s,
                 attached_at = %s
-                WHERE barcode = %s""",
-                (process_name, trolley_barcode, 
-                 payload['customer_name'], payload['lot_number'], payload['design_name'], payload['design_number'],
-                 payload['grey_width'], payload['finish_width'], payload['fabric_quality'], payload['total_trolley'],
-                 payload['meters'], payload['matching'], payload['order_receive_date'], payload['grey_receive_date'],
-                 payload['remarks'], payload['pack_instructions'],
-                 current_time, current_time, paired_output)
-            ))
+                WHERE barcode = %s AND state = 'EMPTY'""",
+                (process_name, trolley_barcode, lot_id, current_time, current_time, target)
+            )
+            if cursor.rowcount != 1 and target == paired_output:
+                raise WorkflowError(
+                    'PROCESSOR_BUSY',
+                    f'Paired output {paired_output} is not EMPTY. Clear it first.'
+                )
         
         # Reset trolley
-        operations.append((
+        cursor.execute(
             """UPDATE trolley_barcodes SET 
-            state = 'EMPTY',
-            customer_name = NULL, lot_number = NULL, design_name = NULL,
-            design_number = NULL, grey_width = NULL, finish_width = NULL, fabric_quality = NULL,
-            total_trolley = NULL, meters = NULL, matching = NULL, order_receive_date = NULL,
-            grey_receive_date = NULL, remarks = NULL, pack_instructions = NULL, attached_at = NULL
+            state = 'EMPTY', lot_id = NULL, attached_at = NULL
             WHERE barcode = %s""",
             (trolley_barcode,)
-        ))
+        )
+        
+        # Check endpoints re-read these barcodes once the transfer commits
+        barcode_cache.invalidate_on_commit(db, trolley_barcode, process_barcode, paired_output)
+        
+        edge_sync.record(cursor, 'input', {
+            'trolleyBarcode': trolley_barcode,
+            'processBarcode': process_barcode,
+            'processName': process_name
+        }, [
+            snapshot('trolley', trolley_barcode, trolley),
+            snapshot('process', process_barcode, process_input)
+        ], current_time)
         
         # Record flow event
-        operations.append((
-            """INSERT INTO tracking_history 
-            (event_type, process_code, process_name, input_trolley, 
-             process_input_barcode, process_output_barcode,
-             customer_name, lot_number, design_name, design_number, grey_width,
-             finish_width, fabric_quality, total_trolley, meters, matching, order_receive_date,
-             grey_receive_date, remarks, pack_instructions,
-             trolley_barcode, process_barcode, from_barcode, to_barcode,
-             process_start_time, status, created_at) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            ('process_input', process_code, process_name, trolley_barcode,
-             process_barcode, paired_output, 
-             payload['customer_name'], payload['lot_number'], payload['design_name'], payload['design_number'],
-             payload['grey_width'], payload['finish_width'], payload['fabric_quality'], payload['total_trolley'],
-             payload['meters'], payload['matching'], payload['order_receive_date'], payload['grey_receive_date'],
-             payload['remarks'], payload['pack_instructions'],
-             trolley_barcode, process_barcode, trolley_barcode, process_barcode, 
-             current_time, 'in_progress', current_time)
-        ))
-        
-        # Execute atomic transaction
-        try:
-            db.execute_transaction(operations)
-            return {
-                'success': True,
-                'message': f'Data migrated from {trolley_barcode} to {process_barcode}',
-                'flow_state': 'CARRIER_TO_PROCESSOR',
-                'data': {
-                    'source': trolley_barcode,
-                    'destination': process_barcode,
-                    'mirror': paired_output,
-                    'process_name': process_name,
-                    'state': 'IN_PROCESS',
-                    'timestamp': TimeService.format_for_display(current_time)
-                }
+        history = dict(
+            payload,
+            lot_id=lot_id,
+            event_type='process_input',
+            process_code=process_code,
+            process_name=process_name,
+            input_trolley=trolley_barcode,
+            process_input_barcode=process_barcode,
+            process_output_barcode=paired_output,
+            trolley_barcode=trolley_barcode,
+            process_barcode=process_barcode,
+            from_barcode=trolley_barcode,
+            to_barcode=process_barcode,
+            process_start_time=current_time,
+            status='in_progress',
+            created_at=current_time
+        )
+        history_id = HistoryRecorder.record(cursor, history)
+        
+        # This worker's running-stations registry (others follow the event bus)
+        wip_registry.started_on_commit(db, [
+            {
+                'barcode': target,
+                'process_type': 'input' if target == process_barcode else 'output',
+                'process_name': process_name,
+                'paired_barcode': paired_output if target == process_barcode else process_barcode,
+                'source_trolley_barcode': trolley_barcode,
+                'lot_id': lot_id,
+                'lot_number': payload['lot_number'],
+                'customer_name': payload['customer_name'],
+                'design_name': payload['design_name'],
+                'process_start_time': current_time
+            }
+            for target in filter(None, (process_barcode, paired_output))
+        ])
+        
+        # Live screens get the delta once the transfer commits
+        event_bus.publish_on_commit(db, 'station.started', {
+            'station': process_barcode,
+            'mirror': paired_output,
+            'trolley': trolley_barcode,
+            'process_name': process_name,
+            'lot_number': payload['lot_number'],
+            'state': 'IN_PROCESS',
+            'history': dict(history, id=history_id)
+        })
+        
+        return {
+            'success': True,
+            'message': f'Data migrated from {trolley_barcode} to {process_barcode}',
+            'flow_state': 'CARRIER_TO_PROCESSOR',
+            'data': {
+                'source': trolley_barcode,
+                'destination': process_barcode,
+                'mirror': paired_output,
+                'process_name': process_name,
+                'state': 'IN_PROCESS',
+                'timestamp': TimeService.format_for_display(current_time)
             }
+        }
+    
+    @staticmethod
+    def transfer_process_to_trolley(output_barcode, trolley_barcode):
+        """
+        FLOW STAGE 2: Processor → Carrier
+        PR-01-out(IN_PROCESS) → TR-02(EMPTY or NON-EXISTENT)
+        """
+        try:
+            return db.run_in_transaction(
+                WorkflowEngine.apply_process_to_trolley,
+                output_barcode, trolley_barcode,
+                prepared=True
+            )
+        except WorkflowError as e:
+            return e.to_result()
         except Exception as e:
             return {
                 'success': False,
                 'message': f'Flow transaction failed: {str(e)}',
                 'error_type': 'TRANSACTION_FAILED'
             }
-    
+
     @staticmethod
-    def transfer_process_to_trolley(output_barcode, trolley_barcode):
+    def apply_process_to_trolley(cursor, output_barcode, trolley_barcode, now=None):
         """
-        FLOW STAGE 2: Processor → Carrier
-        PR-01-out(IN_PROCESS) → TR-02(EMPTY or NON-EXISTENT)
+        Processor → Carrier inside the caller's transaction
+        Lock order: process output, trolley, paired process input
+        now: timestamp of a replayed transfer (default TimeService)
         """
         
-        # Validate process output state
-        process_output = db.fetch_one(
-            "SELECT * FROM process_barcodes WHERE barcode = %s AND process_type = 'output' AND state = 'IN_PROCESS'",
+        # Validate process output state (row stays locked until commit)
+        cursor.execute(
+            "SELECT * FROM view_processes WHERE barcode = %s AND process_type = 'output' FOR UPDATE",
             (output_barcode,)
         )
+        output_row = cursor.fetchone()
+        process_output = output_row if output_row and output_row['state'] == 'IN_PROCESS' else None
+        paired_input = output_row.get('paired_barcode') if output_row else None
+        
+        # Auto-mirror disabled: the lot was only written to the paired input
+        if not process_output and paired_input and not settings_store.auto_mirror_enabled():
+            cursor.execute(
+                "SELECT * FROM view_processes WHERE barcode = %s AND state = 'IN_PROCESS' FOR UPDATE",
+                (paired_input,)
+            )
+            process_output = cursor.fetchone()
         
         if not process_output:
-            return {
-                'success': False,
-                'message': 'Process output is empty or not in progress. Cannot transfer.',
-                'error_type': 'PROCESSOR_EMPTY'
-            }
+            raise WorkflowError(
+                'PROCESSOR_EMPTY',
+                'Process output is empty or not in progress. Cannot transfer.'
+            )
         
-        # Extract process data (payload)
-        payload = {
-            'customer_name': process_output['customer_name'],
-            'lot_number': process_output['lot_number'],
-            'design_name': process_output['design_name'],
-            'design_number': process_output['design_number'],
-            'grey_width': process_output['grey_width'],
-            'finish_width': process_output['finish_width'],
-            'fabric_quality': process_output['fabric_quality'],
-            'total_trolley': process_output['total_trolley'],
-            'meters': process_output['meters'],
-            'matching': process_output['matching'],
-            'order_receive_date': process_output['order_receive_date'],
-            'grey_receive_date': process_output['grey_receive_date'],
-            'remarks': process_output['remarks'],
-            'pack_instructions': process_output['pack_instructions']
-        }
+        # Process data (payload) moves by reference
+        lot_id = process_output['lot_id']
+        payload = Lots.payload(process_output)
         
         # Get flow metadata
-        paired_input = process_output.get('paired_barcode')
         process_code = output_barcode.rsplit('-', 1)[0] if '-' in output_barcode else output_barcode
         process_name = process_output.get('process_name')
         source_trolley = process_output.get('source_trolley_barcode')
         start_time = process_output.get('process_start_time')
         
         # ⭐ TIME ENGINE: Get current timestamp
-        current_time = TimeService.get_db_timestamp()
+        current_time = now or TimeService.get_db_timestamp()
         
         # Calculate duration
         duration_seconds = TimeService.calculate_duration(start_time, current_time) if start_time else None
         
-        # Check if target trolley exists
-        existing_trolley = db.fetch_one(
-            "SELECT * FROM trolley_barcodes WHERE barcode = %s",
+        # Check if target trolley exists (locks the row, or the index gap
+        # for a new barcode so a concurrent auto-provision deadlocks and retries)
+        cursor.execute(
+            "SELECT * FROM trolley_barcodes WHERE barcode = %s FOR UPDATE",
             (trolley_barcode,)
         )
-        
-        # Build transaction
-        operations = []
+        existing_trolley = cursor.fetchone()
         
         # Migrate data to trolley
         if existing_trolley:
-            operations.append((
+            cursor.execute(
                 """UPDATE trolley_barcodes SET 
-                state = 'FULL',
-                customer_name = %s, lot_number = %s, design_name = %s, design_number = %s,
-                grey_width = %s, finish_width = %s, fabric_quality = %s, total_trolley = %s,
-                meters = %s, matching = %s, order_receive_date = %s, grey_receive_date = %s,
-                remarks = %s, pack_instructions = %s,
-                attached_at = %s
+                state = 'FULL', lot_id = %s, attached_at = %s
                 WHERE barcode = %s""",
-                (payload['customer_name'], payload['lot_number'], payload['design_name'], payload['design_number'],
-                 payload['grey_width'], payload['finish_width'], payload['fabric_quality'], payload['total_trolley'],
-                 payload['meters'], payload['matching'], payload['order_receive_date'], payload['grey_receive_date'],
-                 payload['remarks'], payload['pack_instructions'],
-                 current_time, trolley_barcode)
-            ))
+                (lot_id, current_time, trolley_barcode)
+            )
         else:
             # Auto-provision new trolley
-            operations.append((
+            cursor.execute(
                 """INSERT INTO trolley_barcodes 
-                (barcode, state, customer_name, lot_number, design_name, design_number, grey_width,
-                 finish_width, fabric_quality, total_trolley, meters, matching, order_receive_date,
-                 grey_receive_date, remarks, pack_instructions, attached_at, created_at) 
-                VALUES (%s, 'FULL', %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                (trolley_barcode, 
-                 payload['customer_name'], payload['lot_number'], payload['design_name'], payload['design_number'],
-                 payload['grey_width'], payload['finish_width'], payload['fabric_quality'], payload['total_trolley'],
-                 payload['meters'], payload['matching'], payload['order_receive_date'], payload['grey_receive_date'],
-                 payload['remarks'], payload['pack_instructions'],
-                 current_time, current_time)
-            ))
-        
-        # Reset output process
-        operations.append((
-            """UPDATE process_barcodes SET 
-            state = 'EMPTY',
-            customer_name = NULL, lot_number = NULL, design_name = NULL,
-            design_number = NULL, grey_width = NULL, finish_width = NULL, fabric_quality = NULL,
-            total_trolley = NULL, meters = NULL, matching = NULL, order_receive_date = NULL,
-            grey_receive_date = NULL, remarks = NULL, pack_instructions = NULL,
-            source_trolley_barcode = NULL, process_name = NULL,
-            process_start_time = NULL, process_end_time = %s, attached_at = NULL
-            WHERE barcode = %s""",
-            (current_time, output_barcode)
-        ))
-        
-        # Reset input process (paired)
-        if paired_input:
-            operations.append((
+                (barcode, state, lot_id, attached_at, created_at) 
+                VALUES (%s, 'FULL', %s, %s, %s)""",
+                (trolley_barcode, lot_id, current_time, current_time)
+            )
+        
+        # Reset output process, then input process (paired)
+        for target in filter(None, (output_barcode, paired_input)):
+            cursor.execute(
                 """UPDATE process_barcodes SET 
-                state = 'EMPTY',
-                customer_name = NULL, lot_number = NULL, design_name = NULL,
-                design_number = NULL, grey_width = NULL, finish_width = NULL, fabric_quality = NULL,
-                total_trolley = NULL, meters = NULL, matching = NULL, order_receive_date = NULL,
-                grey_receive_date = NULL, remarks = NULL, pack_instructions = NULL,
+                state = 'EMPTY', lot_id = NULL,
                 source_trolley_barcode = NULL, process_name = NULL,
                 process_start_time = NULL, process_end_time = %s, attached_at = NULL
                 WHERE barcode = %s""",
-                (current_time, paired_input)
-            ))
+                (current_time, target)
+            )
+        
+        # Check endpoints re-read these barcodes once the transfer commits
+        barcode_cache.invalidate_on_commit(db, output_barcode, trolley_barcode, paired_input)
+        
+        edge_sync.record(cursor, 'output', {
+            'outputBarcode': output_barcode,
+            'trolleyBarcode': trolley_barcode
+        }, [
+            snapshot('process', process_output['barcode'], process_output),
+            snapshot('trolley', trolley_barcode, existing_trolley)
+        ], current_time)
         
         # Record flow completion
-        operations.append((
-            """INSERT INTO tracking_history 
-            (event_type, process_code, process_name, input_trolley, output_trolley,
-             process_input_barcode, process_output_barcode,
-             customer_name, lot_number, design_name, design_number, grey_width,
-             finish_width, fabric_quality, total_trolley, meters, matching, order_receive_date,
-             grey_receive_date, remarks, pack_instructions,
-             process_barcode, trolley_barcode, from_barcode, to_barcode,
-             process_start_time, process_end_time, duration_seconds, status, created_at) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            ('process_output', process_code, process_name,
-             source_trolley, trolley_barcode, paired_input, output_barcode,
-             payload['customer_name'], payload['lot_number'], payload['design_name'], payload['design_number'],
-             payload['grey_width'], payload['finish_width'], payload['fabric_quality'], payload['total_trolley'],
-             payload['meters'], payload['matching'], payload['order_receive_date'], payload['grey_receive_date'],
-             payload['remarks'], payload['pack_instructions'],
-             output_barcode, trolley_barcode, output_barcode, trolley_barcode,
-             start_time, current_time, duration_seconds, 'completed', current_time)
-        ))
-        
-        # Execute atomic transaction
-        try:
-            db.execute_transaction(operations)
-            
-            return {
-                'success': True,
-                'message': f'Data migrated from {output_barcode} to {trolley_barcode}',
-                'flow_state': 'PROCESSOR_TO_CARRIER',
-                'data': {
-                    'source': output_barcode,
-                    'destination': trolley_barcode,
-                    'process_name': process_name,
-                    'original_trolley': source_trolley,
-                    'duration_seconds': duration_seconds,
-                    'state': 'COMPLETED',
-                    'carrier_provisioned': not existing_trolley,
-                    'timestamp': TimeService.format_for_display(current_time)
-                }
-            }
-        except Exception as e:
-            return {
-                'success': False,
-                'message': f'Flow transaction failed: {str(e)}',
-                'error_type': 'TRANSACTION_FAILED'
+        history = dict(
+            payload,
+            lot_id=lot_id,
+            event_type='process_output',
+            process_code=process_code,
+            process_name=process_name,
+            input_trolley=source_trolley,
+            output_trolley=trolley_barcode,
+            process_input_barcode=paired_input,
+            process_output_barcode=output_barcode,
+            process_barcode=output_barcode,
+            trolley_barcode=trolley_barcode,
+            from_barcode=output_barcode,
+            to_barcode=trolley_barcode,
+            process_start_time=start_time,
+            process_end_time=current_time,
+            duration_seconds=duration_seconds,
+            status='completed',
+            created_at=current_time
+        )
+        history_id = HistoryRecorder.record(cursor, history)
+        
+        wip_registry.finished_on_commit(db, output_barcode, paired_input)
+        
+        event_bus.publish_on_commit(db, 'station.finished', {
+            'station': output_barcode,
+            'paired_input': paired_input,
+            'trolley': trolley_barcode,
+            'process_name': process_name,
+            'lot_number': payload['lot_number'],
+            'duration_seconds': duration_seconds,
+            'state': 'FULL',
+            'history': dict(history, id=history_id)
+        })
+        
+        return {
+            'success': True,
+            'message': f'Data migrated from {output_barcode} to {trolley_barcode}',
+            'flow_state': 'PROCESSOR_TO_CARRIER',
+            'data': {
+                'source': output_barcode,
+                'destination': trolley_barcode,
+                'process_name': process_name,
+                'original_trolley': source_trolley,
+                'duration_seconds': duration_seconds,
+                'state': 'COMPLETED',
+                'carrier_provisioned': not existing_trolley,
+                'timestamp': TimeService.format_for_display(current_time)
             }
+        }
 
 
 # ============================================================================
@@ -366,6 +417,9 @@ class WorkflowEngine:
 def process_input():
     """API: Carrier → Processor flow"""
     try:
+        if settings_store.maintenance_mode():
+            return jsonify(MAINTENANCE_RESULT), 503
+        
         data = request.get_json()
         trolley_barcode = data.get('trolleyBarcode')
         process_barcode = data.get('processBarcode')
@@ -400,6 +454,9 @@ def process_input():
 def process_output():
     """API: Processor → Carrier flow"""
     try:
+        if settings_store.maintenance_mode():
+            return jsonify(MAINTENANCE_RESULT), 503
+        
         data = request.get_json()
         output_barcode = data.get('outputBarcode')
         trolley_barcode = data.get('trolleyBarcode')
@@ -428,14 +485,200 @@ def process_output():
         }), 500
 
 
+# ============================================================================
+# BATCH TRANSFERS (buffered scanner stations)
+# ============================================================================
+
+MAX_BATCH_TRANSFERS = 500
+BATCH_MODES = ('atomic', 'best_effort')
+
+
+class BatchAborted(Exception):
+    """Atomic batch stopped at a failing item; rolls back the whole batch"""
+
+    def __init__(self, index, result):
+        super().__init__(result['message'])
+        self.index = index
+        self.result = result
+
+
+def _parse_batch_item(item):
+    """
+    Validate one buffered scan
+    Returns: (apply function, args) or raises WorkflowError
+    """
+    if not isinstance(item, dict):
+        raise WorkflowError('INVALID_REQUEST', 'Each transfer must be an object')
+
+    transfer_type = item.get('type')
+    if transfer_type == 'input':
+        trolley_barcode = item.get('trolleyBarcode')
+        process_barcode = item.get('processBarcode')
+        if not all([trolley_barcode, process_barcode]):
+            raise WorkflowError('INVALID_REQUEST', 'Trolley and process barcodes required')
+        return WorkflowEngine.apply_trolley_to_process, (
+            trolley_barcode, process_barcode, item.get('processName', 'Unknown Process')
+        )
+    if transfer_type == 'output':
+        output_barcode = item.get('outputBarcode')
+        trolley_barcode = item.get('trolleyBarcode')
+        if not all([output_barcode, trolley_barcode]):
+            raise WorkflowError('INVALID_REQUEST', 'Output and trolley barcodes required')
+        return WorkflowEngine.apply_process_to_trolley, (output_barcode, trolley_barcode)
+
+    raise WorkflowError('INVALID_REQUEST', "Transfer type must be 'input' or 'output'")
+
+
+def _run_atomic_batch(cursor, steps):
+    """All-or-nothing: the first rejected transfer aborts the batch"""
+    results = []
+    for index, (apply, args) in enumerate(steps):
+        try:
+            results.append(apply(cursor, *args))
+        except WorkflowError as e:
+            raise BatchAborted(index, e.to_result())
+    return results
+
+
+def _run_best_effort_batch(cursor, steps):
+    """Best-effort: each transfer gets a savepoint; failures are undone individually"""
+    results = []
+    for index, step in enumerate(steps):
+        if isinstance(step, WorkflowError):
+            results.append(step.to_result())
+            continue
+        apply, args = step
+        try:
+            with db.savepoint(cursor, f'batch_item_{index}'):
+                results.append(apply(cursor, *args))
+        except WorkflowError as e:
+            results.append(e.to_result())
+        except Error as e:
+            # A deadlock already rolled back the whole transaction: let
+            # run_in_transaction retry the batch from the start
+            if getattr(e, 'errno', None) == DEADLOCK_ERRNO:
+                raise
+            results.append({
+                'success': False,
+                'message': f'Flow transaction failed: {str(e)}',
+                'error_type': 'TRANSACTION_FAILED'
+            })
+    return results
+
+
+@process_bp.route('/batch', methods=['POST'])
+def process_batch():
+    """
+    API: Replay an ordered list of buffered transfers in one request
+    
+    Body:
+        mode: 'atomic' (default) or 'best_effort'
+        transfers: [
+            {type: 'input', trolleyBarcode, processBarcode, processName},
+            {type: 'output', outputBarcode, trolleyBarcode}
+        ]
+    
+    All transfers run in order on one connection and one transaction,
+    using the same WorkflowEngine state rules as /input and /output.
+    """
+    try:
+        if settings_store.maintenance_mode():
+            return jsonify(MAINTENANCE_RESULT), 503
+        
+        data = request.get_json() or {}
+        mode = data.get('mode', 'atomic')
+        transfers = data.get('transfers')
+        
+        if mode not in BATCH_MODES:
+            return jsonify({'success': False, 'message': f"Mode must be one of {', '.join(BATCH_MODES)}"}), 400
+        if not isinstance(transfers, list) or not transfers:
+            return jsonify({'success': False, 'message': 'Transfers list required'}), 400
+        if len(transfers) > MAX_BATCH_TRANSFERS:
+            return jsonify({
+                'success': False,
+                'message': f'At most {MAX_BATCH_TRANSFERS} transfers per batch'
+            }), 400
+        
+        steps = []
+        for index, item in enumerate(transfers):
+            try:
+                steps.append(_parse_batch_item(item))
+            except WorkflowError as e:
+                if mode == 'atomic':
+                    result = e.to_result()
+                    result['index'] = index
+                    return jsonify({
+                        'success': False,
+                        'mode': mode,
+                        'message': f'Transfer {index} is invalid: {e.message}',
+                        'failedIndex': index,
+                        'results': [result]
+                    }), 400
+                steps.append(e)
+        
+        if mode == 'atomic':
+            try:
+                results = db.run_in_transaction(_run_atomic_batch, steps, prepared=True)
+            except BatchAborted as e:
+                results = []
+                for index in range(len(steps)):
+                    if index < e.index:
+                        results.append({
+                            'success': False,
+                            'message': 'Rolled back because a later transfer failed',
+                            'error_type': 'ROLLED_BACK'
+                        })
+                    elif index == e.index:
+                        results.append(e.result)
+                    else:
+                        results.append({
+                            'success': False,
+                            'message': 'Skipped because an earlier transfer failed',
+                            'error_type': 'SKIPPED'
+                        })
+                for index, result in enumerate(results):
+                    result['index'] = index
+                return jsonify({
+                    'success': False,
+                    'mode': mode,
+                    'message': f'Transfer {e.index} failed: {e.result["message"]}. No changes were saved.',
+                    'failedIndex': e.index,
+                    'committed': 0,
+                    'failed': len(results),
+                    'results': results
+                }), 400
+        else:
+            results = db.run_in_transaction(_run_best_effort_batch, steps, prepared=True)
+        
+        for index, result in enumerate(results):
+            result['index'] = index
+        committed = sum(1 for result in results if result['success'])
+        
+        return jsonify({
+            'success': committed == len(results),
+            'mode': mode,
+            'message': f'{committed} of {len(results)} transfers applied',
+            'committed': committed,
+            'failed': len(results) - committed,
+            'results': results
+        }), 200
+            
+    except Exception as e:
+        print(f"Process batch error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'message': f'Server error: {str(e)}',
+            'error_type': 'SERVER_ERROR'
+        }), 500
+
+
 @process_bp.route('/check/<barcode>', methods=['GET'])
 def check_process(barcode):
     """API: Get process barcode state and type"""
     try:
-        process = db.fetch_one(
-            "SELECT * FROM process_barcodes WHERE barcode = %s",
-            (barcode,)
-        )
+        process = barcode_cache.process(db, barcode)
         
         if process:
             return jsonify({
@@ -459,6 +702,44 @@ def check_process(barcode):
         return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
 
 
+@process_bp.route('/active', methods=['GET'])
+def active_processes():
+    """
+    API: Stations running now, longest running first (from the WIP registry)
+    
+    Query:
+        stuckAfter: seconds after which a station counts as stuck
+                    (default WIP_STUCK_SECONDS; 0 disables)
+        stuck: 'true' to list only stuck stations
+        type: 'input' or 'output'
+        processName: only this process (case-insensitive)
+    """
+    try:
+        stuck_after = request.args.get('stuckAfter', type=int)
+        process_type = request.args.get('type')
+        if process_type not in (None, 'input', 'output'):
+            return jsonify({'success': False, 'message': "type must be 'input' or 'output'"}), 400
+        
+        stations = wip_registry.active(stuck_after, process_type, request.args.get('processName'))
+        stuck = [station for station in stations if station['stuck']]
+        if request.args.get('stuck', '').lower() == 'true':
+            stations = stuck
+        
+        return jsonify({
+            'success': True,
+            'data': stations,
+            'count': len(stations),
+            'stuckCount': len(stuck),
+            'stuckAfter': wip_registry.stuck_seconds if stuck_after is None else stuck_after,
+            'registry': wip_registry.info()
+        })
+    except Exception as e:
+        print(f"Active processes error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+
+
 @process_bp.route('/transfer', methods=['POST'])
 def transfer_to_trolley():
     """Legacy endpoint - redirects to /output"""
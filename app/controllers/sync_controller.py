@@ -0,0 +1,383 @@
+from flask import Blueprint, request, jsonify
+import hmac
+import json
+from mysql.connector import Error
+from config.database import db, DEADLOCK_ERRNO
+from core.time_engine import TimeService
+from core.settings_store import settings_store, MAINTENANCE_RESULT
+from core.edge_sync import (
+    edge_sync, snapshot, decode_batch, parse_timestamp,
+    SYNC_APPLIED, SYNC_CONFLICT, SYNC_REJECTED
+)
+from app.controllers.process_controller import WorkflowEngine, WorkflowError
+from app.controllers.trolley_controller import TROLLEY_FIELDS, apply_attach, apply_clear
+
+sync_bp = Blueprint('sync', __name__)
+
+MAX_SYNC_OPS = 1000
+MAX_SYNC_BYTES = 16 * 1024 * 1024
+SYNC_VIEWS = {'trolley': 'view_trolleys', 'process': 'view_processes'}
+
+
+class SyncGap(Exception):
+    """A batch does not continue where the node's last applied seq ended"""
+
+    def __init__(self, expected):
+        super().__init__(f'Expected seq {expected}')
+        self.expected = expected
+
+
+class SyncConflict(Exception):
+    """Barcodes an edge op was based on have changed on central"""
+
+    def __init__(self, drift):
+        super().__init__('; '.join(
+            f"{item['barcode']}: central {_describe(item['central'])}, edge saw {_describe(item['edge'])}"
+            for item in drift
+        ))
+        self.drift = drift
+
+
+def _describe(entry):
+    if entry['state'] is None:
+        return 'missing'
+    lot_number = entry.get('lot_number')
+    return f"{entry['state']} (lot {lot_number})" if lot_number else entry['state']
+
+
+def _timestamp(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _occurred_at(op):
+    try:
+        return parse_timestamp(op['occurred_at'])
+    except (KeyError, ValueError):
+        return None
+
+
+def _diverged(cursor, base):
+    """Base entries whose central state differs from what the edge saw (rows stay locked)"""
+    drift = []
+    for entry in base:
+        view = SYNC_VIEWS[entry['kind']]
+        cursor.execute(f'SELECT state, lot_number FROM {view} WHERE barcode = %s FOR UPDATE', (entry['barcode'],))
+        current = snapshot(entry['kind'], entry['barcode'], cursor.fetchone())
+        if current['state'] != entry['state'] or (
+                'lot_number' in entry and current.get('lot_number') != entry['lot_number']):
+            drift.append({'barcode': entry['barcode'], 'edge': entry, 'central': current})
+    return drift
+
+
+def _replay(cursor, op, payload, occurred_at):
+    """Apply one edge op with the edge's timestamp; returns its message"""
+    if op == 'attach':
+        fields = {column: payload['fields'].get(column) for column, keys in TROLLEY_FIELDS}
+        apply_attach(cursor, [(payload['barcode'], fields)], occurred_at)
+        return f"Trolley {payload['barcode']} attached"
+    if op == 'input':
+        return WorkflowEngine.apply_trolley_to_process(
+            cursor, payload['trolleyBarcode'], payload['processBarcode'], payload['processName'], now=occurred_at
+        )['message']
+    if op == 'output':
+        return WorkflowEngine.apply_process_to_trolley(
+            cursor, payload['outputBarcode'], payload['trolleyBarcode'], now=occurred_at
+        )['message']
+    if op == 'clear':
+        apply_clear(cursor, payload['barcode'], now=occurred_at)
+        return f"Trolley {payload['barcode']} cleared"
+    raise ValueError(f'unknown op {op!r}')
+
+
+def _apply_op(cursor, index, op):
+    """
+    Check and replay one op under its own savepoint
+    Returns: (status, message, detail)
+    """
+    try:
+        occurred_at = parse_timestamp(op['occurred_at'])
+        with db.savepoint(cursor, f'sync_op_{index}'):
+            drift = _diverged(cursor, op.get('base') or [])
+            if drift:
+                raise SyncConflict(drift)
+            return SYNC_APPLIED, _replay(cursor, op['op'], op['payload'], occurred_at), None
+    except SyncConflict as e:
+        return SYNC_CONFLICT, str(e), json.dumps(e.drift, default=str)
+    except WorkflowError as e:
+        return SYNC_REJECTED, f'{e.error_type}: {e.message}', None
+    except Error as e:
+        # A deadlock already rolled back the whole transaction: retry the batch
+        if getattr(e, 'errno', None) == DEADLOCK_ERRNO:
+            raise
+        return SYNC_REJECTED, f'Replay failed: {str(e)}', None
+    except (KeyError, TypeError, ValueError) as e:
+        return SYNC_REJECTED, f'Invalid op: {str(e)}', None
+
+
+def _ingest(cursor, node_id, ops):
+    """
+    Apply a node's batch in one transaction
+    Returns: (per-op results in request order, node's last applied seq)
+    """
+    now = TimeService.get_db_timestamp()
+    cursor.execute('INSERT IGNORE INTO sync_nodes (node_id, last_seq) VALUES (%s, 0)', (node_id,))
+    # Serializes pushes of the same node (a retry racing the original)
+    cursor.execute('SELECT last_seq FROM sync_nodes WHERE node_id = %s FOR UPDATE', (node_id,))
+    last_seq = cursor.fetchone()['last_seq']
+
+    fresh = sorted((op for op in ops if op['seq'] > last_seq), key=lambda op: op['seq'])
+    for offset, op in enumerate(fresh):
+        if op['seq'] != last_seq + 1 + offset:
+            raise SyncGap(last_seq + 1)
+
+    # Already applied: answer from the log, never apply twice
+    results = {}
+    replayed = [op['seq'] for op in ops if op['seq'] <= last_seq]
+    if replayed:
+        cursor.execute(
+            f"""SELECT seq, status, message FROM sync_ingest_log
+            WHERE node_id = %s AND seq IN ({', '.join(['%s'] * len(replayed))})""",
+            (node_id, *replayed)
+        )
+        for row in cursor.fetchall():
+            results[row['seq']] = {'seq': row['seq'], 'status': row['status'], 'message': row['message'], 'duplicate': True}
+
+    log = []
+    for index, op in enumerate(fresh):
+        status, message, detail = _apply_op(cursor, index, op)
+        results[op['seq']] = {'seq': op['seq'], 'status': status, 'message': message, 'duplicate': False}
+        log.append((node_id, op['seq'], op['op'], status, (message or '')[:1000], detail,
+                    _occurred_at(op), now))
+
+    if log:
+        cursor.executemany(
+            """INSERT INTO sync_ingest_log
+            (node_id, seq, op, status, message, detail, occurred_at, applied_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+            log
+        )
+        last_seq = fresh[-1]['seq']
+    cursor.execute(
+        'UPDATE sync_nodes SET last_seq = %s, last_seen_at = %s WHERE node_id = %s',
+        (last_seq, now, node_id)
+    )
+    return [results.get(seq, {'seq': seq, 'status': SYNC_APPLIED, 'message': None, 'duplicate': True})
+            for seq in (op['seq'] for op in ops)], last_seq
+
+
+def _refuse():
+    """Error response unless this is central and the request carries SYNC_TOKEN"""
+    if edge_sync.enabled:
+        return jsonify({'success': False, 'message': 'This is an edge node; push to central'}), 403
+    if not edge_sync.token:
+        return jsonify({'success': False, 'message': 'Sync ingest is disabled (SYNC_TOKEN not set)'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Sync-Token', '').encode(), edge_sync.token.encode()):
+        return jsonify({'success': False, 'message': 'Invalid sync token'}), 401
+    if settings_store.maintenance_mode():
+        return jsonify(MAINTENANCE_RESULT), 503
+    return None
+
+
+def _resync(cursor, node_id, last_seq):
+    """Move a node's last applied seq forward; returns the seqs skipped (None: unknown node)"""
+    cursor.execute('SELECT last_seq FROM sync_nodes WHERE node_id = %s FOR UPDATE', (node_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    if last_seq < row['last_seq']:
+        # Going back would apply ops twice
+        raise SyncGap(row['last_seq'] + 1)
+    cursor.execute(
+        'UPDATE sync_nodes SET last_seq = %s, last_seen_at = %s WHERE node_id = %s',
+        (last_seq, TimeService.get_db_timestamp(), node_id)
+    )
+    return last_seq - row['last_seq']
+
+
+@sync_bp.route('/ingest', methods=['POST'])
+def ingest():
+    """
+    API: Apply a batch of transitions pushed by an edge node (central only)
+
+    Headers: X-Sync-Token (SYNC_TOKEN), Content-Encoding: deflate (optional)
+    Body: {node, ops: [{seq, op, payload, base, occurred_at}]}
+
+    Ops must continue at the node's last applied seq + 1 (409 with
+    expectedSeq otherwise). Seqs already applied are answered from the
+    log. Each new op is either applied (replayed through WorkflowEngine
+    with the edge's timestamp), a conflict (a barcode it was based on
+    changed here) or rejected (the state machine refused it).
+    """
+    try:
+        refused = _refuse()
+        if refused:
+            return refused
+
+        try:
+            batch = decode_batch(request.get_data(), request.headers.get('Content-Encoding') == 'deflate', MAX_SYNC_BYTES)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': f'Invalid batch: {str(e)}'}), 400
+
+        node_id = batch.get('node') if isinstance(batch, dict) else None
+        ops = batch.get('ops') if isinstance(batch, dict) else None
+        if not isinstance(node_id, str) or not 0 < len(node_id) <= 100 or not isinstance(ops, list):
+            return jsonify({'success': False, 'message': 'node and a list of ops are required'}), 400
+        if len(ops) > MAX_SYNC_OPS:
+            return jsonify({'success': False, 'message': f'At most {MAX_SYNC_OPS} ops per batch'}), 400
+        if not all(isinstance(op, dict) and isinstance(op.get('seq'), int) and op['seq'] > 0
+                   and isinstance(op.get('op'), str) for op in ops):
+            return jsonify({'success': False, 'message': 'Each op needs a positive integer seq and an op name'}), 400
+        if len({op['seq'] for op in ops}) != len(ops):
+            return jsonify({'success': False, 'message': 'Duplicate seq in batch'}), 400
+
+        try:
+            results, last_seq = db.run_in_transaction(_ingest, node_id, ops)
+        except SyncGap as e:
+            return jsonify({'success': False, 'message': str(e), 'expectedSeq': e.expected}), 409
+
+        return jsonify({
+            'success': True,
+            'node': node_id,
+            'lastSeq': last_seq,
+            'applied': sum(1 for r in results if r['status'] == SYNC_APPLIED and not r['duplicate']),
+            'conflicts': sum(1 for r in results if r['status'] == SYNC_CONFLICT and not r['duplicate']),
+            'rejected': sum(1 for r in results if r['status'] == SYNC_REJECTED and not r['duplicate']),
+            'results': results
+        })
+    except Exception as e:
+        print(f"Sync ingest error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+
+
+@sync_bp.route('/resync', methods=['POST'])
+def resync():
+    """
+    API: Skip ops an edge node can no longer send (central only)
+
+    Headers: X-Sync-Token
+    Body: {node, lastSeq}
+
+    Used by `manage.py sync-resync` on an edge halted because central
+    (restored from a backup) expects seqs the edge has pruned. Those ops
+    are lost on central; the skip is logged. lastSeq may only move
+    forward (409 with expectedSeq otherwise).
+    """
+    try:
+        refused = _refuse()
+        if refused:
+            return refused
+        body = request.get_json(silent=True) or {}
+        node_id, last_seq = body.get('node'), body.get('lastSeq')
+        if not isinstance(node_id, str) or not isinstance(last_seq, int) or last_seq < 0:
+            return jsonify({'success': False, 'message': 'node and a non-negative integer lastSeq are required'}), 400
+        try:
+            skipped = db.run_in_transaction(_resync, node_id, last_seq)
+        except SyncGap as e:
+            return jsonify({'success': False, 'message': f'Cannot move back: {str(e)}', 'expectedSeq': e.expected}), 409
+        if skipped is None:
+            return jsonify({'success': False, 'message': f'Unknown node {node_id}'}), 404
+        print(f"Sync resync: node {node_id} skipped {skipped} ops, last seq now {last_seq}")
+        return jsonify({'success': True, 'node': node_id, 'lastSeq': last_seq, 'skipped': skipped})
+    except Exception as e:
+        print(f"Sync resync error: {str(e)}")
+        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+
+
+@sync_bp.route('/status', methods=['GET'])
+def sync_status():
+    """
+    API: Edge: outbox depth and outcomes. Central: last seq and
+    unresolved conflicts per edge node
+    """
+    try:
+        if edge_sync.enabled:
+            status = edge_sync.status()
+            for key in ('oldestPendingAt', 'lastAckedAt'):
+                status[key] = _timestamp(status[key])
+            return jsonify({'success': True, 'data': status})
+
+        nodes = db.fetch_all(
+            """SELECT n.node_id, n.last_seq, n.last_seen_at,
+                SUM(CASE WHEN l.status = 'conflict' THEN 1 ELSE 0 END) as conflicts,
+                SUM(CASE WHEN l.status = 'rejected' THEN 1 ELSE 0 END) as rejected
+            FROM sync_nodes n
+            LEFT JOIN sync_ingest_log l ON l.node_id = n.node_id AND l.status <> 'applied'
+            GROUP BY n.node_id, n.last_seq, n.last_seen_at
+            ORDER BY n.node_id"""
+        )
+        return jsonify({'success': True, 'data': {
+            'role': edge_sync.role,
+            'ingestEnabled': bool(edge_sync.token),
+            'nodes': [
+                {
+                    'node': row['node_id'],
+                    'lastSeq': row['last_seq'],
+                    'lastSeenAt': _timestamp(row['last_seen_at']),
+                    'conflicts': int(row['conflicts'] or 0),
+                    'rejected': int(row['rejected'] or 0),
+                }
+                for row in nodes
+            ]
+        }})
+    except Exception as e:
+        print(f"Sync status error: {str(e)}")
+        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+
+
+@sync_bp.route('/conflicts', methods=['GET'])
+def sync_conflicts():
+    """
+    API: Ops that were not applied on central (conflict or rejected),
+    newest first
+
+    Query: limit (default 100, max 1000); node (central only)
+    """
+    try:
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        if edge_sync.enabled:
+            rows = db.fetch_all(
+                """SELECT seq, op, payload, status, message, occurred_at, acked_at FROM sync_outbox
+                WHERE status IN ('conflict', 'rejected') ORDER BY seq DESC LIMIT %s""",
+                (limit,)
+            )
+            items = [
+                {
+                    'node': edge_sync.node_id,
+                    'seq': row['seq'],
+                    'op': row['op'],
+                    'payload': json.loads(row['payload']),
+                    'status': row['status'],
+                    'message': row['message'],
+                    'occurredAt': _timestamp(row['occurred_at']),
+                    'reportedAt': _timestamp(row['acked_at']),
+                }
+                for row in rows
+            ]
+        else:
+            node_id = request.args.get('node')
+            rows = db.fetch_all(
+                f"""SELECT node_id, seq, op, status, message, detail, occurred_at, applied_at
+                FROM sync_ingest_log
+                WHERE status <> 'applied' {'AND node_id = %s' if node_id else ''}
+                ORDER BY applied_at DESC, seq DESC LIMIT %s""",
+                (node_id, limit) if node_id else (limit,)
+            )
+            items = [
+                {
+                    'node': row['node_id'],
+                    'seq': row['seq'],
+                    'op': row['op'],
+                    'status': row['status'],
+                    'message': row['message'],
+                    'detail': json.loads(row['detail']) if row['detail'] else None,
+                    'occurredAt': _timestamp(row['occurred_at']),
+                    'reportedAt': _timestamp(row['applied_at']),
+                }
+                for row in rows
+            ]
+        return jsonify({'success': True, 'data': items, 'count': len(items)})
+    except Exception as e:
+        print(f"Sync conflicts error: {str(e)}")
+        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
@@ -1,9 +1,49 @@
 from flask import Blueprint, request, jsonify
-from config.database import Database
+import csv
+import io
+from datetime import date
+from config.database import db
 from core.time_engine import TimeService
+from core.history_recorder import HistoryRecorder
+from core.barcode_cache import barcode_cache
+from core.settings_store import settings_store, MAINTENANCE_RESULT
+from core.event_bus import event_bus
+from core.lots import Lots
+from core.edge_sync import edge_sync, snapshot
 
 trolley_bp = Blueprint('trolley', __name__)
-db = Database()
+
+# lots column -> request keys, first non-empty wins
+TROLLEY_FIELDS = (
+    ('customer_name', ('customerName',)),
+    ('lot_number', ('lotNumber', 'greigeSort')),
+    ('design_name', ('designName',)),
+    ('design_number', ('designNumber',)),
+    ('grey_width', ('greyWidth',)),
+    ('finish_width', ('finishWidth',)),
+    ('fabric_quality', ('fabricQuality', 'quality')),
+    ('total_trolley', ('totalTrolley', 'quantity')),
+    ('meters', ('meters',)),
+    ('matching', ('matching', 'color')),
+    ('order_receive_date', ('orderReceiveDate',)),
+    ('grey_receive_date', ('greyReceiveDate',)),
+    ('remarks', ('remarks',)),
+    ('pack_instructions', ('packInstructions',)),
+)
+
+MAX_BULK_ATTACH = 1000
+BULK_MODES = ('atomic', 'best_effort')
+
+
+def extract_trolley_fields(data):
+    """Map attach request keys (including aliases) to lots columns"""
+    fields = {}
+    for column, keys in TROLLEY_FIELDS:
+        value = data.get(keys[0])
+        for alias in keys[1:]:
+            value = value or data.get(alias)
+        fields[column] = value
+    return fields
 
 @trolley_bp.route('/attach', methods=['POST'])
 def attach_trolley():
@@ -12,24 +52,28 @@ def attach_trolley():
     Uses TimeService for consistent timestamps
     """
     try:
+        if settings_store.maintenance_mode():
+            return jsonify(MAINTENANCE_RESULT), 503
+
         data = request.get_json()
         barcode = data.get('barcode')
         
-        # Extract all parameters
-        customer_name = data.get('customerName')
-        lot_number = data.get('lotNumber') or data.get('greigeSort')
-        design_name = data.get('designName')
-        design_number = data.get('designNumber')
-        grey_width = data.get('greyWidth')
-        finish_width = data.get('finishWidth')
-        fabric_quality = data.get('fabricQuality') or data.get('quality')
-        total_trolley = data.get('totalTrolley') or data.get('quantity')
-        meters = data.get('meters')
-        matching = data.get('matching') or data.get('color')
-        order_receive_date = data.get('orderReceiveDate')
-        grey_receive_date = data.get('greyReceiveDate')
-        remarks = data.get('remarks')
-        pack_instructions = data.get('packInstructions')
+        # Extract all parameters (aliases shared with /attach/bulk)
+        fields = extract_trolley_fields(data)
+        customer_name = fields['customer_name']
+        lot_number = fields['lot_number']
+        design_name = fields['design_name']
+        design_number = fields['design_number']
+        grey_width = fields['grey_width']
+        finish_width = fields['finish_width']
+        fabric_quality = fields['fabric_quality']
+        total_trolley = fields['total_trolley']
+        meters = fields['meters']
+        matching = fields['matching']
+        order_receive_date = fields['order_receive_date']
+        grey_receive_date = fields['grey_receive_date']
+        remarks = fields['remarks']
+        pack_instructions = fields['pack_instructions']
 
         if not barcode:
             return jsonify({'success': False, 'message': 'Barcode is required'}), 400
@@ -37,53 +81,67 @@ def attach_trolley():
         # ⭐ TIME ENGINE: Get current timestamp
         current_time = TimeService.get_db_timestamp()
 
-        # Check if trolley exists
-        existing = db.fetch_one('SELECT * FROM trolley_barcodes WHERE barcode = %s', (barcode,))
-
-        # Prepare operations for transaction
-        operations = []
-
-        if existing:
-            # Update existing trolley with TimeService timestamp
-            operations.append((
-                """UPDATE trolley_barcodes SET 
-                state = 'FULL',
-                customer_name = %s, lot_number = %s, design_name = %s, design_number = %s,
-                grey_width = %s, finish_width = %s, fabric_quality = %s, total_trolley = %s,
-                meters = %s, matching = %s, order_receive_date = %s, grey_receive_date = %s,
-                remarks = %s, pack_instructions = %s, attached_at = %s
-                WHERE barcode = %s""",
-                (customer_name, lot_number, design_name, design_number, grey_width, finish_width,
-                 fabric_quality, total_trolley, meters, matching, order_receive_date,
-                 grey_receive_date, remarks, pack_instructions, current_time, barcode)
-            ))
-        else:
-            # Insert new trolley with TimeService timestamp
-            operations.append((
-                """INSERT INTO trolley_barcodes 
-                (barcode, state, customer_name, lot_number, design_name, design_number, grey_width,
-                 finish_width, fabric_quality, total_trolley, meters, matching,
-                 order_receive_date, grey_receive_date, remarks, pack_instructions, attached_at, created_at) 
-                VALUES (%s, 'FULL', %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-                (barcode, customer_name, lot_number, design_name, design_number, grey_width,
-                 finish_width, fabric_quality, total_trolley, meters, matching,
-                 order_receive_date, grey_receive_date, remarks, pack_instructions, current_time, current_time)
-            ))
-
-        # Record in history with TimeService timestamp
-        operations.append((
-            """INSERT INTO tracking_history 
-            (event_type, customer_name, lot_number, design_name, design_number, grey_width,
-             finish_width, fabric_quality, total_trolley, meters, matching, order_receive_date,
-             grey_receive_date, remarks, pack_instructions, trolley_barcode, input_trolley, status, created_at) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
-            ('trolley_attached', customer_name, lot_number, design_name, design_number,
-             grey_width, finish_width, fabric_quality, total_trolley, meters, matching,
-             order_receive_date, grey_receive_date, remarks, pack_instructions, barcode, barcode, 'initiated', current_time)
-        ))
-
-        # Execute all operations in a single transaction
-        db.execute_transaction(operations)
+        with db.transaction(prepared=True) as (cursor, connection):
+            # Check if trolley exists (with its lot, the edge sync base)
+            cursor.execute('SELECT * FROM view_trolleys WHERE barcode = %s FOR UPDATE', (barcode,))
+            existing = cursor.fetchone()
+
+            # The payload is stored once; the trolley points at it
+            lot_id = Lots.create(cursor, fields, current_time)
+
+            if existing:
+                # Update existing trolley with TimeService timestamp
+                cursor.execute(
+                    """UPDATE trolley_barcodes SET 
+                    state = 'FULL', lot_id = %s, attached_at = %s
+                    WHERE barcode = %s""",
+                    (lot_id, current_time, barcode)
+                )
+            else:
+                # Insert new trolley with TimeService timestamp
+                cursor.execute(
+                    """INSERT INTO trolley_barcodes 
+                    (barcode, state, lot_id, attached_at, created_at) 
+                    VALUES (%s, 'FULL', %s, %s, %s)""",
+                    (barcode, lot_id, current_time, current_time)
+                )
+
+            barcode_cache.invalidate_on_commit(db, barcode)
+            edge_sync.record(cursor, 'attach', {'barcode': barcode, 'fields': fields},
+                             [snapshot('trolley', barcode, existing)], current_time)
+
+            # Record in history (same transaction) with TimeService timestamp
+            history = {
+                'event_type': 'trolley_attached',
+                'lot_id': lot_id,
+                'customer_name': customer_name,
+                'lot_number': lot_number,
+                'design_name': design_name,
+                'design_number': design_number,
+                'grey_width': grey_width,
+                'finish_width': finish_width,
+                'fabric_quality': fabric_quality,
+                'total_trolley': total_trolley,
+                'meters': meters,
+                'matching': matching,
+                'order_receive_date': order_receive_date,
+                'grey_receive_date': grey_receive_date,
+                'remarks': remarks,
+                'pack_instructions': pack_instructions,
+                'trolley_barcode': barcode,
+                'input_trolley': barcode,
+                'status': 'initiated',
+                'created_at': current_time
+            }
+            history_id = HistoryRecorder.record(cursor, history)
+
+            event_bus.publish_on_commit(db, 'trolley.attached', {
+                'trolley': barcode,
+                'lot_number': lot_number,
+                'customer_name': customer_name,
+                'state': 'FULL',
+                'history': dict(history, id=history_id)
+            })
 
         return jsonify({
             'success': True, 
@@ -114,6 +172,232 @@ def attach_trolley():
         traceback.print_exc()
         return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
 
+# ============================================================================
+# BULK ATTACH (order import)
+# ============================================================================
+
+def _read_bulk_rows():
+    """
+    Rows of a bulk attach request: a JSON array (or {trolleys: [...]}),
+    a text/csv body, or an uploaded CSV file
+    Returns: list of dicts, or None if the body is not understood
+    """
+    upload = request.files.get('file')
+    if upload or request.mimetype in ('text/csv', 'application/csv'):
+        raw = upload.read() if upload else request.get_data()
+        # Blank CSV cells mean "not given", like absent JSON keys
+        return [
+            {key: (value.strip() or None) if isinstance(value, str) else value
+             for key, value in row.items() if key}
+            for row in csv.DictReader(io.StringIO(raw.decode('utf-8-sig')))
+        ]
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('trolleys')
+    return data if isinstance(data, list) else None
+
+
+def _validate_bulk_row(row, seen):
+    """
+    Returns: (barcode, fields) or raises ValueError with the row's problem
+    """
+    if not isinstance(row, dict):
+        raise ValueError('Each trolley must be an object')
+    barcode = str(row.get('barcode') or '').strip()
+    if not barcode:
+        raise ValueError('Barcode is required')
+    if barcode in seen:
+        raise ValueError(f'Duplicate barcode {barcode} (row {seen[barcode]})')
+
+    fields = extract_trolley_fields(row)
+    # Typed columns: blank means NULL, anything else must parse
+    if fields['total_trolley'] in (None, ''):
+        fields['total_trolley'] = None
+    else:
+        try:
+            fields['total_trolley'] = int(fields['total_trolley'])
+        except (TypeError, ValueError):
+            raise ValueError('totalTrolley must be a whole number')
+    for column, key in (('order_receive_date', 'orderReceiveDate'), ('grey_receive_date', 'greyReceiveDate')):
+        if fields[column] in (None, ''):
+            fields[column] = None
+            continue
+        try:
+            fields[column] = date.fromisoformat(str(fields[column])[:10])
+        except ValueError:
+            raise ValueError(f'{key} must be a date (YYYY-MM-DD)')
+    return barcode, fields
+
+
+def apply_attach(cursor, items, current_time):
+    """
+    Upsert every trolley and record its history in the caller's transaction
+    (bulk import, and attaches replayed from an edge node)
+    Returns: (set of barcodes that already existed, list of history ids)
+    """
+    barcodes = [barcode for barcode, fields in items]
+    cursor.execute(
+        f"""SELECT barcode, state, lot_number FROM view_trolleys
+        WHERE barcode IN ({', '.join(['%s'] * len(barcodes))}) FOR UPDATE""",
+        tuple(barcodes)
+    )
+    before = {row['barcode']: row for row in cursor.fetchall()}
+    existing = set(before)
+
+    # One lot per row: its id is needed for the trolley and history rows
+    lot_ids = [Lots.create(cursor, fields, current_time) for barcode, fields in items]
+
+    # Placeholders only inside VALUES, so executemany sends one multi-row INSERT
+    cursor.executemany(
+        """INSERT INTO trolley_barcodes (barcode, state, lot_id, attached_at, created_at)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE state = VALUES(state), lot_id = VALUES(lot_id), attached_at = VALUES(attached_at)""",
+        [
+            (barcode, 'FULL', lot_id, current_time, current_time)
+            for (barcode, fields), lot_id in zip(items, lot_ids)
+        ]
+    )
+
+    history = [
+        dict(
+            fields,
+            lot_id=lot_id,
+            event_type='trolley_attached',
+            trolley_barcode=barcode,
+            input_trolley=barcode,
+            status='initiated',
+            created_at=current_time
+        )
+        for (barcode, fields), lot_id in zip(items, lot_ids)
+    ]
+    history_ids = HistoryRecorder.record_many(cursor, history)
+
+    barcode_cache.invalidate_on_commit(db, *barcodes)
+    for barcode, fields in items:
+        edge_sync.record(cursor, 'attach', {'barcode': barcode, 'fields': fields},
+                         [snapshot('trolley', barcode, before.get(barcode))], current_time)
+    for (barcode, fields), event, history_id in zip(items, history, history_ids):
+        event_bus.publish_on_commit(db, 'trolley.attached', {
+            'trolley': barcode,
+            'lot_number': fields['lot_number'],
+            'customer_name': fields['customer_name'],
+            'state': 'FULL',
+            'history': dict(event, id=history_id)
+        })
+    return existing, history_ids
+
+
+@trolley_bp.route('/attach/bulk', methods=['POST'])
+def bulk_attach_trolleys():
+    """
+    Attach data to many trolleys at once (order import)
+    
+    Body: JSON array of attach objects (same keys and aliases as /attach),
+    {trolleys: [...]}, or CSV with those keys as the header row.
+    Query: mode = 'atomic' (default: any invalid row rejects the batch)
+           or 'best_effort' (valid rows are saved, invalid ones reported)
+    
+    Valid rows are written with one multi-row upsert and one multi-row
+    history insert, in a single transaction.
+    """
+    try:
+        if settings_store.maintenance_mode():
+            return jsonify(MAINTENANCE_RESULT), 503
+
+        mode = request.args.get('mode', 'atomic')
+        if mode not in BULK_MODES:
+            return jsonify({'success': False, 'message': f"Mode must be one of {', '.join(BULK_MODES)}"}), 400
+
+        rows = _read_bulk_rows()
+        if not rows:
+            return jsonify({'success': False, 'message': 'A JSON array or CSV of trolleys is required'}), 400
+        if len(rows) > MAX_BULK_ATTACH:
+            return jsonify({'success': False, 'message': f'At most {MAX_BULK_ATTACH} trolleys per import'}), 400
+
+        # Validate everything first: one pass, every problem reported
+        results = []
+        items = []
+        seen = {}
+        for index, row in enumerate(rows):
+            try:
+                barcode, fields = _validate_bulk_row(row, seen)
+            except ValueError as e:
+                results.append({
+                    'index': index,
+                    'barcode': row.get('barcode') if isinstance(row, dict) else None,
+                    'success': False,
+                    'message': str(e),
+                    'error_type': 'INVALID_ROW'
+                })
+                continue
+            seen[barcode] = index
+            items.append((barcode, fields))
+            results.append({'index': index, 'barcode': barcode, 'success': True})
+
+        invalid = len(rows) - len(items)
+        if invalid and mode == 'atomic':
+            for result in results:
+                if result['success']:
+                    result.update(success=False, message='Skipped because other rows are invalid', error_type='SKIPPED')
+            return jsonify({
+                'success': False,
+                'mode': mode,
+                'message': f'{invalid} of {len(rows)} rows are invalid. No changes were saved.',
+                'attached': 0,
+                'failed': len(rows),
+                'results': results
+            }), 400
+
+        existing, history_ids = set(), []
+        if items:
+            current_time = TimeService.get_db_timestamp()
+            existing, history_ids = db.run_in_transaction(apply_attach, items, current_time)
+
+        valid_results = (result for result in results if result['success'])
+        for result, history_id in zip(valid_results, history_ids):
+            result['action'] = 'updated' if result['barcode'] in existing else 'created'
+            result['historyId'] = history_id
+
+        return jsonify({
+            'success': invalid == 0,
+            'mode': mode,
+            'message': f'{len(items)} of {len(rows)} trolleys attached',
+            'attached': len(items),
+            'created': len(items) - len(existing),
+            'updated': len(existing),
+            'failed': invalid,
+            'results': results
+        }), 200
+    except Exception as e:
+        print(f"Bulk attach error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': f'Server error: {str(e)}'}), 500
+
+def apply_clear(cursor, barcode, now=None):
+    """
+    Set a trolley EMPTY in the caller's transaction
+    Returns: True if the trolley exists
+    """
+    cursor.execute('SELECT barcode, state, lot_number FROM view_trolleys WHERE barcode = %s FOR UPDATE', (barcode,))
+    existing = cursor.fetchone()
+    if not existing:
+        return False
+
+    # Clear all data and set state to EMPTY
+    cursor.execute(
+        """UPDATE trolley_barcodes SET 
+        state = 'EMPTY', lot_id = NULL, attached_at = NULL
+        WHERE barcode = %s""",
+        (barcode,)
+    )
+    barcode_cache.invalidate_on_commit(db, barcode)
+    edge_sync.record(cursor, 'clear', {'barcode': barcode}, [snapshot('trolley', barcode, existing)],
+                     now or TimeService.get_db_timestamp())
+    event_bus.publish_on_commit(db, 'trolley.cleared', {'trolley': barcode, 'state': 'EMPTY'})
+    return True
+
 @trolley_bp.route('/check/<barcode>', methods=['GET'])
 def check_trolley(barcode):
     """
@@ -121,7 +405,7 @@ def check_trolley(barcode):
     Returns: trolley data if FULL, empty status if EMPTY
     """
     try:
-        trolley = db.fetch_one('SELECT * FROM trolley_barcodes WHERE barcode = %s', (barcode,))
+        trolley = barcode_cache.trolley(db, barcode)
         
         if trolley:
             is_empty = trolley['state'] == 'EMPTY'
@@ -151,16 +435,10 @@ def clear_trolley(barcode):
     Manually clear a trolley (set to EMPTY state)
     """
     try:
-        # Clear all data and set state to EMPTY
-        db.execute_query(
-            """UPDATE trolley_barcodes SET 
-            state = 'EMPTY',
-            customer_name = NULL, lot_number = NULL, design_name = NULL,
-            design_number = NULL, grey_width = NULL, finish_width = NULL, fabric_quality = NULL,
-            total_trolley = NULL, meters = NULL, matching = NULL, order_receive_date = NULL,
-            grey_receive_date = NULL, remarks = NULL, pack_instructions = NULL, attached_at = NULL
-            WHERE barcode = %s""",
-            (barcode,))
+        if settings_store.maintenance_mode():
+            return jsonify(MAINTENANCE_RESULT), 503
+
+        db.run_in_transaction(apply_clear, barcode, prepared=True)
 
         return jsonify({'success': True, 'message': f'Trolley {barcode} cleared successfully'})
     except Exception as e:
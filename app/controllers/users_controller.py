@@ -1,9 +1,9 @@
 from flask import Blueprint, request, jsonify
 import bcrypt
-from config.database import Database
+from config.database import db
+from core.event_bus import event_bus
 
 users_bp = Blueprint('users', __name__)
-db = Database()
 
 @users_bp.route('/', methods=['GET'])
 @users_bp.route('', methods=['GET'])
@@ -32,7 +32,8 @@ def create_user():
         if db.fetch_one('SELECT * FROM users WHERE name = %s', (name,)):
             return jsonify({'success': False, 'message': 'User exists'}), 400
         hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-        db.execute_query('INSERT INTO users (name, role, password, status) VALUES (%s, %s, %s, %s)', (name, role, hashed.decode('utf-8'), 'active'))
+        user_id = db.execute_query('INSERT INTO users (name, role, password, status) VALUES (%s, %s, %s, %s)', (name, role, hashed.decode('utf-8'), 'active'))
+        event_bus.publish('user.changed', {'action': 'created', 'id': user_id, 'name': name, 'role': role, 'status': 'active'})
         return jsonify({'success': True, 'message': 'User created'})
     except Exception as e:
         print(f"Create user error: {str(e)}")
@@ -45,6 +46,7 @@ def update_user(user_id):
     try:
         status = request.get_json().get('status')
         db.execute_query('UPDATE users SET status = %s WHERE id = %s', (status, user_id))
+        event_bus.publish('user.changed', {'action': 'updated', 'id': user_id, 'status': status})
         return jsonify({'success': True, 'message': 'User updated'})
     except Exception as e:
         print(f"Update user error: {str(e)}")
@@ -56,6 +58,7 @@ def update_user(user_id):
 def delete_user(user_id):
     try:
         db.execute_query('DELETE FROM users WHERE id = %s', (user_id,))
+        event_bus.publish('user.changed', {'action': 'deleted', 'id': user_id})
         return jsonify({'success': True, 'message': 'User deleted'})
     except Exception as e:
         print(f"Delete user error: {str(e)}")
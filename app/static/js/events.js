@@ -0,0 +1,72 @@
+// Live floor-state events from /api/events
+// Uses Server-Sent Events; falls back to long-polling without EventSource.
+//
+//   LiveEvents.on('station.started', data => { ... });
+//   LiveEvents.on('resync', reloadEverything);   // missed events, reload full state
+const LiveEvents = (function() {
+    const handlers = {};
+    let source = null;
+    let lastEventId = null;
+    let started = false;
+
+    function dispatch(type, data) {
+        (handlers[type] || []).forEach(handler => {
+            try {
+                handler(data);
+            } catch (error) {
+                console.error(`Live event handler for ${type} failed:`, error);
+            }
+        });
+    }
+
+    function listen(type) {
+        source.addEventListener(type, event => {
+            const payload = event.data ? JSON.parse(event.data) : {};
+            dispatch(type, payload.data || {});
+        });
+    }
+
+    function connectStream() {
+        source = new EventSource('/api/events/stream');
+        Object.keys(handlers).forEach(listen);
+        if (!handlers.resync) listen('resync');
+    }
+
+    async function poll() {
+        try {
+            const url = lastEventId
+                ? `/api/events/poll?after=${encodeURIComponent(lastEventId)}`
+                : '/api/events/poll';
+            const response = await fetch(url);
+            const result = await response.json();
+            if (!result.success) throw new Error(result.message || 'Event poll failed');
+
+            if (result.resync) dispatch('resync', {});
+            (result.events || []).forEach(event => dispatch(event.type, event.data || {}));
+            lastEventId = result.lastEventId;
+            setTimeout(poll, 0);
+        } catch (error) {
+            console.error('Live events unavailable, retrying:', error);
+            setTimeout(poll, 5000);
+        }
+    }
+
+    function start() {
+        if (started) return;
+        started = true;
+        if (window.EventSource) {
+            connectStream();
+        } else {
+            poll();
+        }
+    }
+
+    function on(type, handler) {
+        const isNew = !handlers[type];
+        (handlers[type] = handlers[type] || []).push(handler);
+        if (source && isNew && type !== 'resync') listen(type);
+        start();
+    }
+
+    return { on };
+})();
@@ -19,8 +19,27 @@ const filterBtn = document.querySelector('.btn-primary');
 document.addEventListener('DOMContentLoaded', function() {
     setupEventListeners();
     loadHistoryData();
+    
+    // New history rows arrive with the live events
+    ['trolley.attached', 'station.started', 'station.finished'].forEach(type => {
+        LiveEvents.on(type, handleLiveHistory);
+    });
+    LiveEvents.on('resync', loadHistoryData);
 });
 
+// Prepend a history row pushed by the server, keeping the current page
+function handleLiveHistory(event) {
+    const row = event.history;
+    if (!row || (row.id && historyData.some(item => item.id === row.id))) return;
+    
+    historyData.unshift(row);
+    const page = currentPage;
+    handleFilter();
+    currentPage = Math.min(page, Math.max(1, Math.ceil(totalItems / itemsPerPage)));
+    renderTable();
+    updatePagination();
+}
+
 // Setup Event Listeners
 function setupEventListeners() {
     if (filterBtn) filterBtn.addEventListener('click', handleFilter);
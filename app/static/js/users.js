@@ -9,10 +9,30 @@ const usersTableBody = document.querySelector('tbody');
 // Initialize
 document.addEventListener('DOMContentLoaded', function() {
     loadUsers();
-    // Auto-refresh every 30 seconds
-    setInterval(loadUsers, 30000);
+    // Live updates instead of polling
+    LiveEvents.on('user.changed', handleUserChanged);
+    LiveEvents.on('resync', loadUsers);
 });
 
+// Apply a user change pushed by the server
+function handleUserChanged(change) {
+    if (change.action === 'deleted') {
+        usersData = usersData.filter(user => user.id !== change.id);
+        renderTable();
+        return;
+    }
+    
+    const user = usersData.find(user => user.id === change.id);
+    if (change.action === 'updated' && user && change.status) {
+        user.status = change.status;
+        renderTable();
+        return;
+    }
+    
+    // New user or login time changed: fetch the fresh rows
+    loadUsers();
+}
+
 // Load Users Data from Backend
 async function loadUsers() {
     try {
@@ -0,0 +1,3 @@
+"""
+Benchmarks - Load and latency harnesses (python -m benchmarks.workflow)
+"""
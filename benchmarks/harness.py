@@ -0,0 +1,224 @@
+"""
+HARNESS - Timing, percentiles and baseline comparison for benchmarks
+===================================================================
+
+Rules:
+1. Clients send one request and return (status, JSON body); the same
+   scenario runs over HTTP (HttpClient) or in-process through the Flask
+   test client (InProcessClient), which leaves the HTTP server out
+2. Recorder keeps every latency per endpoint label ("POST /api/process/input");
+   percentiles are nearest-rank over the full sample, no histogram error
+3. A baseline file stores a previous report plus the thresholds; a run
+   fails when an endpoint's p50/p95/p99 grows or its throughput drops by
+   more than the allowed ratio, ignoring differences under min_delta_ms
+   so sub-millisecond jitter cannot fail a run
+"""
+
+import json
+import math
+import platform
+import threading
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_THRESHOLDS = {
+    'p50_increase': 0.20,
+    'p95_increase': 0.25,
+    'p99_increase': 0.35,
+    'throughput_decrease': 0.15,
+    'min_delta_ms': 2.0,
+    'max_error_rate': 0.0,
+}
+
+
+class HttpClient:
+    """JSON over HTTP against a running server (urllib, one request per call)"""
+
+    def __init__(self, base_url, timeout=30.0):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(
+            self.base_url + path, data=data, method=method,
+            headers={'Content-Type': 'application/json'} if data is not None else {}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, _decode(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, _decode(e.read())
+
+
+class InProcessClient:
+    """The same calls through the Flask test client (one client per thread)"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        try:
+            return response.status_code, _decode(response.get_data())
+        finally:
+            response.close()
+
+
+def _decode(raw):
+    try:
+        return json.loads(raw) if raw else None
+    except ValueError:
+        return None
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """Latencies and failures per endpoint label, safe across threads"""
+
+    def __init__(self):
+        self._latencies = {}
+        self._errors = {}
+        self._samples = {}
+        self._lock = threading.Lock()
+        self.started = None
+        self.finished = None
+
+    def call(self, client, label, method, path, body=None, expect=(200,)):
+        """
+        Send one request and record it under label
+
+        Returns:
+            tuple: (ok, body)
+        """
+        started = time.perf_counter()
+        try:
+            status, payload = client.request(method, path, body)
+        except Exception as e:
+            status, payload = None, {'message': str(e)}
+        elapsed = time.perf_counter() - started
+        ok = status in expect
+        with self._lock:
+            self._latencies.setdefault(label, []).append(elapsed)
+            if not ok:
+                self._errors[label] = self._errors.get(label, 0) + 1
+                # Keep a few messages so a broken setup is obvious in the report
+                samples = self._samples.setdefault(label, [])
+                if len(samples) < 3:
+                    message = payload.get('message') if isinstance(payload, dict) else payload
+                    samples.append(f'{status}: {message}')
+        return ok, payload
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    def report(self, meta=None):
+        """
+        Returns:
+            dict: run metadata, wall time and per-endpoint count, errors,
+                  throughput (req/s) and p50/p95/p99/max in milliseconds
+        """
+        wall = (self.finished or time.perf_counter()) - self.started
+        endpoints = {}
+        with self._lock:
+            for label, latencies in sorted(self._latencies.items()):
+                ordered = sorted(latencies)
+                endpoints[label] = {
+                    'count': len(ordered),
+                    'errors': self._errors.get(label, 0),
+                    'throughput': round(len(ordered) / wall, 2) if wall > 0 else 0.0,
+                    'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+                    'p95_ms': round(percentile(ordered, 0.95) * 1000, 2),
+                    'p99_ms': round(percentile(ordered, 0.99) * 1000, 2),
+                    'max_ms': round(ordered[-1] * 1000, 2),
+                }
+                if label in self._samples:
+                    endpoints[label]['error_samples'] = list(self._samples[label])
+        return {
+            'meta': dict(meta or {}, python=platform.python_version(), host=platform.node()),
+            'wall_seconds': round(wall, 3),
+            'endpoints': endpoints,
+        }
+
+
+def format_report(report):
+    lines = [f"{'endpoint':<34}{'count':>8}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"]
+    for label, row in report['endpoints'].items():
+        lines.append(
+            f"{label:<34}{row['count']:>8}{row['errors']:>8}{row['throughput']:>10}"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+        )
+        for sample in row.get('error_samples', []):
+            lines.append(f"    ! {sample}")
+    lines.append(f"wall time: {report['wall_seconds']}s")
+    return '\n'.join(lines)
+
+
+def load_baseline(path):
+    """Baseline dict, or None if the file does not exist yet"""
+    try:
+        with open(path, encoding='utf-8') as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, report, thresholds):
+    with open(path, 'w', encoding='utf-8') as handle:
+        json.dump(dict(report, thresholds=thresholds), handle, indent=2, sort_keys=True)
+        handle.write('\n')
+
+
+def compare(report, baseline, thresholds=None):
+    """
+    Check a report against a baseline
+
+    Args:
+        thresholds: overrides; defaults come from the baseline file, then
+                    DEFAULT_THRESHOLDS
+
+    Returns:
+        list: human-readable failures (empty when the run passes)
+    """
+    limits = dict(DEFAULT_THRESHOLDS, **(baseline or {}).get('thresholds', {}), **(thresholds or {}))
+    failures = []
+
+    for label, row in report['endpoints'].items():
+        if row['count'] and row['errors'] / row['count'] > limits['max_error_rate']:
+            failures.append(f"{label}: {row['errors']}/{row['count']} requests failed")
+
+    if not baseline:
+        return failures
+
+    for label, before in baseline.get('endpoints', {}).items():
+        after = report['endpoints'].get(label)
+        if after is None:
+            failures.append(f"{label}: in the baseline but not exercised by this run")
+            continue
+        for key in ('p50', 'p95', 'p99'):
+            old, new = before[f'{key}_ms'], after[f'{key}_ms']
+            if new - old > limits['min_delta_ms'] and new > old * (1 + limits[f'{key}_increase']):
+                failures.append(
+                    f"{label}: {key} {old}ms -> {new}ms (allowed +{limits[f'{key}_increase']:.0%})"
+                )
+        old, new = before['throughput'], after['throughput']
+        if new < old * (1 - limits['throughput_decrease']):
+            failures.append(
+                f"{label}: throughput {old} -> {new} req/s (allowed -{limits['throughput_decrease']:.0%})"
+            )
+    return failures
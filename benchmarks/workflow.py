@@ -0,0 +1,218 @@
+"""
+WORKFLOW BENCHMARK - Scan cycles plus history reads under concurrency
+=====================================================================
+
+Usage:
+    python -m benchmarks.workflow [--url http://localhost:5500 | --in-process]
+                                  [--trolleys N] [--stations M] [--concurrency C]
+                                  [--cycles K] [--warmup W] [--reads R]
+                                  [--baseline benchmarks/baseline.json] [--save-baseline]
+
+Rules:
+1. Seeding writes BENCH-TR-#### trolleys and BENCH-PR-###-in/out station
+   pairs straight into the configured database (.env), resetting them to
+   EMPTY, so every run starts from the same state. Other rows are untouched
+2. Each of C workers owns a disjoint slice of trolleys and stations (no
+   lock contention between workers on the same rows, like separate
+   scanner lines) and runs K cycles of
+   attach -> /api/process/input -> /api/process/output
+   followed by R history reads (alternating /api/history/all and
+   /api/history/search for one of its lots)
+3. Payloads come from a seeded RNG, so two runs send the same requests
+4. --url drives a running server (gunicorn or python app.py);
+   --in-process drives create_app() through the Flask test client, which
+   measures the application and database without the HTTP server
+5. The report lists throughput and p50/p95/p99 per endpoint. With a
+   baseline file the run exits 1 when a threshold is exceeded (see
+   benchmarks/harness.py); --save-baseline writes this run as the new one
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+from urllib.parse import quote
+
+from benchmarks.harness import (
+    DEFAULT_THRESHOLDS, HttpClient, InProcessClient, Recorder,
+    compare, format_report, load_baseline, save_baseline
+)
+
+TROLLEY_PREFIX = 'BENCH-TR-'
+STATION_PREFIX = 'BENCH-PR-'
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+CUSTOMERS = ('Al Karam', 'Gul Ahmed', 'Nishat', 'Sapphire', 'Kohinoor', 'Masood')
+QUALITIES = ('Lawn', 'Cambric', 'Voile', 'Khaddar', 'Linen')
+
+
+def trolley_barcodes(count):
+    return [f'{TROLLEY_PREFIX}{index:04d}' for index in range(1, count + 1)]
+
+
+def station_barcodes(count):
+    return [(f'{STATION_PREFIX}{index:03d}-in', f'{STATION_PREFIX}{index:03d}-out') for index in range(1, count + 1)]
+
+
+def seed(trolleys, stations):
+    """Create (or reset to EMPTY) the benchmark trolleys and station pairs"""
+    from config.database import db
+    from core.barcode_cache import barcode_cache
+
+    trolley_rows = trolley_barcodes(trolleys)
+    station_rows = station_barcodes(stations)
+    with db.transaction() as (cursor, connection):
+        cursor.executemany(
+            """INSERT INTO trolley_barcodes (barcode, state) VALUES (%s, 'EMPTY')
+            ON DUPLICATE KEY UPDATE state = 'EMPTY', lot_id = NULL, attached_at = NULL""",
+            [(barcode,) for barcode in trolley_rows]
+        )
+        cursor.executemany(
+            """INSERT INTO process_barcodes (barcode, process_type, state, paired_barcode)
+            VALUES (%s, %s, 'EMPTY', %s)
+            ON DUPLICATE KEY UPDATE state = 'EMPTY', paired_barcode = VALUES(paired_barcode),
+            process_name = NULL, source_trolley_barcode = NULL, lot_id = NULL,
+            process_start_time = NULL, process_end_time = NULL, attached_at = NULL""",
+            [row for station_in, station_out in station_rows
+             for row in ((station_in, 'input', station_out), (station_out, 'output', station_in))]
+        )
+    barcode_cache.invalidate(*trolley_rows, *[barcode for pair in station_rows for barcode in pair])
+    return trolley_rows, station_rows
+
+
+def lot_payload(rng, trolley, sequence):
+    # Request keys of /api/trolley/attach (see TROLLEY_FIELDS)
+    return {
+        'barcode': trolley,
+        'customerName': rng.choice(CUSTOMERS),
+        'lotNumber': f'BL-{sequence:06d}',
+        'designName': f'Design {rng.randint(1, 400)}',
+        'designNumber': f'D-{rng.randint(1000, 9999)}',
+        'greyWidth': str(rng.choice((58, 60, 63, 66))),
+        'finishWidth': str(rng.choice((54, 56, 58))),
+        'fabricQuality': rng.choice(QUALITIES),
+        'totalTrolley': str(rng.randint(1, 12)),
+        'meters': str(rng.randint(200, 3000)),
+        'matching': rng.choice(('Yes', 'No')),
+        'remarks': 'benchmark',
+    }
+
+
+def run_worker(client, recorder, worker, trolleys, stations, cycles, reads, seed_value, record):
+    """One scanner line: its own trolleys and stations, cycles in order"""
+    rng = random.Random(seed_value * 1000 + worker)
+    target = recorder if record else Recorder()
+    lots = []
+    for cycle in range(cycles):
+        trolley = trolleys[cycle % len(trolleys)]
+        station_in, station_out = stations[cycle % len(stations)]
+        payload = lot_payload(rng, trolley, worker * 1_000_000 + cycle)
+        lots.append(payload['lotNumber'])
+
+        ok, _ = target.call(client, 'POST /api/trolley/attach', 'POST', '/api/trolley/attach', payload)
+        if ok:
+            ok, _ = target.call(client, 'POST /api/process/input', 'POST', '/api/process/input', {
+                'trolleyBarcode': trolley, 'processBarcode': station_in, 'processName': 'Benchmark'
+            })
+        if ok:
+            target.call(client, 'POST /api/process/output', 'POST', '/api/process/output', {
+                'outputBarcode': station_out, 'trolleyBarcode': trolley
+            })
+
+        for read in range(reads):
+            if read % 2 == 0:
+                target.call(client, 'GET /api/history/all', 'GET', '/api/history/all?limit=50')
+            else:
+                lot = rng.choice(lots)
+                target.call(client, 'GET /api/history/search', 'GET',
+                            f'/api/history/search?query={quote(lot)}&limit=50')
+
+
+def run(client, recorder, trolleys, stations, concurrency, cycles, warmup, reads, seed_value):
+    def phase(count, record):
+        threads = [
+            threading.Thread(
+                target=run_worker, name=f'bench-{worker}',
+                args=(client, recorder, worker, trolleys[worker::concurrency],
+                      stations[worker::concurrency], count, reads, seed_value, record)
+            )
+            for worker in range(concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    if warmup:
+        phase(warmup, record=False)
+    recorder.start()
+    phase(cycles, record=True)
+    recorder.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scan workflow load benchmark')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', default=os.getenv('BENCH_URL', 'http://localhost:5500'),
+                        help='server to drive (default http://localhost:5500)')
+    target.add_argument('--in-process', action='store_true',
+                        help='drive create_app() through the Flask test client instead of HTTP')
+    parser.add_argument('--trolleys', type=int, default=40, help='trolleys to seed (N)')
+    parser.add_argument('--stations', type=int, default=8, help='input/output station pairs to seed (M)')
+    parser.add_argument('--concurrency', type=int, default=8, help='parallel scanner lines')
+    parser.add_argument('--cycles', type=int, default=50, help='measured cycles per line')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured cycles per line first')
+    parser.add_argument('--reads', type=int, default=2, help='history reads after each cycle')
+    parser.add_argument('--seed', type=int, default=1, help='RNG seed for payloads')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='write this run as the baseline')
+    for name, default in DEFAULT_THRESHOLDS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=None, dest=name,
+                            help=f'threshold override (default {default} or the baseline file)')
+    args = parser.parse_args(argv)
+
+    if args.concurrency < 1 or args.trolleys < args.concurrency or args.stations < args.concurrency:
+        parser.error('need --concurrency >= 1 and at least one trolley and one station pair per line')
+
+    trolleys, stations = seed(args.trolleys, args.stations)
+    print(f"Seeded {len(trolleys)} trolleys and {len(stations)} station pairs")
+
+    if args.in_process:
+        from app import create_app
+        client = InProcessClient(create_app())
+    else:
+        client = HttpClient(args.url)
+
+    recorder = Recorder()
+    run(client, recorder, trolleys, stations, args.concurrency, args.cycles, args.warmup, args.reads, args.seed)
+    report = recorder.report({
+        'target': 'in-process' if args.in_process else args.url,
+        'trolleys': args.trolleys, 'stations': args.stations, 'concurrency': args.concurrency,
+        'cycles': args.cycles, 'reads': args.reads, 'seed': args.seed,
+    })
+    print(format_report(report))
+
+    overrides = {name: getattr(args, name) for name in DEFAULT_THRESHOLDS if getattr(args, name) is not None}
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"No baseline at {args.baseline}; thresholds not checked")
+    elif baseline.get('meta', {}).get('target') != report['meta']['target']:
+        print("⚠️  baseline was recorded against a different target; comparing anyway")
+    failures = compare(report, baseline, overrides)
+
+    if args.save_baseline:
+        thresholds = dict(DEFAULT_THRESHOLDS, **(baseline or {}).get('thresholds', {}), **overrides)
+        save_baseline(args.baseline, report, thresholds)
+        print(f"✅ baseline written to {args.baseline}")
+    if failures:
+        print("❌ benchmark regressions:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("✅ within thresholds")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,25 +1,562 @@
 import mysql.connector
 from mysql.connector import Error
 import os
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
 from contextlib import contextmanager
 import pytz
+import sqlite3
 from datetime import datetime, timezone
+from config import sqlite_backend
 
 load_dotenv()
 
+
+def _env_bool(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+# InnoDB error raised on the transaction chosen as a deadlock victim
+DEADLOCK_ERRNO = 1213
+# "This command is not supported in the prepared statement protocol yet"
+UNSUPPORTED_PS_ERRNO = 1295
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no pooled connection becomes free within the checkout timeout"""
+
+
+# ============================================================================
+# CONNECTION POOL
+# ============================================================================
+
+class PooledConnection:
+    """A live MySQL connection plus the bookkeeping the pool needs"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.checked_out_at = None
+        self.statements = None  # StatementCache, created on first prepared use
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of MySQL connections shared by every Database instance
+
+    - min_size connections are opened on first use and kept warm
+    - at most max_size connections exist at once; callers wait up to
+      `timeout` seconds for one to be returned
+    - connections idle longer than `ping_after` seconds are pinged before
+      checkout (pre-ping) and replaced if the server dropped them
+    - connections older than `recycle` seconds are closed and reopened
+    """
+
+    def __init__(self, connect, min_size=2, max_size=10, timeout=10.0,
+                 recycle=1800, pre_ping=True, ping_after=30.0, statement_cache_size=64):
+        self._connect = connect
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.ping_after = ping_after
+        self.statement_cache_size = max(0, statement_cache_size)
+
+        self._idle = []
+        self._size = 0
+        self._warmed = False
+        self._lock = threading.Condition(threading.Lock())
+        self._metrics = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'timeouts': 0,
+            'hold_seconds_total': 0.0,
+            'hold_seconds_max': 0.0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'connections_discarded': 0,
+            'ping_failures': 0,
+            'connect_failures': 0,
+            'stmt_cache_hits': 0,
+            'stmt_cache_misses': 0,
+            'stmt_cache_evictions': 0,
+            'stmt_cache_unpreparable': 0,
+        }
+
+    def _open(self):
+        """Open a connection for a slot already reserved in self._size"""
+        try:
+            connection = self._connect()
+        except Exception as e:
+            print(f"Error connecting to MySQL: {e}")
+            connection = None
+        if not connection:
+            with self._lock:
+                self._size -= 1
+                self._metrics['connect_failures'] += 1
+                self._lock.notify()
+            raise Exception("Database connection failed")
+        with self._lock:
+            self._metrics['connections_created'] += 1
+        return PooledConnection(connection)
+
+    def _close_quietly(self, pooled):
+        try:
+            pooled.connection.close()
+        except Exception:
+            pass
+
+    def _is_stale(self, pooled, now):
+        return self.recycle and now - pooled.created_at > self.recycle
+
+    def _is_alive(self, pooled, now):
+        if not self.pre_ping or now - pooled.last_used < self.ping_after:
+            return True
+        try:
+            pooled.connection.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._lock:
+                self._metrics['ping_failures'] += 1
+            return False
+
+    def _warm_up(self):
+        """Open min_size connections the first time the pool is used"""
+        with self._lock:
+            if self._warmed:
+                return
+            self._warmed = True
+            missing = max(0, self.min_size - self._size)
+            self._size += missing
+        for opened in range(missing):
+            try:
+                pooled = self._open()
+            except Exception as e:
+                print(f"Connection pool warm-up failed: {e}")
+                with self._lock:
+                    self._size -= missing - opened - 1
+                return
+            with self._lock:
+                self._idle.append(pooled)
+                self._lock.notify()
+
+    def acquire(self):
+        """Check out a healthy connection, opening one if the pool has room"""
+        if not self._warmed:
+            self._warm_up()
+
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        pooled = None
+        with self._lock:
+            while not self._idle and self._size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._metrics['timeouts'] += 1
+                    raise PoolExhaustedError(
+                        f"No database connection available after {self.timeout}s "
+                        f"(pool size {self.max_size})"
+                    )
+                waited = True
+                self._lock.wait(remaining)
+            if self._idle:
+                pooled = self._idle.pop()
+            else:
+                self._size += 1
+
+        now = time.monotonic()
+        if pooled is None:
+            pooled = self._open()
+        else:
+            recycled = self._is_stale(pooled, now)
+            if recycled or not self._is_alive(pooled, now):
+                self._close_quietly(pooled)
+                with self._lock:
+                    key = 'connections_recycled' if recycled else 'connections_discarded'
+                    self._metrics[key] += 1
+                pooled = self._open()
+
+        wait_seconds = time.monotonic() - started
+        with self._lock:
+            self._metrics['checkouts'] += 1
+            if waited:
+                self._metrics['waits'] += 1
+            self._metrics['wait_seconds_total'] += wait_seconds
+            self._metrics['wait_seconds_max'] = max(self._metrics['wait_seconds_max'], wait_seconds)
+        pooled.checked_out_at = time.monotonic()
+        return pooled
+
+    def release(self, pooled, discard=False):
+        """Return a connection to the pool, or drop it if the caller saw it break"""
+        now = time.monotonic()
+        hold_seconds = now - pooled.checked_out_at if pooled.checked_out_at else 0.0
+        pooled.checked_out_at = None
+        pooled.last_used = now
+
+        if discard:
+            self._close_quietly(pooled)
+
+        with self._lock:
+            self._metrics['hold_seconds_total'] += hold_seconds
+            self._metrics['hold_seconds_max'] = max(self._metrics['hold_seconds_max'], hold_seconds)
+            if discard:
+                self._size -= 1
+                self._metrics['connections_discarded'] += 1
+            else:
+                self._idle.append(pooled)
+            self._lock.notify()
+
+    def count(self, metric, amount=1):
+        """Add to one of the pool's counters"""
+        with self._lock:
+            self._metrics[metric] += amount
+
+    def statements_for(self, pooled):
+        """Prepared statement cache of a checked-out connection (None if disabled)"""
+        if not self.statement_cache_size:
+            return None
+        if pooled.statements is None:
+            pooled.statements = StatementCache(pooled.connection, self.statement_cache_size, self.count)
+        return pooled.statements
+
+    def close_all(self):
+        """Close every idle connection; checked-out ones are returned as usual"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._warmed = False
+        for pooled in idle:
+            self._close_quietly(pooled)
+
+    def stats(self):
+        """Snapshot of pool size and checkout metrics"""
+        with self._lock:
+            snapshot = dict(self._metrics)
+            snapshot.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        checkouts = snapshot['checkouts']
+        snapshot['wait_seconds_avg'] = snapshot['wait_seconds_total'] / checkouts if checkouts else 0.0
+        snapshot['hold_seconds_avg'] = snapshot['hold_seconds_total'] / checkouts if checkouts else 0.0
+        lookups = snapshot['stmt_cache_hits'] + snapshot['stmt_cache_misses']
+        snapshot['stmt_cache_hit_ratio'] = snapshot['stmt_cache_hits'] / lookups if lookups else 0.0
+        snapshot['stmt_cache_size'] = self.statement_cache_size
+        return snapshot
+
+
+# ============================================================================
+# PREPARED STATEMENTS
+# ============================================================================
+
+class StatementCache:
+    """
+    LRU of server-side prepared statements on one connection
+
+    - a statement is prepared (COM_STMT_PREPARE) the first time its SQL
+      runs on the connection; later runs only send COM_STMT_EXECUTE with
+      binary parameters, so MySQL skips parsing
+    - at most max_size statements stay prepared; the least recently used
+      one is closed to make room (server limit: max_prepared_stmt_count
+      across all connections)
+    - statements live and die with the connection: a recycled or
+      discarded connection takes its cache with it
+    - SQL the server refuses to prepare is remembered and sent as text
+    """
+
+    def __init__(self, connection, max_size, count):
+        self.connection = connection
+        self.max_size = max_size
+        self._count = count
+        self._statements = OrderedDict()  # (dictionary, sql) -> (sql, prepared cursor)
+        self._unpreparable = set()
+
+    def execute(self, sql, params, dictionary=True):
+        """
+        Run sql as a prepared statement
+
+        Returns:
+            tuple: (rows, rowcount, lastrowid), rows fully fetched;
+                   None if the statement has to go through a text cursor
+        """
+        key = (dictionary, sql)
+        if key in self._unpreparable:
+            return None
+        entry = self._statements.get(key)
+        if entry is not None:
+            self._statements.move_to_end(key)
+            self._count('stmt_cache_hits')
+            # The cursor skips re-preparing only for the very string it prepared
+            statement, cursor = entry
+            cursor.execute(statement, params)
+        else:
+            self._count('stmt_cache_misses')
+            cursor = self.connection.cursor(prepared=True, dictionary=dictionary)
+            try:
+                cursor.execute(sql, params)
+            except Error as e:
+                self._close(cursor)
+                if getattr(e, 'errno', None) == UNSUPPORTED_PS_ERRNO:
+                    self._unpreparable.add(key)
+                    self._count('stmt_cache_unpreparable')
+                    return None
+                raise
+            self._statements[key] = (sql, cursor)
+            while len(self._statements) > self.max_size:
+                evicted_key, (evicted_sql, evicted) = self._statements.popitem(last=False)
+                self._close(evicted)
+                self._count('stmt_cache_evictions')
+
+        rows = cursor.fetchall() if cursor.with_rows else []
+        return rows, cursor.rowcount, cursor.lastrowid
+
+    def _close(self, cursor):
+        try:
+            cursor.close()
+        except Error:
+            pass
+
+    def __len__(self):
+        return len(self._statements)
+
+
+class PreparedCursor:
+    """
+    Cursor that runs parameterized statements through a StatementCache
+
+    Statements without positional parameters, executemany (which the text
+    cursor turns into one multi-row INSERT) and SQL with literal %% go
+    through the ordinary buffered cursor. Results are buffered either way.
+    """
+
+    def __init__(self, cursor, statements, dictionary=True):
+        self._cursor = cursor
+        self._statements = statements
+        self._dictionary = dictionary
+        self._rows = None  # None while the text cursor holds the last result
+        self._position = 0
+        self._rowcount = -1
+        self._lastrowid = None
+
+    def execute(self, operation, params=None):
+        if params and isinstance(params, (tuple, list)) and '%%' not in operation:
+            result = self._statements.execute(operation, tuple(params), self._dictionary)
+            if result is not None:
+                self._rows, self._rowcount, self._lastrowid = result
+                self._position = 0
+                return
+        self._rows = None
+        self._cursor.execute(operation, params)
+
+    def executemany(self, operation, seq_params):
+        self._rows = None
+        return self._cursor.executemany(operation, seq_params)
+
+    def fetchone(self):
+        if self._rows is None:
+            return self._cursor.fetchone()
+        if self._position >= len(self._rows):
+            return None
+        self._position += 1
+        return self._rows[self._position - 1]
+
+    def fetchmany(self, size=1):
+        if self._rows is None:
+            return self._cursor.fetchmany(size)
+        rows = self._rows[self._position:self._position + size]
+        self._position += len(rows)
+        return rows
+
+    def fetchall(self):
+        if self._rows is None:
+            return self._cursor.fetchall()
+        rows = self._rows[self._position:]
+        self._position = len(self._rows)
+        return rows
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount if self._rows is None else self._rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid if self._rows is None else self._lastrowid
+
+    @property
+    def with_rows(self):
+        return self._cursor.with_rows if self._rows is None else bool(self._rows)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedCursor:
+    """
+    Cursor wrapper that reports each statement's time and result rows to
+    core.metrics (rows = 0 for statements without a result set)
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=None):
+        started = time.perf_counter()
+        try:
+            result = self._cursor.execute(operation, params)
+        except Exception:
+            metrics.observe_query(time.perf_counter() - started, 0, failed=True)
+            raise
+        metrics.observe_query(
+            time.perf_counter() - started,
+            max(self._cursor.rowcount, 0) if self._cursor.with_rows else 0
+        )
+        return result
+
+    def executemany(self, operation, seq_params):
+        started = time.perf_counter()
+        try:
+            result = self._cursor.executemany(operation, seq_params)
+        except Exception:
+            metrics.observe_query(time.perf_counter() - started, 0, failed=True)
+            raise
+        metrics.observe_query(time.perf_counter() - started, 0)
+        return result
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+# One pool per (server, database) per process. Pools are never shared across
+# a fork: a child that inherits a parent's pool drops it without closing the
+# sockets (closing would send COM_QUIT on the parent's connections).
+_pools = {}
+_pools_pid = os.getpid()
+_pools_lock = threading.Lock()
+
+
+def _reset_pools_after_fork():
+    global _pools, _pools_pid, _pools_lock
+    _pools = {}
+    _pools_pid = os.getpid()
+    _pools_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
+
+def get_pool(database):
+    """Return this process's pool for the given Database configuration"""
+    if os.getpid() != _pools_pid:
+        _reset_pools_after_fork()
+    key = (database.backend, database.host, database.port, database.user, database.database, database.sqlite_path)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                # A local file needs no pinging or recycling, and sqlite3 caches statements itself
+                embedded = database.backend == 'sqlite'
+                pool = ConnectionPool(
+                    database.connect,
+                    min_size=int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                    max_size=int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                    timeout=float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                    recycle=0 if embedded else int(os.getenv('DB_POOL_RECYCLE', 1800)),
+                    pre_ping=False if embedded else _env_bool('DB_POOL_PRE_PING', True),
+                    ping_after=float(os.getenv('DB_POOL_PING_AFTER', 30)),
+                    statement_cache_size=0 if embedded else int(os.getenv('DB_STMT_CACHE_SIZE', 64)),
+                )
+                _pools[key] = pool
+    return pool
+
+
+# after_commit() callbacks for the transactions open on this thread
+_tx_local = threading.local()
+
+
+def _hook_stack():
+    stack = getattr(_tx_local, 'hooks', None)
+    if stack is None:
+        stack = _tx_local.hooks = []
+    return stack
+
+
+def _run_hooks(callbacks):
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            print(f"After-commit hook failed: {e}")
+
+
+BACKENDS = ('mysql', 'sqlite')
+
+
 class Database:
+    """
+    Storage API used by the whole application
+
+    DB_BACKEND selects the engine behind it:
+    - mysql (default): MySQL server, DB_HOST / DB_NAME / ...
+    - sqlite: embedded file at SQLITE_PATH for single-station installs
+      (see config/sqlite_backend.py); the schema is created on first use
+    """
+
     def __init__(self):
+        self.backend = os.getenv('DB_BACKEND', 'mysql').strip().lower()
+        if self.backend not in BACKENDS:
+            raise ValueError(f"DB_BACKEND must be one of {', '.join(BACKENDS)}, not {self.backend!r}")
+        self.sqlite_path = os.getenv('SQLITE_PATH', 'trolley_tracking.db')
+        self.sqlite_busy_timeout = float(os.getenv('SQLITE_BUSY_TIMEOUT', 10))
+        self.sqlite_synchronous = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
         self.host = os.getenv('DB_HOST', 'localhost')
         self.user = os.getenv('DB_USER', 'root')
         self.password = os.getenv('DB_PASSWORD', '')
         self.database = os.getenv('DB_NAME', 'trolley_tracking')
         self.port = int(os.getenv('DB_PORT', 3306))
         self.timezone = os.getenv('DB_TIMEZONE', 'Asia/Karachi')
+        self.connect_timeout = int(os.getenv('DB_CONNECT_TIMEOUT', 5))
         self.connection = None
 
+    @property
+    def pool(self):
+        """Shared connection pool for this process"""
+        return get_pool(self)
+
     def connect(self):
-        """Establish database connection"""
+        """
+        Open a new, unpooled database connection
+
+        Connections run in autocommit mode; multi-statement work goes
+        through execute_transaction, which starts an explicit transaction.
+        """
+        if self.backend == 'sqlite':
+            try:
+                self.connection = sqlite_backend.connect(
+                    self.sqlite_path, self.sqlite_busy_timeout, self.sqlite_synchronous
+                )
+                return self.connection
+            except (OSError, ValueError, sqlite3.Error) as e:
+                print(f"Error opening SQLite database {self.sqlite_path}: {e}")
+                return None
         try:
             self.connection = mysql.connector.connect(
                 host=self.host,
@@ -28,7 +565,8 @@ class Database:
                 database=self.database,
                 port=self.port,
                 time_zone='+05:00',  # Pakistan Standard Time
-                autocommit=False  # Explicit transaction control
+                autocommit=True,
+                connection_timeout=self.connect_timeout
             )
             if self.connection.is_connected():
                 return self.connection
@@ -37,66 +575,234 @@ class Database:
             return None
 
     @contextmanager
-    def get_cursor(self, dictionary=True):
-        """Context manager for database cursor with automatic connection handling"""
-        connection = None
+    def get_cursor(self, dictionary=True, prepared=False):
+        """
+        Context manager for database cursor on a pooled connection
+
+        prepared=True runs parameterized statements as server-side
+        prepared statements cached on the connection (DB_STMT_CACHE_SIZE
+        per connection, 0 disables); use it for fixed, hot SQL.
+
+        Checkout time and every statement are reported to core.metrics
+        (METRICS_ENABLED=false hands out the bare cursor).
+        """
+        pool = self.pool
+        started = time.perf_counter()
+        pooled = pool.acquire()
+        metrics.observe_connect(time.perf_counter() - started)
+        connection = pooled.connection
         cursor = None
+        discard = False
         try:
-            connection = self.connect()
-            if not connection:
-                raise Exception("Database connection failed")
-            cursor = connection.cursor(dictionary=dictionary)
-            yield cursor, connection
+            cursor = connection.cursor(dictionary=dictionary, buffered=True)
+            statements = pool.statements_for(pooled) if prepared else None
+            wrapped = PreparedCursor(cursor, statements, dictionary) if statements is not None else cursor
+            if metrics.enabled:
+                wrapped = InstrumentedCursor(wrapped)
+            yield wrapped, connection
         except Error as e:
-            if connection:
+            try:
                 connection.rollback()
+            except Error:
+                discard = True
             print(f"Database error: {e}")
             raise e
         finally:
             if cursor:
-                cursor.close()
-            if connection and connection.is_connected():
-                connection.close()
+                try:
+                    cursor.close()
+                except Error:
+                    discard = True
+            # Never hand an open transaction to the next borrower
+            if not discard:
+                try:
+                    if connection.in_transaction:
+                        connection.rollback()
+                except Error:
+                    discard = True
+            pool.release(pooled, discard=discard)
+
+    @contextmanager
+    def transaction(self, prepared=False):
+        """
+        Run a block inside one transaction on one pooled connection
+        Commits when the block exits normally, rolls back on any exception
+        """
+        hooks = []
+        stack = _hook_stack()
+        stack.append(hooks)
+        try:
+            with self.get_cursor(prepared=prepared) as (cursor, connection):
+                connection.start_transaction()
+                try:
+                    yield cursor, connection
+                    connection.commit()
+                except Exception as e:
+                    connection.rollback()
+                    if isinstance(e, Error):
+                        print(f"Transaction failed: {e}")
+                        print(f"Rolling back all changes...")
+                    raise
+        except BaseException:
+            stack.remove(hooks)
+            raise
+        stack.remove(hooks)
+        _run_hooks(hooks)
+
+    def after_commit(self, callback):
+        """
+        Run callback() once the transaction open on this thread commits
+        Dropped if it rolls back; runs immediately when no transaction is open
+        """
+        stack = _hook_stack()
+        if stack:
+            stack[-1].append(callback)
+        else:
+            _run_hooks([callback])
+
+    @contextmanager
+    def savepoint(self, cursor, name):
+        """
+        Run a block under a SAVEPOINT of the current transaction
+        On exception only the block's writes (and its after_commit
+        callbacks) are undone, then the exception propagates
+        """
+        stack = _hook_stack()
+        marker = len(stack[-1]) if stack else 0
+        cursor.execute(f'SAVEPOINT {name}')
+        try:
+            yield
+        except Exception as e:
+            # A deadlock has already rolled back the whole transaction
+            if not (isinstance(e, Error) and getattr(e, 'errno', None) == DEADLOCK_ERRNO):
+                cursor.execute(f'ROLLBACK TO SAVEPOINT {name}')
+                if stack:
+                    del stack[-1][marker:]
+            raise
+        cursor.execute(f'RELEASE SAVEPOINT {name}')
+
+    def run_in_transaction(self, work, *args, retries=2, prepared=False):
+        """
+        Call work(cursor, *args) inside a transaction and return its result
+        Retried up to `retries` times when InnoDB picks it as a deadlock victim
+        """
+        attempt = 0
+        while True:
+            try:
+                with self.transaction(prepared=prepared) as (cursor, connection):
+                    return work(cursor, *args)
+            except Error as e:
+                if getattr(e, 'errno', None) != DEADLOCK_ERRNO or attempt >= retries:
+                    raise
+                attempt += 1
 
     def execute_transaction(self, operations):
         """
         Execute multiple operations in a single transaction
         operations: list of (query, params) tuples
-        Returns: True if all successful, False otherwise
+        Returns: True if all successful, raises otherwise
         """
-        with self.get_cursor() as (cursor, connection):
-            try:
-                for query, params in operations:
-                    cursor.execute(query, params or ())
-                connection.commit()
-                return True
-            except Error as e:
-                connection.rollback()
-                print(f"Transaction failed: {e}")
-                print(f"Rolling back all changes...")
-                raise e
+        with self.transaction() as (cursor, connection):
+            for query, params in operations:
+                cursor.execute(query, params or ())
+        return True
 
-    def execute_query(self, query, params=None):
-        """Execute a single query with automatic commit"""
-        with self.get_cursor() as (cursor, connection):
+    def execute_query(self, query, params=None, prepared=False):
+        """Execute a single query (autocommitted)"""
+        with self.get_cursor(prepared=prepared) as (cursor, connection):
             cursor.execute(query, params or ())
-            connection.commit()
             return cursor.lastrowid
 
-    def fetch_all(self, query, params=None):
+    def fetch_all(self, query, params=None, prepared=False):
         """Fetch all results"""
-        with self.get_cursor() as (cursor, connection):
+        with self.get_cursor(prepared=prepared) as (cursor, connection):
             cursor.execute(query, params or ())
             result = cursor.fetchall()
             return result
 
-    def fetch_one(self, query, params=None):
+    def fetch_one(self, query, params=None, prepared=False):
         """Fetch single result"""
-        with self.get_cursor() as (cursor, connection):
+        with self.get_cursor(prepared=prepared) as (cursor, connection):
             cursor.execute(query, params or ())
             result = cursor.fetchone()
             return result
 
+    def stream(self, query, params=None, batch_size=1000, dictionary=True):
+        """
+        Yield rows one by one from an unbuffered cursor
+
+        Rows are streamed from the server as they are consumed, so memory
+        stays flat however large the result is. The pooled connection is
+        held until the generator finishes; if it is abandoned early the
+        connection is dropped rather than draining the remaining rows.
+        """
+        pool = self.pool
+        started = time.perf_counter()
+        pooled = pool.acquire()
+        metrics.observe_connect(time.perf_counter() - started)
+        connection = pooled.connection
+        cursor = None
+        finished = False
+        # Reported as one statement: server time spent producing rows, not the consumer's time
+        busy = 0.0
+        count = 0
+        failed = False
+        try:
+            cursor = connection.cursor(dictionary=dictionary, buffered=False)
+            started = time.perf_counter()
+            cursor.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                busy += time.perf_counter() - started
+                if not rows:
+                    break
+                count += len(rows)
+                for row in rows:
+                    yield row
+                started = time.perf_counter()
+            finished = True
+        except Error as e:
+            failed = True
+            print(f"Database stream error: {e}")
+            raise e
+        finally:
+            metrics.observe_query(busy, count, failed=failed)
+            if cursor and finished:
+                cursor.close()
+            pool.release(pooled, discard=not finished)
+
+    def ping(self):
+        """
+        Round-trip a trivial query on a pooled connection
+
+        Returns:
+            float: seconds taken; raises if the database is unreachable
+        """
+        started = time.monotonic()
+        self.fetch_one('SELECT 1')
+        return time.monotonic() - started
+
+    def estimated_rows(self, table):
+        """
+        Approximate row count of a table, without scanning it on MySQL
+
+        MySQL answers from InnoDB statistics (can be off by tens of
+        percent); an embedded database is small enough to count.
+        """
+        if self.backend == 'sqlite':
+            row = self.fetch_one(f'SELECT COUNT(*) as total FROM {table}')
+        else:
+            row = self.fetch_one(
+                """SELECT TABLE_ROWS as total FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s""",
+                (table,)
+            )
+        return int(row['total'] or 0) if row else 0
+
+    def pool_stats(self):
+        """Connection pool size and checkout metrics for this process"""
+        return self.pool.stats()
+
     def get_timezone_now(self):
         """Get current timestamp in UTC (timezone-aware)"""
         return datetime.now(timezone.utc)
@@ -114,18 +820,14 @@ class Database:
 
             start_dt = ensure_aware(start_time)
             end_dt = ensure_aware(end_time)
-            
+
             if start_dt and end_dt:
                 return int((end_dt - start_dt).total_seconds())
         return None
 
-# Global database instance
+# Global database instance. Nothing connects until the first query, so
+# importing this module (and booting a worker) never waits on MySQL.
 db = Database()
 
-# Test connection on module load
-connection = db.connect()
-if connection:
-    print("✅ Database connection successful!")
-    connection.close()
-else:
-    print("❌ Database connection failed!")
+# Imported last: the core package imports this module back for `db`
+from core.metrics import metrics  # noqa: E402
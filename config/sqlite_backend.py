@@ -0,0 +1,397 @@
+"""
+SQLITE BACKEND - Embedded storage for single-station installs
+=============================================================
+
+Rules:
+1. DB_BACKEND=sqlite keeps everything in one file (SQLITE_PATH) in WAL
+   mode: readers never wait for the writer or for each other, and a
+   query is a function call instead of a network round trip
+2. Connections look like mysql-connector ones to ConnectionPool and
+   Database (cursor(dictionary, buffered), start_transaction(), commit(),
+   rollback(), in_transaction, ping(), close()), so fetch_one, fetch_all,
+   transaction and execute_transaction work unchanged
+3. The application keeps writing MySQL SQL. translate() rewrites the few
+   MySQL-only constructs it uses:
+   - %s placeholders -> ?
+   - SELECT ... FOR UPDATE -> SELECT (transactions take the write lock
+     up front with BEGIN IMMEDIATE, so locking reads are not needed)
+   - INSERT IGNORE -> INSERT OR IGNORE
+   - ON DUPLICATE KEY UPDATE ... VALUES(col) -> ON CONFLICT DO UPDATE SET ... excluded.col
+   - MATCH(cols) AGAINST (%s IN BOOLEAN MODE) -> BOOLEAN_MATCH(?, cols)
+   NOW(), CONCAT, LEAST, GREATEST and FLOOR are registered as functions
+4. A new file gets database_schema_sqlite.sql on first open
+5. sqlite3 errors are re-raised as mysql.connector errors with the
+   matching MySQL errno, so callers keep catching one exception type
+"""
+
+import math
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from functools import lru_cache
+from mysql.connector import errors
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database_schema_sqlite.sql')
+
+# MySQL errnos for the errors callers look at
+DUPLICATE_ENTRY_ERRNO = 1062
+FOREIGN_KEY_ERRNO = 1452
+NOT_NULL_ERRNO = 1048
+LOCK_WAIT_TIMEOUT_ERRNO = 1205
+
+
+# ============================================================================
+# TYPES (stored the way MySQL TIMESTAMP(0) columns round-trip)
+# ============================================================================
+
+def _adapt_datetime(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _convert_datetime(raw):
+    try:
+        return datetime.fromisoformat(raw.decode())
+    except ValueError:
+        return raw.decode()
+
+
+def _convert_date(raw):
+    try:
+        return date.fromisoformat(raw.decode()[:10])
+    except ValueError:
+        return raw.decode()
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_converter('TIMESTAMP', _convert_datetime)
+sqlite3.register_converter('DATETIME', _convert_datetime)
+sqlite3.register_converter('DATE', _convert_date)
+
+
+# ============================================================================
+# SQL TRANSLATION
+# ============================================================================
+
+_PLACEHOLDER = re.compile(r'%[%s]')
+_FOR_UPDATE = re.compile(r'\s+FOR\s+UPDATE\b', re.IGNORECASE)
+_INSERT_IGNORE = re.compile(r'\bINSERT\s+IGNORE\b', re.IGNORECASE)
+_ON_DUPLICATE = re.compile(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b', re.IGNORECASE)
+_VALUES_REFERENCE = re.compile(r'\bVALUES\((\w+)\)', re.IGNORECASE)
+_MATCH_AGAINST = re.compile(
+    r'MATCH\s*\(([^)]*)\)\s*AGAINST\s*\(\s*(%s)\s+IN\s+BOOLEAN\s+MODE\s*\)', re.IGNORECASE
+)
+
+
+@lru_cache(maxsize=1024)
+def translate(sql, substitute=True):
+    """
+    Rewrite a MySQL statement for SQLite
+
+    Args:
+        sql: statement as written for mysql-connector
+        substitute: parameters were passed (mysql-connector only expands
+                    %s and %% then)
+
+    Returns:
+        str: SQLite statement
+    """
+    sql = _MATCH_AGAINST.sub(lambda m: f'BOOLEAN_MATCH({m.group(2)}, {m.group(1)})', sql)
+    sql = _FOR_UPDATE.sub('', sql)
+    sql = _INSERT_IGNORE.sub('INSERT OR IGNORE', sql)
+    duplicate = _ON_DUPLICATE.search(sql)
+    if duplicate:
+        assignments = _VALUES_REFERENCE.sub(r'excluded.\1', sql[duplicate.end():])
+        sql = f'{sql[:duplicate.start()]}ON CONFLICT DO UPDATE SET{assignments}'
+    if substitute:
+        sql = _PLACEHOLDER.sub(lambda m: '%' if m.group() == '%%' else '?', sql)
+    return sql
+
+
+_SEARCH_TERM = re.compile(r'([+-]?)"([^"]*)"|([+-]?)(\S+)')
+
+
+@lru_cache(maxsize=256)
+def _search_terms(expression):
+    terms = []
+    for match in _SEARCH_TERM.finditer(expression or ''):
+        operator = match.group(1) or match.group(3)
+        term = (match.group(2) if match.group(2) is not None else match.group(4)).strip('*').lower()
+        if term:
+            terms.append((operator, term))
+    return tuple(terms)
+
+
+def boolean_match(expression, *values):
+    """
+    BOOLEAN MODE relevance over substrings (what the ngram index matches)
+
+    +term must appear, -term must not; every term found adds one to the score
+    """
+    text = ' '.join(str(value) for value in values if value is not None).lower()
+    score = 0
+    for operator, term in _search_terms(expression):
+        found = term in text
+        if (operator == '+' and not found) or (operator == '-' and found):
+            return 0
+        score += found
+    return score
+
+
+def _concat(*values):
+    if any(value is None for value in values):
+        return None
+    return ''.join(str(value) for value in values)
+
+
+def _least(*values):
+    return None if any(value is None for value in values) else min(values)
+
+
+def _greatest(*values):
+    return None if any(value is None for value in values) else max(values)
+
+
+def _floor(value):
+    return None if value is None else math.floor(value)
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+# ============================================================================
+# ERRORS
+# ============================================================================
+
+def _mysql_error(error):
+    """The mysql.connector error a MySQL server would have raised"""
+    message = str(error)
+    if isinstance(error, sqlite3.IntegrityError):
+        if 'UNIQUE' in message or 'PRIMARY KEY' in message:
+            return errors.IntegrityError(msg=message, errno=DUPLICATE_ENTRY_ERRNO)
+        if 'FOREIGN KEY' in message:
+            return errors.IntegrityError(msg=message, errno=FOREIGN_KEY_ERRNO)
+        if 'NOT NULL' in message:
+            return errors.IntegrityError(msg=message, errno=NOT_NULL_ERRNO)
+        return errors.IntegrityError(msg=message)
+    if isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message):
+        return errors.OperationalError(msg=message, errno=LOCK_WAIT_TIMEOUT_ERRNO)
+    if isinstance(error, sqlite3.OperationalError):
+        return errors.ProgrammingError(msg=message)
+    return errors.DatabaseError(msg=message)
+
+
+# ============================================================================
+# CONNECTION / CURSOR
+# ============================================================================
+
+class SQLiteCursor:
+    """
+    mysql-connector style cursor over a sqlite3 cursor
+
+    buffered=True reads the whole result on execute (rowcount is the row
+    count, as with MySQL buffered cursors); buffered=False fetches lazily
+    for Database.stream().
+    """
+
+    def __init__(self, cursor, dictionary=False, buffered=True):
+        self._cursor = cursor
+        self._dictionary = dictionary
+        self._buffered = buffered
+        self._columns = None
+        self._rows = None
+        self._position = 0
+        self._rowcount = -1
+
+    def execute(self, operation, params=None):
+        try:
+            self._cursor.execute(translate(operation, bool(params)), tuple(params) if params else ())
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+        self._load()
+
+    def executemany(self, operation, seq_params):
+        try:
+            self._cursor.executemany(translate(operation), [tuple(params) for params in seq_params])
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+        self._columns = None
+        self._rows = None
+        self._rowcount = self._cursor.rowcount
+
+    def _load(self):
+        description = self._cursor.description
+        self._position = 0
+        self._rows = None
+        if description is None:
+            self._columns = None
+            self._rowcount = self._cursor.rowcount
+            return
+        self._columns = tuple(column[0] for column in description)
+        if self._buffered:
+            self._rows = [self._shape(row) for row in self._cursor.fetchall()]
+            self._rowcount = len(self._rows)
+        else:
+            self._rowcount = -1
+
+    def _shape(self, row):
+        return dict(zip(self._columns, row)) if self._dictionary else tuple(row)
+
+    def fetchone(self):
+        if self._columns is None:
+            return None
+        if self._rows is None:
+            row = self._cursor.fetchone()
+            return None if row is None else self._shape(row)
+        if self._position >= len(self._rows):
+            return None
+        self._position += 1
+        return self._rows[self._position - 1]
+
+    def fetchmany(self, size=1):
+        if self._columns is None:
+            return []
+        if self._rows is None:
+            return [self._shape(row) for row in self._cursor.fetchmany(size)]
+        rows = self._rows[self._position:self._position + size]
+        self._position += len(rows)
+        return rows
+
+    def fetchall(self):
+        if self._columns is None:
+            return []
+        if self._rows is None:
+            return [self._shape(row) for row in self._cursor.fetchall()]
+        rows = self._rows[self._position:]
+        self._position = len(self._rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    @property
+    def rowcount(self):
+        return self._rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def with_rows(self):
+        return self._columns is not None
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def column_names(self):
+        return self._columns or ()
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """The parts of a mysql-connector connection that the pool and Database use"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, dictionary=False, buffered=True, **kwargs):
+        return SQLiteCursor(self._connection.cursor(), dictionary, buffered)
+
+    def _execute(self, sql):
+        try:
+            self._connection.execute(sql)
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    def start_transaction(self):
+        # Take the write lock now: the first locking read must not lose a race to upgrade later
+        self._execute('BEGIN IMMEDIATE')
+
+    def commit(self):
+        if self._connection.in_transaction:
+            self._execute('COMMIT')
+
+    def rollback(self):
+        if self._connection.in_transaction:
+            self._execute('ROLLBACK')
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    def ping(self, reconnect=False):
+        self._execute('SELECT 1')
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self._connection.close()
+
+
+_bootstrapped = set()
+_bootstrap_lock = threading.Lock()
+
+
+def bootstrap(connection, path):
+    """Create the schema in a new database file (once per file per process)"""
+    with _bootstrap_lock:
+        if path in _bootstrapped:
+            return
+        exists = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'trolley_barcodes'"
+        ).fetchone()
+        if not exists:
+            with open(SCHEMA_PATH, encoding='utf-8') as handle:
+                schema = handle.read()
+            # IF NOT EXISTS / OR IGNORE throughout: a worker racing us only repeats no-ops
+            connection.executescript(f'BEGIN IMMEDIATE;\n{schema}\nCOMMIT;')
+            print(f"✅ Created SQLite database {path}")
+        _bootstrapped.add(path)
+
+
+def connect(path, busy_timeout=10.0, synchronous='NORMAL'):
+    """
+    Open a connection to the database file at path
+
+    Args:
+        busy_timeout: seconds a writer waits for the write lock
+        synchronous: PRAGMA synchronous (NORMAL is durable across crashes
+                     in WAL mode; FULL also across power loss)
+
+    Returns:
+        SQLiteConnection
+    """
+    synchronous = synchronous.upper()
+    if synchronous not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+        raise ValueError(f"Invalid SQLITE_SYNCHRONOUS: {synchronous}")
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # isolation_level=None: autocommit, like the MySQL pool; transactions are explicit
+    connection = sqlite3.connect(
+        path, timeout=busy_timeout, isolation_level=None,
+        detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False
+    )
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.execute(f'PRAGMA synchronous = {synchronous}')
+    connection.execute('PRAGMA foreign_keys = ON')
+    connection.create_function('NOW', 0, _now)
+    connection.create_function('CONCAT', -1, _concat, deterministic=True)
+    connection.create_function('LEAST', -1, _least, deterministic=True)
+    connection.create_function('GREATEST', -1, _greatest, deterministic=True)
+    connection.create_function('FLOOR', 1, _floor, deterministic=True)
+    connection.create_function('BOOLEAN_MATCH', -1, boolean_match, deterministic=True)
+    bootstrap(connection, path)
+    return SQLiteConnection(connection)
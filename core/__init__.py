@@ -3,5 +3,6 @@ Core module - System infrastructure
 """
 
 from core.time_engine import TimeEngine, TimeService, time_service
+from core.history_recorder import HistoryRecorder
 
-__all__ = ['TimeEngine', 'TimeService', 'time_service']
+__all__ = ['TimeEngine', 'TimeService', 'time_service', 'HistoryRecorder']
@@ -0,0 +1,243 @@
+"""
+ANALYTICS - Process duration percentiles and throughput, off the OLTP path
+==========================================================================
+
+Rules:
+1. Every completed process (process_output event) is kept per worker in
+   a columnar cache of NumPy arrays: event id, completion time (epoch
+   seconds), duration, meters, and process code / name as small integer
+   codes into a dictionary. About 40 bytes per event
+2. The cache refreshes incrementally, at most every
+   ANALYTICS_REFRESH_INTERVAL seconds and only when queried: rows past
+   the last loaded id are read by primary key, in batches of
+   ANALYTICS_REFRESH_BATCH. The last ANALYTICS_OVERLAP_IDS ids are read
+   again, so a transaction that commits a lower id late is still picked
+   up (ids already loaded are skipped)
+3. Queries never touch the database: a date window is a boolean mask,
+   groups are integer codes, percentiles / counts / sums run vectorized
+   over the arrays
+4. Days are Pakistan calendar days, like every date shown in the app;
+   hours are clock hours
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+from core.time_engine import TimeEngine
+
+ANALYTICS_REFRESH_INTERVAL = float(os.getenv('ANALYTICS_REFRESH_INTERVAL', 30))
+ANALYTICS_REFRESH_BATCH = int(os.getenv('ANALYTICS_REFRESH_BATCH', 50000))
+ANALYTICS_OVERLAP_IDS = int(os.getenv('ANALYTICS_OVERLAP_IDS', 1000))
+ANALYTICS_GROUPS = ('process_code', 'process_name')
+PERCENTILES = (50, 90, 99)
+
+
+def _epoch(value):
+    parsed = TimeEngine.parse_datetime(value)
+    return int(parsed.timestamp()) if parsed else 0
+
+
+def _from_epoch(seconds):
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+def _number(value):
+    """meters is free text on the lot: numeric values count, anything else is NaN"""
+    try:
+        return float(str(value).replace(',', '').strip())
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class ProcessAnalytics:
+    """Columnar cache of completed processes and the queries over it"""
+
+    def __init__(self, refresh_interval, batch_size, overlap_ids):
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        self.overlap_ids = overlap_ids
+        self._lock = threading.Lock()
+        self._columns = self._empty()
+        self._dictionaries = {group: ([], {}) for group in ANALYTICS_GROUPS}
+        self._max_id = 0
+        self._refreshed = None
+        self.refreshed_at = None
+
+    @staticmethod
+    def _empty():
+        return {
+            'id': np.empty(0, dtype=np.int64),
+            'time': np.empty(0, dtype=np.int64),
+            'duration': np.empty(0, dtype=np.float64),
+            'meters': np.empty(0, dtype=np.float64),
+            'process_code': np.empty(0, dtype=np.int32),
+            'process_name': np.empty(0, dtype=np.int32),
+        }
+
+    def _encode(self, group, value):
+        values, codes = self._dictionaries[group]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def refresh(self, db, force=False):
+        """Load process_output events added since the last refresh"""
+        now = time.monotonic()
+        if not force and self._refreshed is not None and now - self._refreshed < self.refresh_interval:
+            return
+        with self._lock:
+            if not force and self._refreshed is not None and now - self._refreshed < self.refresh_interval:
+                return
+            after = max(self._max_id - self.overlap_ids, 0)
+            columns = self._columns
+            known = columns['id'][columns['id'] > after]
+            chunks = []
+            while True:
+                rows = db.fetch_all(
+                    """SELECT id, created_at, process_code, process_name, duration_seconds, meters
+                    FROM view_history
+                    WHERE id > %s AND event_type = 'process_output'
+                    ORDER BY id LIMIT %s""",
+                    (after, self.batch_size)
+                )
+                if rows:
+                    chunks.append(rows)
+                    after = rows[-1]['id']
+                if len(rows) < self.batch_size:
+                    break
+
+            rows = [row for chunk in chunks for row in chunk]
+            if known.size and rows:
+                seen = set(known.tolist())
+                rows = [row for row in rows if row['id'] not in seen]
+            if rows:
+                added = {
+                    'id': np.fromiter((row['id'] for row in rows), dtype=np.int64, count=len(rows)),
+                    'time': np.fromiter((_epoch(row['created_at']) for row in rows), dtype=np.int64, count=len(rows)),
+                    'duration': np.fromiter(
+                        (np.nan if row['duration_seconds'] is None else row['duration_seconds'] for row in rows),
+                        dtype=np.float64, count=len(rows)
+                    ),
+                    'meters': np.fromiter((_number(row['meters']) for row in rows), dtype=np.float64, count=len(rows)),
+                }
+                for group in ANALYTICS_GROUPS:
+                    added[group] = np.fromiter(
+                        (self._encode(group, row[group] or '') for row in rows), dtype=np.int32, count=len(rows)
+                    )
+                # Readers hold the previous dict; swap in a new one
+                self._columns = {name: np.concatenate((columns[name], added[name])) for name in columns}
+                self._max_id = max(self._max_id, int(added['id'].max()))
+
+            self._refreshed = now
+            self.refreshed_at = TimeEngine.utc_now()
+
+    def query(self, db, from_utc=None, to_utc=None, group_by='process_code'):
+        """
+        Per-group duration percentiles and throughput plus hourly / daily series
+
+        Args:
+            from_utc, to_utc: completion time window (either may be None)
+            group_by: 'process_code' or 'process_name'
+
+        Returns:
+            dict: groups, hourly, daily, events, window hours
+        """
+        if group_by not in ANALYTICS_GROUPS:
+            raise ValueError(f"group_by must be one of {', '.join(ANALYTICS_GROUPS)}")
+        self.refresh(db)
+        columns = self._columns
+        names = list(self._dictionaries[group_by][0])
+
+        times = columns['time']
+        mask = np.ones(times.shape, dtype=bool)
+        if from_utc:
+            mask &= times >= _epoch(from_utc)
+        if to_utc:
+            mask &= times < _epoch(to_utc)
+        times = times[mask]
+        durations = columns['duration'][mask]
+        meters = columns['meters'][mask]
+        groups = columns[group_by][mask]
+
+        start = _epoch(from_utc) if from_utc else (int(times.min()) if times.size else 0)
+        end = _epoch(to_utc) if to_utc else int(time.time())
+        hours = max((end - start) / 3600, 1 / 60)
+
+        result = {'events': int(times.size), 'windowHours': round(hours, 2), 'groups': [], 'hourly': [], 'daily': []}
+        if not times.size:
+            return result
+
+        # Per group: counts and meters by bincount, percentiles over each group's sorted durations
+        counts = np.bincount(groups, minlength=len(names))
+        meter_sums = np.bincount(groups, weights=np.nan_to_num(meters), minlength=len(names))
+        timed = ~np.isnan(durations)
+        order = np.lexsort((durations[timed], groups[timed]))
+        sorted_groups = groups[timed][order]
+        sorted_durations = durations[timed][order]
+        bounds = np.searchsorted(sorted_groups, np.arange(len(names) + 1))
+
+        for code in np.flatnonzero(counts):
+            values = sorted_durations[bounds[code]:bounds[code + 1]]
+            if values.size:
+                p50, p90, p99 = np.percentile(values, PERCENTILES)
+                duration = {
+                    'count': int(values.size),
+                    'p50': round(float(p50), 1),
+                    'p90': round(float(p90), 1),
+                    'p99': round(float(p99), 1),
+                    'mean': round(float(values.mean()), 1),
+                    'min': int(values[0]),
+                    'max': int(values[-1]),
+                }
+            else:
+                duration = None
+            result['groups'].append({
+                'key': names[code],
+                'completed': int(counts[code]),
+                'throughputPerHour': round(counts[code] / hours, 3),
+                'meters': round(float(meter_sums[code]), 2),
+                'durationSeconds': duration,
+            })
+        result['groups'].sort(key=lambda group: group['completed'], reverse=True)
+
+        # Hourly completions (clock hours, UTC-aligned; Pakistan is a whole-hour offset)
+        hour_index = times // 3600
+        hour_keys, hour_counts = np.unique(hour_index, return_counts=True)
+        result['hourly'] = [
+            {'hour': TimeEngine.format_pakistan(_from_epoch(key * 3600)), 'completed': int(count)}
+            for key, count in zip(hour_keys.tolist(), hour_counts.tolist())
+        ]
+
+        # Meters per Pakistan day
+        offset = int(TimeEngine.pakistan_now().utcoffset().total_seconds())
+        day_index = (times + offset) // 86400
+        day_keys, day_positions, day_counts = np.unique(day_index, return_inverse=True, return_counts=True)
+        day_meters = np.bincount(day_positions, weights=np.nan_to_num(meters))
+        result['daily'] = [
+            {
+                # Shifted by the offset already: the UTC date is the Pakistan date
+                'day': _from_epoch(key * 86400).strftime('%Y-%m-%d'),
+                'completed': int(count),
+                'meters': round(float(total), 2),
+            }
+            for key, count, total in zip(day_keys.tolist(), day_counts.tolist(), day_meters.tolist())
+        ]
+        return result
+
+    def info(self):
+        return {
+            'cachedEvents': int(self._columns['id'].size),
+            'refreshedAt': self.refreshed_at.isoformat() if self.refreshed_at else None,
+            'refreshInterval': self.refresh_interval,
+        }
+
+
+process_analytics = ProcessAnalytics(
+    refresh_interval=ANALYTICS_REFRESH_INTERVAL,
+    batch_size=ANALYTICS_REFRESH_BATCH,
+    overlap_ids=ANALYTICS_OVERLAP_IDS
+)
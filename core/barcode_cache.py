@@ -0,0 +1,113 @@
+"""
+BARCODE CACHE - Read-through cache of current barcode state rows
+================================================================
+
+Rules:
+1. Keys are (table, barcode) for trolley_barcodes / process_barcodes
+2. Check endpoints read through the cache; the workflow's locking reads
+   never do
+3. Every write path calls invalidate_on_commit() with the barcodes it
+   touched; the invalidation fires after COMMIT and is seen by every
+   worker on the host (GenerationTable) before the response is sent
+4. A TTL bounds staleness for writers on other hosts
+5. LRU-bounded; BARCODE_CACHE_SIZE=0 disables caching
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from core.generations import GenerationTable
+
+TROLLEY_TABLE = 'trolley_barcodes'
+PROCESS_TABLE = 'process_barcodes'
+
+
+class BarcodeStateCache:
+    """LRU of barcode rows validated against host-wide generation stamps"""
+
+    def __init__(self, max_entries=5000, ttl=30.0, generations=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generations = generations or GenerationTable('barcode_state')
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, table, barcode, loader):
+        """
+        Return the cached row for (table, barcode), loading it on a miss
+
+        Args:
+            table: TROLLEY_TABLE or PROCESS_TABLE
+            barcode: barcode string
+            loader: callable returning the row dict, or None if absent
+
+        Returns:
+            dict or None: a copy of the row
+        """
+        if self.max_entries <= 0:
+            return loader()
+
+        key = (table, barcode)
+        generation = self.generations.current(barcode)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] == generation and now - entry[2] < self.ttl:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return dict(entry[0]) if entry[0] is not None else None
+            self._misses += 1
+
+        # Generation was read before the load: a write that commits while
+        # we load changes the stamp, so this entry is never served stale
+        row = loader()
+        with self._lock:
+            self._entries[key] = (dict(row) if row is not None else None, generation, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return row
+
+    def trolley(self, db, barcode):
+        """Current trolley_barcodes row with its lot fields, or None"""
+        return self.get(TROLLEY_TABLE, barcode, lambda: db.fetch_one(
+            'SELECT * FROM view_trolleys WHERE barcode = %s', (barcode,), prepared=True
+        ))
+
+    def process(self, db, barcode):
+        """Current process_barcodes row with its lot fields, or None"""
+        return self.get(PROCESS_TABLE, barcode, lambda: db.fetch_one(
+            'SELECT * FROM view_processes WHERE barcode = %s', (barcode,), prepared=True
+        ))
+
+    def invalidate(self, *barcodes):
+        """Drop barcodes from every worker's cache on this host"""
+        for barcode in barcodes:
+            if barcode:
+                self.generations.bump(barcode)
+                with self._lock:
+                    self._entries.pop((TROLLEY_TABLE, barcode), None)
+                    self._entries.pop((PROCESS_TABLE, barcode), None)
+
+    def invalidate_on_commit(self, db, *barcodes):
+        """Invalidate once the current transaction commits"""
+        barcodes = tuple(barcodes)
+        db.after_commit(lambda: self.invalidate(*barcodes))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'misses': self._misses,
+            }
+
+
+barcode_cache = BarcodeStateCache(
+    max_entries=int(os.getenv('BARCODE_CACHE_SIZE', 5000)),
+    ttl=float(os.getenv('BARCODE_CACHE_TTL', 30))
+)
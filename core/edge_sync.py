@@ -0,0 +1,409 @@
+"""
+EDGE SYNC - Offline-first edge nodes that push their scans to central
+=====================================================================
+
+Rules:
+1. NODE_ROLE=edge runs the normal app on a local store (DB_BACKEND=sqlite):
+   scans, checks and searches never leave the hall, so they keep working
+   and stay fast while the WAN link is slow or down
+2. Every transition applied on the edge (attach, process input, process
+   output, clear) writes one sync_outbox row in the SAME transaction,
+   numbered by a gap-free sequence (seq): no committed scan can be
+   missing from the outbox and nothing uncommitted can be in it
+3. The row carries what central needs to replay it (op + request
+   arguments + the edge timestamp) and the state the edge saw for each
+   barcode it touched (base)
+4. One worker per host (flock) pushes unacknowledged rows in order, in
+   zlib-compressed batches of SYNC_BATCH_SIZE, to central's
+   /api/sync/ingest; failures back off up to SYNC_MAX_BACKOFF seconds
+5. Central replays each op through the same WorkflowEngine code with the
+   edge's timestamp, so its history matches the edge's. Replay is
+   idempotent per (node, seq): resending a batch returns the recorded
+   outcome instead of applying twice
+6. If a barcode's central state no longer matches the edge's base (it
+   was scanned on both sides) the op is not applied and is reported as a
+   conflict on both nodes; later ops on that barcode conflict as well
+   until someone reconciles it
+7. Acknowledged rows are kept SYNC_RETENTION_DAYS days; conflicts and
+   rejections are kept until deleted by hand
+8. If central asks for a seq the outbox no longer has (it was restored
+   from a backup older than the retention window) pushing stops and the
+   node reports itself halted (/api/sync/status, /readyz) until an
+   operator runs `manage.py sync-resync`, which moves central's seq past
+   the lost ops and resumes
+"""
+
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import zlib
+from datetime import datetime, timedelta, timezone
+from config.database import db
+from core.generations import runtime_dir
+from core.time_engine import TimeService
+
+try:
+    import fcntl
+except ImportError:  # Windows: every worker pushes; central's idempotency keeps it correct
+    fcntl = None
+
+NODE_ROLES = ('central', 'edge')
+# Outcomes central reports per op
+SYNC_APPLIED = 'applied'
+SYNC_CONFLICT = 'conflict'
+SYNC_REJECTED = 'rejected'
+
+
+class SyncHalted(RuntimeError):
+    """Central needs ops this edge no longer has; pushing waits for an operator"""
+
+
+def snapshot(kind, barcode, row):
+    """
+    Base entry for one barcode: the state an op was applied against
+
+    Args:
+        kind: 'trolley' or 'process'
+        row: the row read under lock (None if the barcode did not exist);
+             view rows also pin the lot number
+    """
+    if row is None:
+        # A trolley that does not exist behaves as EMPTY (check/attach/output all treat it so)
+        return {'kind': kind, 'barcode': barcode, 'state': 'EMPTY' if kind == 'trolley' else None}
+    entry = {'kind': kind, 'barcode': barcode, 'state': row['state']}
+    if 'lot_number' in row:
+        entry['lot_number'] = row['lot_number']
+    return entry
+
+
+def encode_batch(node_id, ops):
+    """zlib-compressed JSON body of an ingest request"""
+    return zlib.compress(json.dumps({'node': node_id, 'ops': ops}, default=str).encode('utf-8'), 6)
+
+
+def decode_batch(raw, compressed, max_bytes):
+    """
+    Body of an ingest request; raises ValueError on garbage or if it
+    inflates beyond max_bytes
+    """
+    if compressed:
+        inflater = zlib.decompressobj()
+        try:
+            raw = inflater.decompress(raw, max_bytes)
+        except zlib.error as e:
+            raise ValueError(f'Body is not valid deflate data: {e}')
+        if inflater.unconsumed_tail:
+            raise ValueError(f'Batch larger than {max_bytes} bytes')
+    return json.loads(raw)
+
+
+def parse_timestamp(value):
+    """Edge timestamp from a batch (ISO string) as an aware UTC datetime"""
+    parsed = datetime.fromisoformat(str(value))
+    return parsed.replace(tzinfo=timezone.utc) if parsed.tzinfo is None else parsed.astimezone(timezone.utc)
+
+
+class EdgeSync:
+    """Outbox writer and push agent of an edge node (inert on central)"""
+
+    def __init__(self, db, role='central', node_id=None, central_url=None, token=None,
+                 interval=2.0, batch_size=200, timeout=10.0, max_backoff=60.0, retention_days=7):
+        if role not in NODE_ROLES:
+            raise ValueError(f"NODE_ROLE must be one of {', '.join(NODE_ROLES)}, not {role!r}")
+        self.db = db
+        self.role = role
+        self.enabled = role == 'edge'
+        if self.enabled:
+            if db.backend != 'sqlite':
+                raise ValueError('NODE_ROLE=edge needs DB_BACKEND=sqlite (the outbox sequence relies on its single writer)')
+            if not node_id or not central_url:
+                raise ValueError('NODE_ROLE=edge needs NODE_ID and SYNC_CENTRAL_URL')
+        self.node_id = node_id
+        self.central_url = (central_url or '').rstrip('/')
+        self.token = token
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.retention_days = retention_days
+        self._pid = None
+        self._lock_file = None
+
+    # ------------------------------------------------------------------
+    # Outbox (inside the caller's transaction)
+    # ------------------------------------------------------------------
+
+    def record(self, cursor, op, payload, base, occurred_at):
+        """
+        Queue a transition for central; no-op unless this node is an edge
+
+        Args:
+            cursor: cursor of the transaction that applied the transition
+            op: 'attach', 'input', 'output' or 'clear'
+            payload: arguments central replays it with (JSON-safe)
+            base: list of snapshot() entries for the barcodes it touched
+            occurred_at: the transition's TimeService timestamp
+        """
+        if not self.enabled:
+            return
+        # The transaction holds SQLite's write lock, so MAX + 1 cannot race
+        cursor.execute('SELECT COALESCE(MAX(seq), 0) + 1 as seq FROM sync_outbox')
+        seq = cursor.fetchone()['seq']
+        cursor.execute(
+            """INSERT INTO sync_outbox (seq, op, payload, base, occurred_at)
+            VALUES (%s, %s, %s, %s, %s)""",
+            (seq, op, json.dumps(payload, default=str), json.dumps(base, default=str), occurred_at)
+        )
+
+    def pending(self, limit):
+        rows = self.db.fetch_all(
+            """SELECT seq, op, payload, base, occurred_at FROM sync_outbox
+            WHERE acked_at IS NULL ORDER BY seq LIMIT %s""",
+            (limit,)
+        )
+        return [
+            {
+                'seq': row['seq'],
+                'op': row['op'],
+                'payload': json.loads(row['payload']),
+                'base': json.loads(row['base']),
+                'occurred_at': row['occurred_at'].isoformat() if isinstance(row['occurred_at'], datetime) else row['occurred_at'],
+            }
+            for row in rows
+        ]
+
+    # ------------------------------------------------------------------
+    # Push
+    # ------------------------------------------------------------------
+
+    def _post(self, path, body, compressed=True):
+        """POST a JSON body to central; returns (status, decoded JSON answer)"""
+        headers = {'Content-Type': 'application/json', 'X-Sync-Token': self.token or ''}
+        if compressed:
+            headers['Content-Encoding'] = 'deflate'
+        request = urllib.request.Request(f'{self.central_url}{path}', data=body, method='POST', headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read() or b'{}')
+        except urllib.error.HTTPError as e:
+            try:
+                return e.code, json.loads(e.read() or b'{}')
+            except ValueError:
+                return e.code, {}
+
+    def push_once(self):
+        """
+        Send one batch of unacknowledged ops
+
+        Returns:
+            dict: sent, applied, conflicts, rejected (all 0 when nothing is pending)
+        Raises:
+            OSError / RuntimeError when central cannot be reached or refuses
+        """
+        halted = self.halted()
+        if halted:
+            raise SyncHalted(halted['message'])
+        ops = self.pending(self.batch_size)
+        summary = {'sent': len(ops), SYNC_APPLIED: 0, 'conflicts': 0, SYNC_REJECTED: 0}
+        if not ops:
+            return summary
+
+        status, body = self._post('/api/sync/ingest', encode_batch(self.node_id, ops))
+        if status == 409 and 'expectedSeq' in body:
+            # Central lost ops it had acknowledged (restored from backup): send them again
+            expected = int(body['expectedSeq'])
+            if not self.db.fetch_one('SELECT seq FROM sync_outbox WHERE seq = %s', (expected,)):
+                oldest = self.db.fetch_one('SELECT MIN(seq) as seq FROM sync_outbox')['seq']
+                raise SyncHalted(self._halt(expected, oldest)['message'])
+            self.db.execute_query(
+                'UPDATE sync_outbox SET acked_at = NULL, status = NULL, message = NULL WHERE seq >= %s',
+                (expected,)
+            )
+            raise RuntimeError(f"Central expects seq {expected}; resending from there")
+        if status != 200:
+            raise RuntimeError(f"Central refused the batch ({status}): {body.get('message')}")
+
+        acked_at = TimeService.get_db_timestamp()
+        rows = []
+        for result in body.get('results', []):
+            rows.append((acked_at, result['status'], (result.get('message') or '')[:1000], result['seq']))
+            if result['status'] == SYNC_CONFLICT:
+                summary['conflicts'] += 1
+            elif result['status'] in (SYNC_APPLIED, SYNC_REJECTED):
+                summary[result['status']] += 1
+        if rows:
+            with self.db.transaction() as (cursor, connection):
+                cursor.executemany(
+                    'UPDATE sync_outbox SET acked_at = %s, status = %s, message = %s WHERE seq = %s',
+                    rows
+                )
+        return summary
+
+    def push_all(self):
+        """Push until the outbox is drained; returns the summed summary"""
+        total = {'sent': 0, SYNC_APPLIED: 0, 'conflicts': 0, SYNC_REJECTED: 0}
+        while True:
+            summary = self.push_once()
+            for key, value in summary.items():
+                total[key] += value
+            if summary['sent'] < self.batch_size:
+                return total
+
+    # ------------------------------------------------------------------
+    # Halt and resync (central lost ops the outbox has pruned)
+    # ------------------------------------------------------------------
+
+    def _halt_path(self):
+        return os.path.join(runtime_dir(), 'edge_sync.halted')
+
+    def _halt(self, expected, oldest):
+        halted = {
+            'expectedSeq': expected,
+            'oldestSeq': oldest,
+            'at': TimeService.get_db_timestamp().isoformat(),
+            'message': (f'Central expects seq {expected} but the outbox starts at {oldest}: '
+                        'run `python manage.py sync-resync` to skip the lost ops'),
+        }
+        # Shared by the host's workers: any of them may answer /readyz
+        with open(self._halt_path(), 'w') as handle:
+            json.dump(halted, handle)
+        print(f"Edge sync halted: {halted['message']}")
+        return halted
+
+    def halted(self):
+        """The halt record, or None while pushing normally"""
+        try:
+            with open(self._halt_path()) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def resync(self):
+        """
+        Move central's seq for this node past ops the outbox no longer has,
+        then resume pushing
+
+        Returns:
+            dict: central's answer (lastSeq, skipped)
+        Raises:
+            RuntimeError when central refuses
+        """
+        oldest = self.db.fetch_one('SELECT MIN(seq) as seq FROM sync_outbox')['seq']
+        if oldest is None:
+            raise RuntimeError('Outbox is empty; nothing to resync from')
+        status, body = self._post(
+            '/api/sync/resync',
+            json.dumps({'node': self.node_id, 'lastSeq': oldest - 1}).encode('utf-8'),
+            compressed=False
+        )
+        if status != 200:
+            raise RuntimeError(f"Central refused the resync ({status}): {body.get('message')}")
+        try:
+            os.remove(self._halt_path())
+        except FileNotFoundError:
+            pass
+        return body
+
+    def prune(self):
+        """Drop applied rows older than the retention window"""
+        if not self.retention_days:
+            return
+        cutoff = TimeService.get_db_timestamp() - timedelta(days=self.retention_days)
+        # The newest row stays: the next seq is MAX + 1 and must not restart at 1
+        self.db.execute_query(
+            """DELETE FROM sync_outbox WHERE status = 'applied' AND acked_at < %s
+            AND seq < (SELECT MAX(seq) FROM sync_outbox)""",
+            (cutoff,)
+        )
+
+    # ------------------------------------------------------------------
+    # Background agent
+    # ------------------------------------------------------------------
+
+    def _is_pusher(self):
+        """True once this process holds the host-wide push lock"""
+        if fcntl is None:
+            return True
+        if self._lock_file is None:
+            handle = open(os.path.join(runtime_dir(), 'edge_sync.lock'), 'a+')
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                return False
+            self._lock_file = handle
+        return True
+
+    def start(self):
+        """Start this worker's push agent (idempotent, fork-aware)"""
+        if not self.enabled or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        # A lock file inherited across fork belongs to the parent
+        self._lock_file = None
+        threading.Thread(target=self._run, name='edge-sync', daemon=True).start()
+
+    def _run(self):
+        pid = os.getpid()
+        delay = self.interval
+        last_prune = 0.0
+        while self._pid == pid:
+            time.sleep(delay)
+            try:
+                if not self._is_pusher() or self.halted():
+                    delay = self.interval
+                    continue
+                summary = self.push_all()
+                if summary['conflicts'] or summary[SYNC_REJECTED]:
+                    print(f"Edge sync: {summary['conflicts']} conflicts, "
+                          f"{summary[SYNC_REJECTED]} rejected (see /api/sync/conflicts)")
+                if time.monotonic() - last_prune > 3600:
+                    self.prune()
+                    last_prune = time.monotonic()
+                delay = self.interval
+            except Exception as e:
+                # Link down or central unhappy: keep scanning locally, retry later
+                delay = min(max(delay * 2, self.interval), self.max_backoff)
+                print(f"Edge sync push failed (retrying in {delay:.0f}s): {e}")
+
+    def status(self):
+        """Outbox depth and outcome counts of this edge"""
+        row = self.db.fetch_one(
+            """SELECT
+                SUM(CASE WHEN acked_at IS NULL THEN 1 ELSE 0 END) as pending,
+                MIN(CASE WHEN acked_at IS NULL THEN occurred_at END) as oldest_pending_at,
+                MAX(acked_at) as last_acked_at,
+                MAX(CASE WHEN acked_at IS NOT NULL THEN seq END) as acked_seq,
+                SUM(CASE WHEN status = 'conflict' THEN 1 ELSE 0 END) as conflicts,
+                SUM(CASE WHEN status = 'rejected' THEN 1 ELSE 0 END) as rejected
+            FROM sync_outbox"""
+        ) or {}
+        return {
+            'role': self.role,
+            'node': self.node_id,
+            'central': self.central_url,
+            'pending': int(row.get('pending') or 0),
+            'oldestPendingAt': row.get('oldest_pending_at'),
+            'lastAckedAt': row.get('last_acked_at'),
+            'ackedSeq': row.get('acked_seq'),
+            'conflicts': int(row.get('conflicts') or 0),
+            'rejected': int(row.get('rejected') or 0),
+            'halted': self.halted(),
+        }
+
+
+edge_sync = EdgeSync(
+    db,
+    role=os.getenv('NODE_ROLE', 'central').strip().lower(),
+    node_id=os.getenv('NODE_ID'),
+    central_url=os.getenv('SYNC_CENTRAL_URL'),
+    token=os.getenv('SYNC_TOKEN'),
+    interval=float(os.getenv('SYNC_INTERVAL', 2)),
+    batch_size=int(os.getenv('SYNC_BATCH_SIZE', 200)),
+    timeout=float(os.getenv('SYNC_TIMEOUT', 10)),
+    max_backoff=float(os.getenv('SYNC_MAX_BACKOFF', 60)),
+    retention_days=int(os.getenv('SYNC_RETENTION_DAYS', 7))
+)
@@ -0,0 +1,268 @@
+"""
+EVENT BUS - Live floor-state deltas for SSE and long-poll clients
+=================================================================
+
+Rules:
+1. Writers publish after COMMIT (publish_on_commit), so screens never
+   see a change that was rolled back
+2. Events are appended as JSON lines to a spool in the runtime directory
+   shared by every worker on the host; subscribers tail the spool, so a
+   transfer handled by one worker reaches screens held by any other
+3. An event id is "<segment>:<byte offset after the event>"; clients
+   resume from it (SSE Last-Event-ID, long-poll ?after=)
+4. Segments roll over at EVENT_SPOOL_SEGMENT_BYTES and only the newest
+   EVENT_SPOOL_SEGMENTS are kept; a client resuming from a pruned
+   segment gets a 'resync' event and reloads full state
+5. Local stand-in for a broker: hosts do not see each other's events
+6. Events are deltas, not documents: text values longer than
+   EVENT_MAX_TEXT characters are cut short (screens show a few columns;
+   full rows come from the API), and an event still over
+   EVENT_MAX_BYTES is published without its history row
+
+Event types:
+    trolley.attached   trolley filled from the form
+    trolley.cleared    trolley manually emptied
+    station.started    trolley -> process input (trolley is now EMPTY)
+    station.finished   process output -> trolley (stations are now EMPTY)
+    user.changed       user created / updated / deleted
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from core.generations import runtime_dir
+from core.time_engine import TimeEngine
+
+SEGMENT_NAME = re.compile(r'^(\d{8})\.log$')
+READ_CHUNK_BYTES = 256 * 1024
+EVENT_MAX_TEXT = int(os.getenv('EVENT_MAX_TEXT', 200))
+EVENT_MAX_BYTES = int(os.getenv('EVENT_MAX_BYTES', 64 * 1024))
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return TimeEngine.parse_datetime(value).isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+
+def _shorten(value):
+    """Cut text values longer than EVENT_MAX_TEXT (nested dicts and lists too)"""
+    if isinstance(value, dict):
+        return {key: _shorten(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_shorten(item) for item in value]
+    if isinstance(value, str) and len(value) > EVENT_MAX_TEXT:
+        return value[:EVENT_MAX_TEXT] + '…'
+    return value
+
+
+def parse_event_id(value):
+    """Returns: (segment, offset); (0, 0) for a missing or malformed id"""
+    try:
+        segment, offset = str(value).split(':', 1)
+        return max(int(segment), 0), max(int(offset), 0)
+    except (TypeError, ValueError):
+        return 0, 0
+
+
+class EventBus:
+    """Append-only, file-backed event spool shared by the host's workers"""
+
+    def __init__(self, name='events', segment_bytes=4 * 1024 * 1024, keep_segments=4, poll_interval=0.5):
+        self.name = name
+        self.segment_bytes = segment_bytes
+        self.keep_segments = max(keep_segments, 2)
+        self.poll_interval = poll_interval
+        self._directory = None
+        self._condition = threading.Condition()
+        self._published = 0
+        self._publish_failures = 0
+
+    # ------------------------------------------------------------------
+    # Spool files
+    # ------------------------------------------------------------------
+
+    def _dir(self):
+        if self._directory is None:
+            path = os.path.join(runtime_dir(), self.name)
+            os.makedirs(path, exist_ok=True)
+            self._directory = path
+        return self._directory
+
+    def _path(self, segment):
+        return os.path.join(self._dir(), f'{segment:08d}.log')
+
+    def _segments(self):
+        segments = []
+        for entry in os.listdir(self._dir()):
+            match = SEGMENT_NAME.match(entry)
+            if match:
+                segments.append(int(match.group(1)))
+        return sorted(segments)
+
+    def _prune(self, newest):
+        for segment in self._segments():
+            if segment <= newest - self.keep_segments:
+                try:
+                    os.remove(self._path(segment))
+                except OSError:
+                    pass
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+
+    def publish(self, event_type, data):
+        """
+        Append one event for every subscriber on this host
+
+        Never raises: a failed publish costs screens a live update, not
+        the request that caused it.
+        """
+        data = _shorten(data)
+        line = self._encode(event_type, data)
+        if len(line) > EVENT_MAX_BYTES and 'history' in data:
+            data = {key: value for key, value in data.items() if key != 'history'}
+            line = self._encode(event_type, dict(data, truncated=True))
+        try:
+            segments = self._segments()
+            segment = segments[-1] if segments else 1
+            if segments and os.path.getsize(self._path(segment)) >= self.segment_bytes:
+                segment += 1
+            # One O_APPEND write per event: concurrent workers never interleave lines
+            fd = os.open(self._path(segment), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+            if segment not in segments:
+                self._prune(segment)
+        except OSError as e:
+            self._publish_failures += 1
+            print(f"Event publish failed ({event_type}): {e}")
+            return
+        self._published += 1
+        with self._condition:
+            self._condition.notify_all()
+
+    @staticmethod
+    def _encode(event_type, data):
+        return json.dumps(
+            {'type': event_type, 'data': data, 'ts': TimeEngine.utc_now().isoformat()},
+            default=_json_default, separators=(',', ':')
+        ).encode('utf-8') + b'\n'
+
+    def publish_on_commit(self, db, event_type, data):
+        """Publish once the current transaction commits; dropped on rollback"""
+        db.after_commit(lambda: self.publish(event_type, data))
+
+    # ------------------------------------------------------------------
+    # Subscribing
+    # ------------------------------------------------------------------
+
+    def latest_id(self):
+        """Id of the current end of the spool (start here for live-only)"""
+        segments = self._segments()
+        if not segments:
+            return '0:0'
+        try:
+            return f'{segments[-1]}:{os.path.getsize(self._path(segments[-1]))}'
+        except OSError:
+            return f'{segments[-1]}:0'
+
+    def read(self, after, limit=500):
+        """
+        Events published after the given id
+
+        Returns:
+            tuple: (events, next_id, resync) - events are dicts with
+                   id/type/data/ts; resync is True when `after` points at
+                   data that no longer exists
+        """
+        segment, offset = parse_event_id(after)
+        segments = self._segments()
+        if not segments:
+            return [], after or '0:0', False
+        if segment == 0:
+            segment, offset = segments[0], 0
+        elif segment < segments[0] or segment > segments[-1]:
+            return [], self.latest_id(), True
+
+        events = []
+        while len(events) < limit:
+            try:
+                with open(self._path(segment), 'rb') as handle:
+                    size = os.fstat(handle.fileno()).st_size
+                    if offset > size:
+                        return [], self.latest_id(), True
+                    handle.seek(offset)
+                    chunk = handle.read(READ_CHUNK_BYTES)
+                    # A line longer than one chunk: read on to its end
+                    while len(chunk) >= READ_CHUNK_BYTES and b'\n' not in chunk[-READ_CHUNK_BYTES:]:
+                        more = handle.read(READ_CHUNK_BYTES)
+                        chunk += more
+                        if len(more) < READ_CHUNK_BYTES:
+                            break
+            except FileNotFoundError:
+                return [], self.latest_id(), True
+
+            # Only complete lines; a write in progress is picked up next time
+            complete = chunk[:chunk.rfind(b'\n') + 1]
+            for line in complete.splitlines(keepends=True):
+                offset += len(line)
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                event['id'] = f'{segment}:{offset}'
+                events.append(event)
+                if len(events) >= limit:
+                    break
+
+            if len(events) >= limit or (complete and len(chunk) >= READ_CHUNK_BYTES):
+                continue
+            later = [s for s in segments if s > segment] or [s for s in self._segments() if s > segment]
+            if len(complete) == len(chunk) and later:
+                segment, offset = later[0], 0
+                continue
+            break
+        return events, f'{segment}:{offset}', False
+
+    def wait(self, after, timeout, limit=500):
+        """
+        Block until events follow `after` or `timeout` seconds pass
+
+        Local publishes wake waiters at once; other workers' publishes are
+        picked up within poll_interval.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            events, next_id, resync = self.read(after, limit)
+            remaining = deadline - time.monotonic()
+            if events or resync or remaining <= 0:
+                return events, next_id, resync
+            after = next_id
+            with self._condition:
+                self._condition.wait(min(self.poll_interval, remaining))
+
+    def stats(self):
+        return {
+            'published': self._published,
+            'publish_failures': self._publish_failures,
+            'latest_id': self.latest_id(),
+        }
+
+
+event_bus = EventBus(
+    segment_bytes=int(os.getenv('EVENT_SPOOL_SEGMENT_BYTES', 4 * 1024 * 1024)),
+    keep_segments=int(os.getenv('EVENT_SPOOL_SEGMENTS', 4)),
+    poll_interval=float(os.getenv('EVENT_POLL_INTERVAL', 0.5))
+)
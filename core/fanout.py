@@ -0,0 +1,69 @@
+"""
+FANOUT - Run independent read queries concurrently
+==================================================
+
+Rules:
+1. One bounded thread pool per worker process (FANOUT_WORKERS threads),
+   created lazily and rebuilt after fork
+2. Each task takes its own pooled connection (db.fetch_* do), so keep
+   FANOUT_WORKERS below DB_POOL_MAX_SIZE
+3. gather() waits for all tasks up to one shared deadline; a task that
+   fails or misses it is reported by name and the others are kept, so
+   callers can answer with partial results
+4. Only for reads: tasks run outside the caller's transaction
+5. Queries run by tasks count towards the calling request's metrics
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from core.metrics import metrics
+
+FANOUT_WORKERS = int(os.getenv('FANOUT_WORKERS', 4))
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor, _executor_pid
+    # Threads do not survive fork: a pool inherited from the master is dead
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='fanout')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def gather(tasks, timeout):
+    """
+    Run callables concurrently and collect what finishes in time
+
+    Args:
+        tasks: dict of name -> zero-argument callable
+        timeout: seconds for the whole batch
+
+    Returns:
+        tuple: (results, errors) - results maps name -> return value for
+               tasks that succeeded; errors maps name -> message
+    """
+    executor = _get_executor()
+    futures = {name: executor.submit(metrics.bind(task)) for name, task in tasks.items()}
+    deadline = time.monotonic() + timeout
+
+    results = {}
+    errors = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            # Not started yet: drop it; already running: it finishes in the background
+            future.cancel()
+            errors[name] = f'timed out after {timeout}s'
+        except Exception as e:
+            print(f"Fan-out task {name} failed: {e}")
+            errors[name] = str(e)
+    return results, errors
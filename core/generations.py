@@ -0,0 +1,78 @@
+"""
+GENERATIONS - Host-wide change markers shared by all worker processes
+=====================================================================
+
+A fixed array of 64-bit slots in a small memory-mapped file. Writers
+stamp a fresh random value into a key's slot after they commit; readers
+remember the slot value they saw before loading data and treat the data
+as stale once the slot changes. Stamping (instead of incrementing)
+needs no cross-process lock: any new value is a change.
+
+Shared between gunicorn workers on the same host. Processes on other
+hosts do not see these stamps; caches that use them also carry a TTL.
+"""
+
+import mmap
+import os
+import random
+import struct
+import tempfile
+import threading
+import zlib
+
+SLOT_SIZE = 8
+
+
+def runtime_dir():
+    """Directory for files shared by the workers of this deployment"""
+    path = os.getenv('TROLLEY_RUNTIME_DIR') or os.path.join(
+        tempfile.gettempdir(), f"trolley_tracking_{os.getenv('DB_NAME', 'trolley_tracking')}"
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class GenerationTable:
+    """
+    Slot array keyed by a stable hash of the key
+
+    Falls back to a process-local array if the shared file cannot be
+    mapped (read-only filesystem, etc.).
+    """
+
+    def __init__(self, name, slots=4096):
+        self.name = name
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._map = None
+        self._local = None
+
+    def _buffer(self):
+        if self._map is not None:
+            return self._map
+        if self._local is not None:
+            return self._local
+        with self._lock:
+            if self._map is None and self._local is None:
+                size = self.slots * SLOT_SIZE
+                try:
+                    path = os.path.join(runtime_dir(), f'{self.name}.gen')
+                    with open(path, 'a+b') as handle:
+                        if os.path.getsize(path) < size:
+                            handle.truncate(size)
+                        self._map = mmap.mmap(handle.fileno(), size)
+                except (OSError, ValueError) as e:
+                    print(f"Generation table {self.name} is process-local: {e}")
+                    self._local = bytearray(size)
+        return self._map if self._map is not None else self._local
+
+    def _offset(self, key):
+        return (zlib.crc32(str(key).encode('utf-8')) % self.slots) * SLOT_SIZE
+
+    def current(self, key):
+        """Current stamp of the key's slot"""
+        return struct.unpack_from('<Q', self._buffer(), self._offset(key))[0]
+
+    def bump(self, key):
+        """Mark the key as changed for every process on this host"""
+        struct.pack_into('<Q', self._buffer(), self._offset(key), random.getrandbits(64))
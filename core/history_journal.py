@@ -0,0 +1,262 @@
+"""
+HISTORY JOURNAL - Write-behind buffer for tracking_history
+==========================================================
+
+Enabled with HISTORY_DURABILITY=journal (default: sync, history is
+inserted inside the scan's transaction).
+
+Rules:
+1. A committed scan appends its history events to this worker's journal
+   file (one JSON line each); concurrent appends share one fsync
+   (group commit) before the response is sent
+2. A background flusher bulk-inserts journaled events every
+   HISTORY_FLUSH_INTERVAL seconds (or HISTORY_FLUSH_BATCH events), one
+   transaction per batch, through HistoryRecorder.record_many
+3. Every event carries an event_uid; replaying a batch that was already
+   inserted is a no-op, so flush-then-crash never duplicates history
+4. Each worker holds an flock on its own journal. Journals whose owner
+   died are unlocked and get replayed by the next flusher that sees
+   them (worker restart, app startup, `python manage.py
+   replay-history-journal`)
+5. History, barcode lookups and stats lag scans by up to one flush
+   interval
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from core.generations import runtime_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows: journal mode unavailable, history stays synchronous
+    fcntl = None
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'$date': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'$decimal': str(value)}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if '$datetime' in value:
+            return datetime.fromisoformat(value['$datetime'])
+        if '$date' in value:
+            return date.fromisoformat(value['$date'])
+        if '$decimal' in value:
+            return Decimal(value['$decimal'])
+    return value
+
+
+def encode_event(event):
+    return json.dumps({k: _encode(v) for k, v in event.items()}, separators=(',', ':'), default=str).encode('utf-8') + b'\n'
+
+
+def decode_events(data):
+    """Returns: list of event dicts for every complete, well-formed line"""
+    events = []
+    for line in data.splitlines():
+        try:
+            events.append({k: _decode(v) for k, v in json.loads(line).items()})
+        except ValueError:
+            print(f"Skipping corrupt history journal line: {line[:80]!r}")
+    return events
+
+
+class HistoryJournal:
+    """Per-worker append-only journal plus its background flusher"""
+
+    def __init__(self, db, writer, name='history_journal', batch_size=500, flush_interval=1.0,
+                 recover_interval=30.0):
+        """
+        Args:
+            db: Database instance
+            writer: callable(cursor, events) inserting events idempotently
+        """
+        self.db = db
+        self.writer = writer
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.recover_interval = recover_interval
+        self.available = fcntl is not None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._fd = None
+        self._path = None
+        self._written = 0
+        self._synced = 0
+        self._flushed_offset = 0
+        self._metrics = {'appended': 0, 'flushed': 0, 'replayed': 0, 'flush_failures': 0, 'fsyncs': 0}
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+
+    def _dir(self):
+        path = os.path.join(runtime_dir(), self.name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def start(self):
+        """Open this worker's journal and start the flusher (idempotent, fork-aware)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # A journal inherited across fork belongs to the parent
+            if self._fd is not None:
+                os.close(self._fd)
+            self._path = os.path.join(self._dir(), f'{os.getpid()}.jsonl')
+            self._fd = os.open(self._path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            self._written = self._synced = 0
+            self._flushed_offset = 0
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name='history-flusher', daemon=True).start()
+        atexit.register(self.flush)
+
+    # ------------------------------------------------------------------
+    # Append
+    # ------------------------------------------------------------------
+
+    def append(self, events):
+        """
+        Durably journal committed history events
+
+        Falls back to inserting them directly if the journal cannot be
+        written, so a committed scan never loses its history.
+        """
+        data = b''.join(encode_event(event) for event in events)
+        try:
+            self.start()
+            with self._lock:
+                os.write(self._fd, data)
+                self._written += 1
+                sequence = self._written
+                fd = self._fd
+            self._sync(fd, sequence)
+        except OSError as e:
+            print(f"History journal write failed, inserting directly: {e}")
+            with self.db.transaction() as (cursor, connection):
+                self.writer(cursor, events)
+            return
+        self._metrics['appended'] += len(events)
+        if self._metrics['appended'] - self._metrics['flushed'] >= self.batch_size:
+            self._wake.set()
+
+    def _sync(self, fd, sequence):
+        # Group commit: whoever holds the lock fsyncs every write so far
+        with self._sync_lock:
+            if self._synced >= sequence:
+                return
+            target = self._written
+            os.fsync(fd)
+            self._metrics['fsyncs'] += 1
+            self._synced = target
+
+    # ------------------------------------------------------------------
+    # Flush / replay
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        pid = os.getpid()
+        last_recover = 0.0
+        while self._pid == pid:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                if time.monotonic() - last_recover >= self.recover_interval:
+                    last_recover = time.monotonic()
+                    self.recover()
+                self.flush()
+            except Exception as e:
+                self._metrics['flush_failures'] += 1
+                print(f"History journal flush failed, will retry: {e}")
+
+    def _insert(self, events):
+        for start in range(0, len(events), self.batch_size):
+            with self.db.transaction() as (cursor, connection):
+                self.writer(cursor, events[start:start + self.batch_size])
+
+    def flush(self):
+        """Insert everything journaled by this worker so far"""
+        if self._pid != os.getpid():
+            return 0
+        flushed = 0
+        with self._flush_lock:
+            while True:
+                data = os.pread(self._fd, 1024 * 1024, self._flushed_offset)
+                complete = data[:data.rfind(b'\n') + 1]
+                if not complete:
+                    break
+                events = decode_events(complete)
+                if events:
+                    self._insert(events)
+                self._flushed_offset += len(complete)
+                flushed += len(events)
+                self._metrics['flushed'] += len(events)
+
+            # Fully flushed: start the file over so it never grows unbounded
+            with self._lock:
+                if self._flushed_offset and self._flushed_offset == os.fstat(self._fd).st_size:
+                    os.ftruncate(self._fd, 0)
+                    self._flushed_offset = 0
+        return flushed
+
+    def recover(self):
+        """
+        Replay journals left by dead workers
+
+        Returns:
+            int: events replayed
+        """
+        if not self.available:
+            return 0
+        replayed = 0
+        for entry in sorted(os.listdir(self._dir())):
+            path = os.path.join(self._dir(), entry)
+            if not entry.endswith('.jsonl') or path == self._path:
+                continue
+            try:
+                fd = os.open(path, os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            try:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # owner is alive
+                size = os.fstat(fd).st_size
+                data = os.pread(fd, size, 0) if size else b''
+                events = decode_events(data[:data.rfind(b'\n') + 1])
+                if events:
+                    self._insert(events)
+                os.unlink(path)
+                replayed += len(events)
+            finally:
+                os.close(fd)
+        if replayed:
+            self._metrics['replayed'] += replayed
+            print(f"Replayed {replayed} history events from abandoned journals")
+        return replayed
+
+    def stats(self):
+        pending = 0
+        if self._pid == os.getpid():
+            pending = os.fstat(self._fd).st_size - self._flushed_offset
+        return dict(self._metrics, pending_bytes=pending)
@@ -0,0 +1,166 @@
+"""
+HISTORY PARTITIONS - Monthly RANGE partitions of tracking_history
+=================================================================
+
+Rules:
+1. tracking_history and barcode_events are partitioned by
+   RANGE (UNIX_TIMESTAMP(created_at)): one partition per month, named
+   pYYYYMM, plus pmax for anything beyond the last month
+2. `python manage.py partitions` (run daily) splits pmax so the next
+   HISTORY_PARTITIONS_AHEAD months always exist
+3. With HISTORY_RETENTION_MONTHS > 0 the same job detaches months older
+   than the retention: the history partition is exchanged into a
+   standalone tracking_history_archive_YYYYMM table (dump or drop it at
+   leisure), the barcode_events partition and history_search rows are
+   dropped. history_stats keeps lifetime totals
+4. Read paths bound their queries with history_window() so MySQL only
+   opens the partitions of the requested (or default) date range
+"""
+
+import os
+import re
+from datetime import date, timedelta
+from core.time_engine import TimeEngine
+
+PARTITIONED_TABLES = ('tracking_history', 'barcode_events')
+PARTITION_NAME = re.compile(r'^p(\d{4})(\d{2})$')
+
+# Queries without from/to cover this many recent days
+HISTORY_WINDOW_DAYS = int(os.getenv('HISTORY_WINDOW_DAYS', 90))
+SEARCH_PURGE_BATCH = 5000
+
+
+def history_window(from_utc=None, to_utc=None):
+    """
+    Date bounds for a history read
+
+    Returns the given bounds unchanged if either is set; otherwise the
+    last HISTORY_WINDOW_DAYS days (HISTORY_WINDOW_DAYS=0 disables the
+    default window).
+
+    Returns:
+        tuple: (from_utc, to_utc, defaulted)
+    """
+    if from_utc or to_utc or HISTORY_WINDOW_DAYS <= 0:
+        return from_utc, to_utc, False
+    return TimeEngine.get_db_timestamp() - timedelta(days=HISTORY_WINDOW_DAYS), None, True
+
+
+def add_months(month, count):
+    """First day of the month `count` months after `month`"""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'p{month:%Y%m}'
+
+
+def partition_month(name):
+    """Month a pYYYYMM partition holds, or None for pmax / other names"""
+    match = PARTITION_NAME.match(name or '')
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def partition_definition(month):
+    return (f"PARTITION {partition_name(month)} VALUES LESS THAN "
+            f"(UNIX_TIMESTAMP('{add_months(month, 1):%Y-%m-%d}'))")
+
+
+class HistoryPartitions:
+    """Maintenance for the monthly history partitions"""
+
+    @staticmethod
+    def list(db, table):
+        """
+        Returns:
+            list: {name, month, rows} per partition, in range order;
+                  empty if the table is not partitioned
+        """
+        rows = db.fetch_all(
+            """SELECT PARTITION_NAME as name, TABLE_ROWS as table_rows
+            FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION""",
+            (table,)
+        )
+        return [
+            {'name': row['name'], 'month': partition_month(row['name']), 'rows': int(row['table_rows'] or 0)}
+            for row in rows
+        ]
+
+    @staticmethod
+    def ensure_future(db, months_ahead=3, today=None):
+        """
+        Split pmax so every month up to `months_ahead` ahead has a partition
+
+        Returns:
+            list: (table, partition name) created
+        """
+        this_month = (today or TimeEngine.get_db_timestamp().date()).replace(day=1)
+        created = []
+        for table in PARTITIONED_TABLES:
+            partitions = HistoryPartitions.list(db, table)
+            months = [p['month'] for p in partitions if p['month']]
+            if not any(p['name'] == 'pmax' for p in partitions):
+                print(f"⚠️ {table} is not partitioned (apply migrations/006_history_partitions.sql)")
+                continue
+
+            # Ranges must increase: new months can only follow the last one
+            month = add_months(max(months), 1) if months else this_month
+            missing = []
+            while month <= add_months(this_month, months_ahead):
+                missing.append(month)
+                month = add_months(month, 1)
+            if not missing:
+                continue
+
+            definitions = ', '.join(partition_definition(m) for m in missing)
+            db.execute_query(
+                f"""ALTER TABLE {table} REORGANIZE PARTITION pmax INTO (
+                {definitions}, PARTITION pmax VALUES LESS THAN MAXVALUE)"""
+            )
+            created.extend((table, partition_name(m)) for m in missing)
+        return created
+
+    @staticmethod
+    def archive(db, retention_months, today=None):
+        """
+        Detach months older than the retention period
+
+        Returns:
+            list: names of the archive tables created
+        """
+        if retention_months <= 0:
+            return []
+        this_month = (today or TimeEngine.get_db_timestamp().date()).replace(day=1)
+        cutoff = add_months(this_month, -retention_months)
+
+        archived = []
+        for partition in HistoryPartitions.list(db, 'tracking_history'):
+            month = partition['month']
+            if not month or month >= cutoff:
+                continue
+            archive_table = f'tracking_history_archive_{month:%Y%m}'
+            db.execute_query(f'CREATE TABLE IF NOT EXISTS {archive_table} LIKE tracking_history')
+            if HistoryPartitions.list(db, archive_table):
+                db.execute_query(f'ALTER TABLE {archive_table} REMOVE PARTITIONING')
+            db.execute_query(
+                f"ALTER TABLE tracking_history EXCHANGE PARTITION {partition['name']} WITH TABLE {archive_table}"
+            )
+            db.execute_query(f"ALTER TABLE tracking_history DROP PARTITION {partition['name']}")
+            archived.append(archive_table)
+
+        # Derived lookups of detached months go with them
+        for partition in HistoryPartitions.list(db, 'barcode_events'):
+            if partition['month'] and partition['month'] < cutoff:
+                db.execute_query(f"ALTER TABLE barcode_events DROP PARTITION {partition['name']}")
+        while True:
+            with db.get_cursor() as (cursor, connection):
+                cursor.execute(
+                    'DELETE FROM history_search WHERE created_at < %s LIMIT %s',
+                    (cutoff, SEARCH_PURGE_BATCH)
+                )
+                if cursor.rowcount < SEARCH_PURGE_BATCH:
+                    break
+        return archived
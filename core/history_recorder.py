@@ -0,0 +1,261 @@
+"""
+HISTORY RECORDER - Single write path for tracking_history
+=========================================================
+
+Rules:
+1. Every history event is written through HistoryRecorder.record
+2. It runs on the caller's cursor, inside the caller's transaction
+3. Derived lookup structures are maintained in that same transaction:
+   - barcode_events: (barcode, role, event_id, created_at), one row per
+     barcode column the event mentions, so a barcode's history is a
+     single primary-key range scan instead of eight OR'd predicates
+   - history_search: the searchable columns under an ngram FULLTEXT
+     index (tracking_history is partitioned and cannot carry one)
+   - history_stats: event counters and duration aggregates (HistoryStats)
+4. Every event gets a random event_uid; inserts through record_many skip
+   uids that already exist, so replays are idempotent
+5. HISTORY_DURABILITY=journal moves the insert out of the transaction:
+   record() journals the event after COMMIT and a background flusher
+   inserts it (see core/history_journal.py)
+6. Events carrying a lot_id store the reference only; their payload
+   fields still feed history_search and live events, but are not copied
+   into tracking_history (view_history reads them from lots)
+"""
+
+import os
+import uuid
+from config.database import db
+from core.history_journal import HistoryJournal
+from core.history_stats import HistoryStats
+from core.lots import LOT_FIELDS
+
+HISTORY_DURABILITY = os.getenv('HISTORY_DURABILITY', 'sync').lower()
+
+# Insertable tracking_history columns, in table order
+HISTORY_FIELDS = (
+    'event_type', 'process_code', 'process_name',
+    'input_trolley', 'output_trolley',
+    'process_input_barcode', 'process_output_barcode',
+    'customer_name', 'lot_number', 'design_name', 'design_number',
+    'grey_width', 'finish_width', 'fabric_quality', 'total_trolley',
+    'meters', 'matching', 'order_receive_date', 'grey_receive_date',
+    'remarks', 'pack_instructions',
+    'trolley_barcode', 'process_barcode', 'from_barcode', 'to_barcode',
+    'process_start_time', 'process_end_time', 'duration_seconds',
+    'status', 'created_by', 'created_at', 'event_uid', 'lot_id',
+)
+
+# tracking_history barcode column -> barcode_events.role
+BARCODE_ROLES = (
+    ('trolley_barcode', 'trolley'),
+    ('process_barcode', 'process'),
+    ('from_barcode', 'from'),
+    ('to_barcode', 'to'),
+    ('input_trolley', 'input_trolley'),
+    ('output_trolley', 'output_trolley'),
+    ('process_input_barcode', 'process_input'),
+    ('process_output_barcode', 'process_output'),
+)
+
+
+# Columns copied to history_search (order of its ft_history_search index)
+SEARCH_COLUMNS = (
+    'customer_name', 'lot_number', 'design_name', 'design_number', 'fabric_quality',
+    'trolley_barcode', 'process_barcode', 'input_trolley', 'output_trolley',
+    'process_code', 'process_name',
+)
+
+
+class HistoryRecorder:
+    """
+    Writes history events and keeps their lookup structures in sync
+
+    Events are plain dicts keyed by tracking_history column name;
+    columns that are absent fall back to the table defaults.
+    """
+
+    @staticmethod
+    def record(cursor, event):
+        """
+        Insert one history event inside the caller's transaction
+
+        Args:
+            cursor: cursor of an open transaction
+            event: dict of tracking_history column -> value
+
+        Returns:
+            int: new tracking_history id, or None when journaled (the row
+                 is inserted by the flusher shortly after commit)
+        """
+        event = dict(event)
+        event.setdefault('event_uid', uuid.uuid4().hex)
+        if HistoryRecorder.journaled():
+            db.after_commit(lambda: history_journal.append([event]))
+            return None
+
+        columns = HistoryRecorder.columns(event)
+        cursor.execute(
+            f"""INSERT INTO tracking_history ({', '.join(columns)})
+            VALUES ({', '.join(['%s'] * len(columns))})""",
+            tuple(event[column] for column in columns)
+        )
+        event_id = cursor.lastrowid
+        HistoryRecorder.index_barcodes(cursor, [(event_id, event)])
+        HistoryRecorder.index_search(cursor, [(event_id, event)])
+        HistoryStats.record(cursor, [event])
+        return event_id
+
+    @staticmethod
+    def record_many(cursor, events):
+        """
+        Insert many history events inside the caller's transaction
+
+        Events whose event_uid is already in tracking_history are skipped
+        (journal replay). Events with the same columns go in one
+        multi-row INSERT.
+
+        Args:
+            cursor: cursor of an open transaction
+            events: list of dicts of tracking_history column -> value
+
+        Returns:
+            list: tracking_history id of each event, in order
+        """
+        events = [dict(event, event_uid=event.get('event_uid') or uuid.uuid4().hex) for event in events]
+        if not events:
+            return []
+
+        ids = HistoryRecorder._ids_by_uid(cursor, [event['event_uid'] for event in events])
+        new_events = [event for event in events if event['event_uid'] not in ids]
+
+        groups = {}
+        for event in new_events:
+            columns = tuple(HistoryRecorder.columns(event))
+            groups.setdefault(columns, []).append(event)
+        for columns, group in groups.items():
+            cursor.executemany(
+                f"""INSERT INTO tracking_history ({', '.join(columns)})
+                VALUES ({', '.join(['%s'] * len(columns))})""",
+                [tuple(event[column] for column in columns) for event in group]
+            )
+
+        if new_events:
+            ids.update(HistoryRecorder._ids_by_uid(cursor, [event['event_uid'] for event in new_events]))
+            indexed = [(ids[event['event_uid']], event) for event in new_events]
+            HistoryRecorder.index_barcodes(cursor, indexed)
+            HistoryRecorder.index_search(cursor, indexed)
+            HistoryStats.record(cursor, new_events)
+        return [ids.get(event['event_uid']) for event in events]
+
+    @staticmethod
+    def columns(event):
+        """tracking_history columns written for an event, in table order"""
+        if event.get('lot_id') is not None:
+            return [field for field in HISTORY_FIELDS if field in event and field not in LOT_FIELDS]
+        return [field for field in HISTORY_FIELDS if field in event]
+
+    @staticmethod
+    def _ids_by_uid(cursor, uids):
+        cursor.execute(
+            f"SELECT id, event_uid FROM tracking_history WHERE event_uid IN ({', '.join(['%s'] * len(uids))})",
+            tuple(uids)
+        )
+        return {row['event_uid']: row['id'] for row in cursor.fetchall()}
+
+    @staticmethod
+    def journaled():
+        """True when history is written behind through the journal"""
+        return HISTORY_DURABILITY == 'journal' and history_journal.available
+
+    @staticmethod
+    def index_barcodes(cursor, events):
+        """
+        Add barcode_events rows for already-inserted history events
+
+        Args:
+            cursor: cursor of an open transaction
+            events: list of (event_id, event dict)
+        """
+        rows = []
+        for event_id, event in events:
+            for column, role in BARCODE_ROLES:
+                barcode = event.get(column)
+                if barcode:
+                    rows.append((barcode, role, event_id, event['created_at']))
+        if rows:
+            cursor.executemany(
+                """INSERT INTO barcode_events (barcode, role, event_id, created_at)
+                VALUES (%s, %s, %s, %s)""",
+                rows
+            )
+
+    @staticmethod
+    def index_search(cursor, events):
+        """
+        Add history_search rows for already-inserted history events
+
+        Args:
+            cursor: cursor of an open transaction
+            events: list of (event_id, event dict)
+        """
+        if events:
+            cursor.executemany(
+                f"""INSERT INTO history_search (event_id, created_at, {', '.join(SEARCH_COLUMNS)})
+                VALUES ({', '.join(['%s'] * (len(SEARCH_COLUMNS) + 2))})""",
+                [
+                    (event_id, event['created_at']) + tuple(event.get(column) for column in SEARCH_COLUMNS)
+                    for event_id, event in events
+                ]
+            )
+
+    @staticmethod
+    def backfill_barcode_index(db, batch_size=5000, progress=None):
+        """
+        Build barcode_events for history rows written before the index existed
+
+        Walks tracking_history by primary key in batches, one short
+        transaction per batch. Safe to re-run: existing rows are ignored.
+
+        Args:
+            db: Database instance
+            batch_size: history ids per transaction
+            progress: optional callback(last_id, max_id)
+
+        Returns:
+            int: number of barcode_events rows inserted
+        """
+        bounds = db.fetch_one('SELECT MIN(id) as min_id, MAX(id) as max_id FROM tracking_history')
+        if not bounds or bounds['min_id'] is None:
+            return 0
+
+        selects = ' UNION ALL '.join(
+            f"""SELECT {column}, '{role}', id, created_at FROM tracking_history
+            WHERE id BETWEEN %s AND %s AND {column} IS NOT NULL AND {column} <> ''"""
+            for column, role in BARCODE_ROLES
+        )
+
+        inserted = 0
+        start = bounds['min_id']
+        while start <= bounds['max_id']:
+            end = start + batch_size - 1
+            with db.transaction() as (cursor, connection):
+                cursor.execute(
+                    f"""INSERT IGNORE INTO barcode_events (barcode, role, event_id, created_at)
+                    {selects}""",
+                    (start, end) * len(BARCODE_ROLES)
+                )
+                inserted += cursor.rowcount
+            if progress:
+                progress(min(end, bounds['max_id']), bounds['max_id'])
+            start = end + 1
+        return inserted
+
+
+history_journal = HistoryJournal(
+    db, HistoryRecorder.record_many,
+    batch_size=int(os.getenv('HISTORY_FLUSH_BATCH', 500)),
+    flush_interval=float(os.getenv('HISTORY_FLUSH_INTERVAL', 1))
+)
+
+if HISTORY_DURABILITY == 'journal' and not history_journal.available:
+    print("HISTORY_DURABILITY=journal needs fcntl; writing history synchronously")
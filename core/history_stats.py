@@ -0,0 +1,116 @@
+"""
+HISTORY STATS - Incrementally maintained counters for /api/history/stats
+=======================================================================
+
+Rules:
+1. Counters are updated by HistoryRecorder in the same transaction as
+   the history insert, so they can never drift from committed history
+2. Each event type is spread over STATS_SLOTS rows; writers pick a slot
+   at random so concurrent transfers do not queue on one hot row
+3. Readers sum the slots: a fixed handful of rows, whatever the size of
+   tracking_history
+4. `python manage.py rebuild-stats` recomputes everything from scratch
+"""
+
+import random
+
+STATS_SLOTS = 8
+
+
+class HistoryStats:
+    """Precomputed event counts and duration aggregates"""
+
+    @staticmethod
+    def record(cursor, events):
+        """
+        Add events to the counters inside the caller's transaction
+
+        Args:
+            cursor: cursor of an open transaction
+            events: list of history event dicts
+        """
+        totals = {}
+        for event in events:
+            count, duration_count, duration_sum, duration_min, duration_max = totals.get(
+                event['event_type'], (0, 0, 0, None, None)
+            )
+            duration = event.get('duration_seconds')
+            if duration is not None:
+                duration_count += 1
+                duration_sum += duration
+                duration_min = duration if duration_min is None else min(duration_min, duration)
+                duration_max = duration if duration_max is None else max(duration_max, duration)
+            totals[event['event_type']] = (count + 1, duration_count, duration_sum, duration_min, duration_max)
+
+        for event_type, values in totals.items():
+            cursor.execute(
+                """INSERT INTO history_stats
+                (event_type, slot, event_count, duration_count, duration_sum, duration_min, duration_max)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                event_count = event_count + VALUES(event_count),
+                duration_count = duration_count + VALUES(duration_count),
+                duration_sum = duration_sum + VALUES(duration_sum),
+                duration_min = LEAST(COALESCE(duration_min, VALUES(duration_min)),
+                                     COALESCE(VALUES(duration_min), duration_min)),
+                duration_max = GREATEST(COALESCE(duration_max, VALUES(duration_max)),
+                                        COALESCE(VALUES(duration_max), duration_max))""",
+                (event_type, random.randrange(STATS_SLOTS)) + values
+            )
+
+    @staticmethod
+    def read(db):
+        """
+        Current totals, summed over slots
+
+        Returns:
+            dict: total_events, events_by_type (list of {event_type, count}),
+                  duration_count, duration_sum, duration_min, duration_max
+        """
+        rows = db.fetch_all(
+            """SELECT event_type,
+                SUM(event_count) as count,
+                SUM(duration_count) as duration_count,
+                SUM(duration_sum) as duration_sum,
+                MIN(duration_min) as duration_min,
+                MAX(duration_max) as duration_max
+            FROM history_stats
+            GROUP BY event_type"""
+        )
+
+        duration_mins = [row['duration_min'] for row in rows if row['duration_min'] is not None]
+        duration_maxes = [row['duration_max'] for row in rows if row['duration_max'] is not None]
+        return {
+            'total_events': sum(int(row['count']) for row in rows),
+            'events_by_type': [
+                {'event_type': row['event_type'], 'count': int(row['count'])}
+                for row in rows if row['count']
+            ],
+            'duration_count': sum(int(row['duration_count']) for row in rows),
+            'duration_sum': sum(int(row['duration_sum']) for row in rows),
+            'duration_min': min(duration_mins) if duration_mins else None,
+            'duration_max': max(duration_maxes) if duration_maxes else None,
+        }
+
+    @staticmethod
+    def rebuild(db):
+        """
+        Recompute every counter from tracking_history
+
+        Runs as one transaction; writers that touch the counters while
+        it runs wait for it (or are retried as deadlock victims).
+
+        Returns:
+            int: number of event types counted
+        """
+        with db.transaction() as (cursor, connection):
+            cursor.execute('DELETE FROM history_stats')
+            cursor.execute(
+                """INSERT INTO history_stats
+                (event_type, slot, event_count, duration_count, duration_sum, duration_min, duration_max)
+                SELECT event_type, 0, COUNT(*), COUNT(duration_seconds),
+                       COALESCE(SUM(duration_seconds), 0), MIN(duration_seconds), MAX(duration_seconds)
+                FROM tracking_history
+                GROUP BY event_type"""
+            )
+            return cursor.rowcount
@@ -0,0 +1,248 @@
+"""
+LINEAGE - A lot's whole journey across trolleys and stations
+============================================================
+
+Rules:
+1. A transfer moves the lot pointer instead of copying the payload (see
+   core/lots.py), so every history event of one journey carries the same
+   lot_id. tracking_history.idx_lot_id is therefore the hop index: the
+   whole path TR-01 → PR-01 → TR-07 → PR-03 → TR-02 is one indexed
+   lookup, with no per-hop queries and no recursive walk over barcodes
+2. Events are folded in time order into hops:
+   - trolley hop: from arrival on the trolley (attach or process output)
+     until the lot leaves it (process input); open while it is still there
+   - process hop: from process input to process output (duration_seconds)
+3. A journey is complete once no trolley or station holds the lot any
+   more (cleared, or overwritten by a new attach): it can never change
+   again, so each worker caches complete journeys (LINEAGE_CACHE_SIZE,
+   least recently used evicted). Journeys still moving are always read
+4. History written before lots existed (migration 007) has no lot_id
+   and is not linked; /api/history/trolley/<barcode> still lists it
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from core.history_recorder import HistoryRecorder
+from core.time_engine import TimeService
+
+LINEAGE_CACHE_SIZE = int(os.getenv('LINEAGE_CACHE_SIZE', 2048))
+# Write-behind history: the last events of a journey may still be in a journal
+JOURNAL_SETTLE_SECONDS = 300
+
+LINEAGE_EVENT_COLUMNS = """
+    id, lot_id, event_type, process_code, process_name,
+    trolley_barcode, input_trolley, output_trolley,
+    process_input_barcode, process_output_barcode,
+    process_start_time, process_end_time, duration_seconds, created_at"""
+
+
+def _seconds(start, end):
+    if start is None or end is None:
+        return None
+    return TimeService.calculate_duration(start, end)
+
+
+def build_journey(lot, events):
+    """
+    Fold one lot's events (oldest first) into its ordered hops
+
+    Args:
+        lot: lots row (id, lot_number, customer_name, design_name, created_at)
+        events: view_history rows of that lot
+
+    Returns:
+        dict: lot fields, hops, started/ended timestamps and total seconds
+    """
+    hops = []
+    current_trolley = None
+    open_processes = {}
+
+    for event in events:
+        event_type = event['event_type']
+        at = event['created_at']
+
+        if event_type == 'process_input':
+            if current_trolley is not None:
+                current_trolley.update(leftAt=at, seconds=_seconds(current_trolley['arrivedAt'], at))
+                current_trolley = None
+            hop = {
+                'type': 'process',
+                'processCode': event['process_code'],
+                'processName': event['process_name'],
+                'inputBarcode': event['process_input_barcode'],
+                'outputBarcode': event['process_output_barcode'],
+                'fromTrolley': event['input_trolley'],
+                'startedAt': event['process_start_time'] or at,
+                'endedAt': None,
+                'seconds': None,
+                'historyIds': [event['id']],
+            }
+            hops.append(hop)
+            open_processes[event['process_code']] = hop
+            continue
+
+        if event_type == 'process_output':
+            hop = open_processes.pop(event['process_code'], None)
+            if hop is None:
+                # Input event missing (before the window or archived): start from the output's record
+                hop = {
+                    'type': 'process',
+                    'processCode': event['process_code'],
+                    'processName': event['process_name'],
+                    'inputBarcode': event['process_input_barcode'],
+                    'outputBarcode': event['process_output_barcode'],
+                    'fromTrolley': event['input_trolley'],
+                    'startedAt': event['process_start_time'],
+                    'historyIds': [],
+                }
+                hops.append(hop)
+            hop.update(
+                outputBarcode=event['process_output_barcode'] or hop['outputBarcode'],
+                endedAt=event['process_end_time'] or at,
+                seconds=event['duration_seconds'],
+            )
+            hop['historyIds'].append(event['id'])
+            arrived_on = event['output_trolley'] or event['trolley_barcode']
+        elif event_type == 'trolley_attached':
+            arrived_on = event['trolley_barcode'] or event['input_trolley']
+        else:
+            continue
+
+        if current_trolley is not None:
+            current_trolley.update(leftAt=at, seconds=_seconds(current_trolley['arrivedAt'], at))
+        current_trolley = {
+            'type': 'trolley',
+            'barcode': arrived_on,
+            'via': event_type,
+            'arrivedAt': at,
+            'leftAt': None,
+            'seconds': None,
+            'historyIds': [event['id']],
+        }
+        hops.append(current_trolley)
+
+    started_at = events[0]['created_at'] if events else lot['created_at']
+    ended_at = events[-1]['created_at'] if events else None
+    return {
+        'lotId': lot['id'],
+        'lotNumber': lot['lot_number'],
+        'customerName': lot['customer_name'],
+        'designName': lot['design_name'],
+        'startedAt': started_at,
+        'lastEventAt': ended_at,
+        'totalSeconds': _seconds(started_at, ended_at),
+        'hopCount': len(hops),
+        'path': [hop.get('barcode') or hop.get('processCode') for hop in hops],
+        'hops': hops,
+    }
+
+
+class LineageCache:
+    """Complete journeys by lot id, per worker (LRU)"""
+
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, lot_ids):
+        found = {}
+        with self._lock:
+            for lot_id in lot_ids:
+                journey = self._items.get(lot_id)
+                if journey is not None:
+                    self._items.move_to_end(lot_id)
+                    found[lot_id] = journey
+        return found
+
+    def put(self, lot_id, journey):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._items[lot_id] = journey
+            self._items.move_to_end(lot_id)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+class Lineage:
+    """Journeys of the lots a trolley has carried"""
+
+    cache = LineageCache(LINEAGE_CACHE_SIZE)
+
+    @staticmethod
+    def lots_of_trolley(db, barcode, clauses, params, limit):
+        """
+        Lot ids the trolley carried, most recent journey first
+
+        Args:
+            clauses, params: created_at window on barcode_events
+            limit: journeys to return
+        """
+        rows = db.fetch_all(
+            f"""SELECT h.lot_id, MAX(be.created_at) as last_seen
+            FROM barcode_events be
+            JOIN tracking_history h ON h.id = be.event_id AND h.created_at = be.created_at
+            WHERE {' AND '.join(["be.barcode = %s AND be.role IN ('trolley', 'input_trolley', 'output_trolley')"]
+                                + [f'be.{clause}' for clause in clauses])}
+            AND h.lot_id IS NOT NULL
+            GROUP BY h.lot_id
+            ORDER BY last_seen DESC, h.lot_id DESC
+            LIMIT %s""",
+            tuple([barcode] + params + [limit]), prepared=True
+        )
+        return [row['lot_id'] for row in rows]
+
+    @classmethod
+    def journeys(cls, db, lot_ids):
+        """
+        Journeys of the given lots, in the same order
+
+        Complete journeys come from the cache when possible; the rest
+        cost three queries in total, whatever the number of lots or hops.
+
+        Returns:
+            list of dicts (see build_journey) with a `complete` flag
+        """
+        cached = cls.cache.get_many(lot_ids)
+        missing = [lot_id for lot_id in lot_ids if lot_id not in cached]
+        if missing:
+            placeholders = ', '.join(['%s'] * len(missing))
+            lots = {
+                row['id']: row for row in db.fetch_all(
+                    f"""SELECT id, lot_number, customer_name, design_name, created_at
+                    FROM lots WHERE id IN ({placeholders})""",
+                    tuple(missing)
+                )
+            }
+            held = {
+                row['lot_id'] for row in db.fetch_all(
+                    f"""SELECT lot_id FROM trolley_barcodes WHERE lot_id IN ({placeholders})
+                    UNION
+                    SELECT lot_id FROM process_barcodes WHERE lot_id IN ({placeholders})""",
+                    tuple(missing) * 2
+                )
+            }
+            # A lot's events are never older than the lot: lets MySQL prune history partitions
+            oldest = min((lot['created_at'] for lot in lots.values()), default=None)
+            events = {}
+            if lots:
+                for event in db.fetch_all(
+                        f"""SELECT {LINEAGE_EVENT_COLUMNS} FROM view_history
+                        WHERE lot_id IN ({', '.join(['%s'] * len(lots))}) AND created_at >= %s
+                        ORDER BY lot_id, created_at, id""",
+                        tuple(lots) + (oldest,)):
+                    events.setdefault(event['lot_id'], []).append(event)
+
+            now = TimeService.get_db_timestamp()
+            for lot_id, lot in lots.items():
+                journey = build_journey(lot, events.get(lot_id, []))
+                journey['complete'] = lot_id not in held
+                if journey['complete'] and HistoryRecorder.journaled():
+                    last = journey['lastEventAt'] or lot['created_at']
+                    journey['complete'] = (_seconds(last, now) or 0) > JOURNAL_SETTLE_SECONDS
+                if journey['complete']:
+                    cls.cache.put(lot_id, journey)
+                cached[lot_id] = journey
+        return [cached[lot_id] for lot_id in lot_ids if lot_id in cached]
@@ -0,0 +1,55 @@
+"""
+LOTS - The order payload, stored once
+=====================================
+
+Rules:
+1. A lot row holds the 14 payload fields of an attached order. It is
+   written once, when data is attached to a trolley, and never updated
+2. trolley_barcodes, process_barcodes and tracking_history point at it
+   through lot_id; a transfer moves that pointer instead of copying the
+   payload between rows
+3. Readers keep seeing the flat rows they always did through the
+   compatibility views:
+   - view_trolleys: trolley_barcodes + its lot's fields
+   - view_processes: process_barcodes + its lot's fields
+   - view_history: tracking_history + its lot's fields; history written
+     before lots existed keeps its inline copy and is shown from that
+4. Lots are never deleted: history keeps referencing them
+"""
+
+# Payload columns, in lots table order
+LOT_FIELDS = (
+    'customer_name', 'lot_number', 'design_name', 'design_number',
+    'grey_width', 'finish_width', 'fabric_quality', 'total_trolley',
+    'meters', 'matching', 'order_receive_date', 'grey_receive_date',
+    'remarks', 'pack_instructions',
+)
+
+
+class Lots:
+    """Creates lots and reads their payload back off view rows"""
+
+    @staticmethod
+    def create(cursor, payload, created_at):
+        """
+        Insert a lot inside the caller's transaction
+
+        Args:
+            cursor: cursor of an open transaction
+            payload: dict with (some of) LOT_FIELDS; missing fields are NULL
+            created_at: TimeService timestamp
+
+        Returns:
+            int: new lot id
+        """
+        cursor.execute(
+            f"""INSERT INTO lots ({', '.join(LOT_FIELDS)}, created_at)
+            VALUES ({', '.join(['%s'] * (len(LOT_FIELDS) + 1))})""",
+            tuple(payload.get(field) for field in LOT_FIELDS) + (created_at,)
+        )
+        return cursor.lastrowid
+
+    @staticmethod
+    def payload(row):
+        """The payload fields of a view_trolleys / view_processes row"""
+        return {field: row.get(field) for field in LOT_FIELDS}
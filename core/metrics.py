@@ -0,0 +1,343 @@
+"""
+METRICS - Per-request DB timings exported in Prometheus text format
+==================================================================
+
+Rules:
+1. Every request gets a RequestStats on its thread (begin_request);
+   Database.get_cursor and the JSON provider add to it: connection
+   checkout time, statements, statement time, rows returned and
+   serialization time. Threads started with bind() (fan-out lookups)
+   add to the same request
+2. finish_request() turns the totals into one observation per histogram,
+   labelled by blueprint and route (the URL rule, not the raw path), so
+   the scan path pays a few perf_counter() calls and one locked dict
+   update per request
+3. Statements outside a request (flusher, manage.py) are observed under
+   blueprint="-", route="background"
+4. Each worker writes its histograms to runtime_dir()/metrics/<pid>.json
+   every METRICS_SNAPSHOT_INTERVAL seconds and at exit; /metrics sums
+   the snapshots of all workers on the host. Snapshots of dead workers
+   are folded into retired.json so counters never go backwards
+5. METRICS_ENABLED=false turns all of it off
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from core.generations import runtime_dir
+
+try:
+    import fcntl
+except ImportError:  # Windows: dead worker snapshots are left in place
+    fcntl = None
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 100000)
+
+# name -> (help, buckets, label names)
+HISTOGRAMS = {
+    'trolley_http_request_duration_seconds': (
+        'Time from request start until the response body was sent',
+        SECONDS_BUCKETS, ('blueprint', 'route', 'method', 'status')),
+    'trolley_db_connect_seconds': (
+        'Time spent checking out pooled connections (waiting and connecting), per request',
+        SECONDS_BUCKETS, ('blueprint', 'route')),
+    'trolley_db_queries': (
+        'Statements executed per request',
+        COUNT_BUCKETS, ('blueprint', 'route')),
+    'trolley_db_query_seconds': (
+        'Time spent executing statements, per request',
+        SECONDS_BUCKETS, ('blueprint', 'route')),
+    'trolley_db_rows': (
+        'Rows returned by statements, per request',
+        ROW_BUCKETS, ('blueprint', 'route')),
+    'trolley_serialization_seconds': (
+        'Time spent encoding JSON responses, per request',
+        SECONDS_BUCKETS, ('blueprint', 'route')),
+}
+
+BACKGROUND_LABELS = ('-', 'background')
+
+
+class RequestStats:
+    """Totals of one request (or one background unit of work)"""
+
+    __slots__ = ('connect_seconds', 'queries', 'query_seconds', 'rows', 'serialize_seconds', 'errors', '_lock')
+
+    def __init__(self):
+        self.connect_seconds = 0.0
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.rows = 0
+        self.serialize_seconds = 0.0
+        self.errors = 0
+        # Fan-out threads add to the same request concurrently
+        self._lock = threading.Lock()
+
+    def add_query(self, seconds, rows, failed=False):
+        with self._lock:
+            self.queries += 1
+            self.query_seconds += seconds
+            self.rows += rows
+            if failed:
+                self.errors += 1
+
+    def add_connect(self, seconds):
+        with self._lock:
+            self.connect_seconds += seconds
+
+    def add_serialize(self, seconds):
+        with self._lock:
+            self.serialize_seconds += seconds
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Metrics:
+    """Process-local histogram registry plus the host-wide snapshot files"""
+
+    def __init__(self, name='metrics', snapshot_interval=5.0, enabled=True):
+        self.name = name
+        self.snapshot_interval = snapshot_interval
+        self.enabled = enabled
+        self._series = {}  # (metric, label values) -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pid = None
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    def current(self):
+        """RequestStats of the request running on this thread, or None"""
+        return getattr(self._local, 'stats', None)
+
+    def begin_request(self):
+        if not self.enabled:
+            return None
+        stats = self._local.stats = RequestStats()
+        self._local.started = time.perf_counter()
+        return stats
+
+    def finish_request(self, blueprint, route, method, status):
+        """Observe the request's totals; no-op if begin_request was not called"""
+        stats = self.current()
+        if stats is None:
+            return
+        elapsed = time.perf_counter() - self._local.started
+        self._local.stats = None
+        labels = (blueprint or 'app', route)
+        with self._lock:
+            self._observe('trolley_http_request_duration_seconds', labels + (method, str(status)), elapsed)
+            self._observe('trolley_db_connect_seconds', labels, stats.connect_seconds)
+            self._observe('trolley_db_queries', labels, stats.queries)
+            self._observe('trolley_db_query_seconds', labels, stats.query_seconds)
+            self._observe('trolley_db_rows', labels, stats.rows)
+            self._observe('trolley_serialization_seconds', labels, stats.serialize_seconds)
+
+    def observe_query(self, seconds, rows, failed=False):
+        """One statement finished (called by the database layer)"""
+        stats = self.current()
+        if stats is not None:
+            stats.add_query(seconds, rows, failed)
+        elif self.enabled:
+            with self._lock:
+                self._observe('trolley_db_queries', BACKGROUND_LABELS, 1)
+                self._observe('trolley_db_query_seconds', BACKGROUND_LABELS, seconds)
+                self._observe('trolley_db_rows', BACKGROUND_LABELS, rows)
+
+    def observe_connect(self, seconds):
+        stats = self.current()
+        if stats is not None:
+            stats.add_connect(seconds)
+
+    def observe_serialize(self, seconds):
+        stats = self.current()
+        if stats is not None:
+            stats.add_serialize(seconds)
+
+    def bind(self, task):
+        """Wrap task so that it records into the calling thread's request"""
+        stats = self.current()
+        if stats is None:
+            return task
+
+        def bound():
+            previous = self.current()
+            self._local.stats = stats
+            try:
+                return task()
+            finally:
+                self._local.stats = previous
+        return bound
+
+    def _observe(self, metric, labels, value):
+        buckets = HISTOGRAMS[metric][1]
+        series = self._series.get((metric, labels))
+        if series is None:
+            series = self._series[(metric, labels)] = [0] * (len(buckets) + 3)
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                series[index] += 1
+                break
+        else:
+            series[len(buckets)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    # ------------------------------------------------------------------
+    # Snapshots (cross-worker)
+    # ------------------------------------------------------------------
+
+    def _dir(self):
+        path = os.path.join(runtime_dir(), self.name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def snapshot(self):
+        """This process's series as JSON-safe rows"""
+        with self._lock:
+            return [[metric, list(labels), list(series)] for (metric, labels), series in self._series.items()]
+
+    def write_snapshot(self):
+        if not self.enabled:
+            return
+        path = os.path.join(self._dir(), f'{os.getpid()}.json')
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as handle:
+            json.dump({'pid': os.getpid(), 'written_at': time.time(), 'series': self.snapshot()}, handle)
+        os.replace(temporary, path)
+
+    def start(self):
+        """Start this worker's snapshot writer (idempotent, fork-aware)"""
+        if not self.enabled or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        # Series inherited from the master belong to the master
+        with self._lock:
+            self._series = {}
+        threading.Thread(target=self._run, name='metrics-snapshot', daemon=True).start()
+        atexit.register(self._write_quietly)
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.snapshot_interval)
+            self._write_quietly()
+
+    def _write_quietly(self):
+        try:
+            self.write_snapshot()
+        except OSError as e:
+            print(f"Metrics snapshot failed: {e}")
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass
+        return True
+
+    @staticmethod
+    def _merge(total, rows):
+        for metric, labels, series in rows:
+            if metric not in HISTOGRAMS:
+                continue
+            key = (metric, tuple(labels))
+            current = total.get(key)
+            if current is None or len(current) != len(series):
+                total[key] = list(series)
+            else:
+                for index, value in enumerate(series):
+                    current[index] += value
+
+    def _retire_dead(self, directory):
+        """Fold snapshots of exited workers into retired.json"""
+        if fcntl is None:
+            return
+        with open(os.path.join(directory, 'retired.lock'), 'a+') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            dead = []
+            for entry in os.listdir(directory):
+                pid = entry[:-len('.json')]
+                if entry.endswith('.json') and pid.isdigit() and not self._alive(int(pid)):
+                    dead.append(os.path.join(directory, entry))
+            if not dead:
+                return
+            retired_path = os.path.join(directory, 'retired.json')
+            retired = {}
+            if os.path.exists(retired_path):
+                with open(retired_path, encoding='utf-8') as handle:
+                    self._merge(retired, json.load(handle)['series'])
+            for path in dead:
+                try:
+                    with open(path, encoding='utf-8') as handle:
+                        self._merge(retired, json.load(handle)['series'])
+                except (OSError, ValueError) as e:
+                    print(f"Skipping unreadable metrics snapshot {path}: {e}")
+            temporary = f'{retired_path}.tmp'
+            with open(temporary, 'w', encoding='utf-8') as handle:
+                json.dump({'series': [[m, list(l), s] for (m, l), s in retired.items()]}, handle)
+            os.replace(temporary, retired_path)
+            for path in dead:
+                os.unlink(path)
+
+    def collect(self):
+        """
+        Histograms of every worker on this host, summed
+
+        Returns:
+            dict: (metric, label values) -> [bucket counts..., sum, count]
+        """
+        total = {}
+        self._merge(total, self.snapshot())
+        directory = self._dir()
+        try:
+            self._retire_dead(directory)
+        except (OSError, ValueError) as e:
+            print(f"Retiring metrics snapshots failed: {e}")
+        for entry in os.listdir(directory):
+            if not entry.endswith('.json') or entry == f'{os.getpid()}.json':
+                continue
+            try:
+                with open(os.path.join(directory, entry), encoding='utf-8') as handle:
+                    self._merge(total, json.load(handle)['series'])
+            except (OSError, ValueError):
+                continue  # being replaced or retired right now
+        return total
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        series = self.collect()
+        lines = []
+        for metric, (help_text, buckets, label_names) in HISTOGRAMS.items():
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} histogram')
+            for (name, labels), values in sorted(series.items()):
+                if name != metric:
+                    continue
+                label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in zip(label_names, labels))
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], values[:len(buckets) + 1]):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{{label_text}}} {values[-2]}')
+                lines.append(f'{metric}_count{{{label_text}}} {values[-1]}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics(
+    snapshot_interval=float(os.getenv('METRICS_SNAPSHOT_INTERVAL', 5)),
+    enabled=METRICS_ENABLED
+)
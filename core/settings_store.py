@@ -0,0 +1,159 @@
+"""
+SETTINGS STORE - Versioned in-process cache of the settings table
+=================================================================
+
+Rules:
+1. Reads never touch the database on the request path: accessors serve
+   a per-worker snapshot
+2. Writes are one multi-row upsert plus a bump of settings_version, in
+   one transaction
+3. Workers reload when the version changes:
+   - same host: immediately, via a GenerationTable stamp
+   - other hosts: within SETTINGS_REFRESH_INTERVAL seconds (one
+     primary-key read of settings_version per interval per worker)
+4. If the database is unreachable the last snapshot (or DEFAULTS) is used
+"""
+
+import os
+import threading
+import time
+from config.database import db
+from core.generations import GenerationTable
+
+# Values assumed when a key is missing from the table
+DEFAULTS = {
+    'company_name': 'TFT Industries',
+    'timezone': 'Asia/Karachi',
+    'timezone_offset': '+05:00',
+    'maintenance_mode': 'false',
+    'auto_mirror_enabled': 'true',
+}
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+MAINTENANCE_RESULT = {
+    'success': False,
+    'message': 'System is in maintenance mode. Scanning is paused.',
+    'error_type': 'MAINTENANCE_MODE'
+}
+
+
+class SettingsStore:
+    """Typed, cached access to application settings"""
+
+    GENERATION_KEY = 'settings'
+
+    def __init__(self, db, refresh_interval=5.0, generations=None):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        self.generations = generations or GenerationTable('settings', slots=1)
+        self._values = None
+        self._version = None
+        self._stamp = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Snapshot maintenance
+    # ------------------------------------------------------------------
+
+    def _snapshot(self):
+        stamp = self.generations.current(self.GENERATION_KEY)
+        if (self._values is None or stamp != self._stamp
+                or time.monotonic() - self._checked_at >= self.refresh_interval):
+            self._refresh(stamp)
+        return self._values if self._values is not None else DEFAULTS
+
+    def _refresh(self, stamp, force=False):
+        with self._lock:
+            # Another thread may have refreshed while we waited
+            if (not force and self._values is not None and stamp == self._stamp
+                    and time.monotonic() - self._checked_at < self.refresh_interval):
+                return
+            try:
+                row = self.db.fetch_one('SELECT version FROM settings_version WHERE id = 1')
+                version = row['version'] if row else 0
+                if force or self._values is None or version != self._version:
+                    rows = self.db.fetch_all('SELECT setting_key, setting_value FROM settings')
+                    values = dict(DEFAULTS)
+                    values.update({r['setting_key']: r['setting_value'] for r in rows})
+                    self._values = values
+                    self._version = version
+            except Exception as e:
+                print(f"Settings refresh failed, using cached values: {e}")
+            self._stamp = stamp
+            self._checked_at = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Typed accessors
+    # ------------------------------------------------------------------
+
+    def all(self):
+        """Copy of every setting as strings"""
+        return dict(self._snapshot())
+
+    def get(self, key, default=None):
+        value = self._snapshot().get(key)
+        return default if value is None else value
+
+    def get_bool(self, key, default=False):
+        value = self.get(key)
+        if value is None:
+            return default
+        return str(value).strip().lower() in TRUE_VALUES
+
+    def get_int(self, key, default=0):
+        try:
+            return int(self.get(key))
+        except (TypeError, ValueError):
+            return default
+
+    def get_float(self, key, default=0.0):
+        try:
+            return float(self.get(key))
+        except (TypeError, ValueError):
+            return default
+
+    def maintenance_mode(self):
+        return self.get_bool('maintenance_mode', False)
+
+    def auto_mirror_enabled(self):
+        return self.get_bool('auto_mirror_enabled', True)
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def update(self, values):
+        """
+        Upsert many settings in one statement and publish a new version
+
+        Args:
+            values: dict of setting_key -> value (booleans stored as 'true'/'false')
+        """
+        rows = []
+        for key, value in values.items():
+            if isinstance(value, bool):
+                value = 'true' if value else 'false'
+            rows.append((key, None if value is None else str(value)))
+        if not rows:
+            return
+
+        with self.db.transaction() as (cursor, connection):
+            cursor.executemany(
+                """INSERT INTO settings (setting_key, setting_value) VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE setting_value = VALUES(setting_value)""",
+                rows
+            )
+            cursor.execute(
+                """INSERT INTO settings_version (id, version) VALUES (1, 1)
+                ON DUPLICATE KEY UPDATE version = version + 1"""
+            )
+            self.db.after_commit(self._published)
+
+    def _published(self):
+        self.generations.bump(self.GENERATION_KEY)
+        self._refresh(self.generations.current(self.GENERATION_KEY), force=True)
+
+
+settings_store = SettingsStore(db, refresh_interval=float(os.getenv('SETTINGS_REFRESH_INTERVAL', 5)))
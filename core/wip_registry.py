@@ -0,0 +1,242 @@
+"""
+WIP REGISTRY - Running stations served from memory
+==================================================
+
+Rules:
+1. Each worker keeps the IN_PROCESS stations (view_processes rows) in a
+   dict keyed by barcode. It is loaded when the worker starts, so
+   "what is running now" and the active count are memory reads
+2. WorkflowEngine commits update it at once in the committing worker.
+   Every worker follows the event bus (station.started / finished) and
+   re-reads the barcodes those events name, so transfers handled by
+   other workers on the host arrive within EVENT_POLL_INTERVAL. The
+   re-read, not the event payload, decides the state: late or
+   reordered events cannot leave a stale entry
+3. Every WIP_CHECK_INTERVAL seconds (and when the event bus asks for a
+   resync) the whole registry is compared with process_barcodes. The
+   table wins; the differences are counted as drift (writes from other
+   hosts, manual SQL, missed events)
+4. Elapsed time is TimeService.calculate_duration from the process
+   start at read time; a station running longer than WIP_STUCK_SECONDS
+   (or the caller's threshold) is reported as stuck
+"""
+
+import os
+import threading
+import time
+from config.database import db
+from core.event_bus import event_bus
+from core.time_engine import TimeEngine, TimeService
+
+STATION_EVENTS = {
+    'station.started': ('station', 'mirror'),
+    'station.finished': ('station', 'paired_input'),
+}
+
+WIP_COLUMNS = """barcode, process_type, process_name, paired_barcode, source_trolley_barcode,
+    lot_id, lot_number, customer_name, design_name, process_start_time"""
+
+
+def _same_start(first, second):
+    # MySQL keeps whole seconds; a registered start may carry microseconds
+    first, second = TimeEngine.parse_datetime(first), TimeEngine.parse_datetime(second)
+    if first is None or second is None:
+        return first is second
+    return abs((first - second).total_seconds()) < 1
+
+
+def format_elapsed(seconds):
+    if seconds is None:
+        return '-'
+    return f'{seconds // 3600}h {(seconds % 3600) // 60}m {seconds % 60}s'
+
+
+class WipRegistry:
+    """IN_PROCESS stations of this worker's view of the floor"""
+
+    def __init__(self, db, check_interval=60.0, stuck_seconds=4 * 3600):
+        self.db = db
+        self.check_interval = check_interval
+        self.stuck_seconds = stuck_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._pid = None
+        self.drift = 0
+        self.checks = 0
+        self.last_check_at = None
+
+    # ------------------------------------------------------------------
+    # Loading and checking
+    # ------------------------------------------------------------------
+
+    def _read(self, barcodes=None):
+        if barcodes is None:
+            rows = self.db.fetch_all(
+                f"SELECT {WIP_COLUMNS} FROM view_processes WHERE state = 'IN_PROCESS'"
+            )
+        else:
+            rows = self.db.fetch_all(
+                f"""SELECT {WIP_COLUMNS} FROM view_processes
+                WHERE state = 'IN_PROCESS' AND barcode IN ({', '.join(['%s'] * len(barcodes))})""",
+                tuple(barcodes)
+            )
+        return {row['barcode']: row for row in rows}
+
+    def check(self):
+        """
+        Reload from process_barcodes and count what the registry had wrong
+
+        Returns:
+            int: barcodes added, removed or changed by the reload
+        """
+        fresh = self._read()
+        with self._lock:
+            if self._loaded:
+                changed = set(fresh) ^ set(self._entries)
+                changed |= {
+                    barcode for barcode in set(fresh) & set(self._entries)
+                    if not _same_start(fresh[barcode]['process_start_time'], self._entries[barcode]['process_start_time'])
+                }
+            else:
+                changed = set()
+            self._entries = fresh
+            self._loaded = True
+            self.drift += len(changed)
+            self.checks += 1
+            self.last_check_at = TimeService.get_db_timestamp()
+        if changed:
+            print(f"WIP registry drift in worker {os.getpid()}: {', '.join(sorted(changed)[:10])}")
+        return len(changed)
+
+    def reload(self, barcodes):
+        """Re-read some stations: IN_PROCESS ones are (re)registered, others dropped"""
+        barcodes = sorted(set(filter(None, barcodes)))
+        if not barcodes:
+            return
+        fresh = self._read(barcodes)
+        with self._lock:
+            for barcode in barcodes:
+                if barcode in fresh:
+                    self._entries[barcode] = fresh[barcode]
+                else:
+                    self._entries.pop(barcode, None)
+
+    # ------------------------------------------------------------------
+    # Updates from WorkflowEngine
+    # ------------------------------------------------------------------
+
+    def started(self, rows):
+        with self._lock:
+            for row in rows:
+                self._entries[row['barcode']] = row
+
+    def finished(self, *barcodes):
+        with self._lock:
+            for barcode in filter(None, barcodes):
+                self._entries.pop(barcode, None)
+
+    def started_on_commit(self, db, rows):
+        """Register stations once the current transaction commits"""
+        db.after_commit(lambda: self.started(rows))
+
+    def finished_on_commit(self, db, *barcodes):
+        """Drop stations once the current transaction commits"""
+        db.after_commit(lambda: self.finished(*barcodes))
+
+    # ------------------------------------------------------------------
+    # Background follower
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Load the registry and follow the event bus (idempotent, fork-aware)"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        # Entries inherited across fork may be stale
+        with self._lock:
+            self._entries = {}
+            self._loaded = False
+        threading.Thread(target=self._run, name='wip-registry', daemon=True).start()
+
+    def _run(self):
+        pid = os.getpid()
+        # Position before loading: nothing committed in between is missed
+        after = event_bus.latest_id()
+        next_check = 0.0
+        while self._pid == pid:
+            try:
+                if time.monotonic() >= next_check:
+                    self.check()
+                    next_check = time.monotonic() + self.check_interval
+                events, after, resync = event_bus.wait(after, max(next_check - time.monotonic(), 0.1))
+                if resync:
+                    next_check = 0.0
+                    continue
+                barcodes = [
+                    event['data'].get(key)
+                    for event in events if event.get('type') in STATION_EVENTS
+                    for key in STATION_EVENTS[event['type']]
+                ]
+                self.reload(barcodes)
+            except Exception as e:
+                print(f"WIP registry refresh failed: {e}")
+                next_check = time.monotonic() + min(self.check_interval, 5.0)
+                time.sleep(1.0)
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def _ensure_loaded(self):
+        # Before the follower's first load (or without it): load now
+        if not self._loaded:
+            self.check()
+
+    def count(self):
+        self._ensure_loaded()
+        with self._lock:
+            return len(self._entries)
+
+    def active(self, stuck_seconds=None, process_type=None, process_name=None):
+        """
+        Running stations, longest running first
+
+        Returns:
+            list: station rows with elapsed_seconds, elapsed_formatted, stuck
+        """
+        self._ensure_loaded()
+        threshold = self.stuck_seconds if stuck_seconds is None else stuck_seconds
+        with self._lock:
+            entries = list(self._entries.values())
+        stations = []
+        for entry in entries:
+            if process_type and entry['process_type'] != process_type:
+                continue
+            if process_name and (entry['process_name'] or '').lower() != process_name.lower():
+                continue
+            elapsed = TimeService.calculate_duration(entry['process_start_time']) if entry['process_start_time'] else None
+            stations.append(dict(
+                entry,
+                elapsed_seconds=elapsed,
+                elapsed_formatted=format_elapsed(elapsed),
+                stuck=elapsed is not None and threshold > 0 and elapsed > threshold
+            ))
+        stations.sort(key=lambda station: station['elapsed_seconds'] or 0, reverse=True)
+        return stations
+
+    def info(self):
+        return {
+            'loaded': self._loaded,
+            'checks': self.checks,
+            'drift': self.drift,
+            'lastCheckAt': self.last_check_at.isoformat() if self.last_check_at else None,
+            'checkInterval': self.check_interval,
+        }
+
+
+wip_registry = WipRegistry(
+    db,
+    check_interval=float(os.getenv('WIP_CHECK_INTERVAL', 60)),
+    stuck_seconds=int(os.getenv('WIP_STUCK_SECONDS', 4 * 3600))
+)
@@ -24,15 +24,13 @@ CREATE TABLE users (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- =====================================================
--- TROLLEY BARCODES TABLE (Reusable Containers)
--- State-based: EMPTY, FULL
+-- LOTS TABLE (Order Payload, Stored Once)
+-- Written when data is attached to a trolley, never updated;
+-- trolleys, process stations and history reference it by id
 -- =====================================================
-CREATE TABLE trolley_barcodes (
+CREATE TABLE lots (
     id INT PRIMARY KEY AUTO_INCREMENT,
-    barcode VARCHAR(255) UNIQUE NOT NULL,
-    state ENUM('EMPTY', 'FULL') DEFAULT 'EMPTY',
     
-    -- Data fields (filled when FULL, NULL when EMPTY)
     customer_name VARCHAR(255) NULL,
     lot_number VARCHAR(255) NULL,
     design_name VARCHAR(255) NULL,
@@ -48,13 +46,33 @@ CREATE TABLE trolley_barcodes (
     remarks TEXT NULL,
     pack_instructions TEXT NULL,
     
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    
+    INDEX idx_lot_number (lot_number),
+    INDEX idx_customer_name (customer_name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- =====================================================
+-- TROLLEY BARCODES TABLE (Reusable Containers)
+-- State-based: EMPTY, FULL
+-- =====================================================
+CREATE TABLE trolley_barcodes (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    barcode VARCHAR(255) UNIQUE NOT NULL,
+    state ENUM('EMPTY', 'FULL') DEFAULT 'EMPTY',
+    
+    -- Lot on the trolley (set when FULL, NULL when EMPTY)
+    lot_id INT NULL,
+    
     -- Timestamps with timezone support
     attached_at TIMESTAMP NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     
     INDEX idx_barcode (barcode),
-    INDEX idx_state (state)
+    INDEX idx_state (state),
+    INDEX idx_lot_id (lot_id),
+    FOREIGN KEY (lot_id) REFERENCES lots(id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- =====================================================
@@ -75,21 +93,8 @@ CREATE TABLE process_barcodes (
     -- Original trolley that provided the data
     source_trolley_barcode VARCHAR(255) NULL,
     
-    -- Data fields (copied from trolley)
-    customer_name VARCHAR(255) NULL,
-    lot_number VARCHAR(255) NULL,
-    design_name VARCHAR(255) NULL,
-    design_number VARCHAR(255) NULL,
-    grey_width VARCHAR(100) NULL,
-    finish_width VARCHAR(100) NULL,
-    fabric_quality VARCHAR(255) NULL,
-    total_trolley INT NULL,
-    meters VARCHAR(100) NULL,
-    matching VARCHAR(100) NULL,
-    order_receive_date DATE NULL,
-    grey_receive_date DATE NULL,
-    remarks TEXT NULL,
-    pack_instructions TEXT NULL,
+    -- Lot being processed (same lot on the input and its mirrored output)
+    lot_id INT NULL,
     
     -- Process timing
     process_start_time TIMESTAMP NULL,
@@ -104,15 +109,21 @@ CREATE TABLE process_barcodes (
     INDEX idx_process_type (process_type),
     INDEX idx_state (state),
     INDEX idx_paired_barcode (paired_barcode),
-    INDEX idx_source_trolley (source_trolley_barcode)
+    INDEX idx_source_trolley (source_trolley_barcode),
+    INDEX idx_lot_id (lot_id),
+    FOREIGN KEY (lot_id) REFERENCES lots(id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- =====================================================
 -- TRACKING HISTORY TABLE (Complete Audit Trail)
 -- Stores: start time, end time, duration, full parameters
+-- Partitioned by month on created_at; `python manage.py partitions`
+-- adds upcoming months. Partitioned InnoDB tables cannot have
+-- FULLTEXT indexes or foreign keys: search lives in history_search
+-- and created_by is not enforced by the database.
 -- =====================================================
 CREATE TABLE tracking_history (
-    id INT PRIMARY KEY AUTO_INCREMENT,
+    id INT NOT NULL AUTO_INCREMENT,
     event_type ENUM('trolley_attached', 'process_input', 'process_output', 'trolley_transferred') NOT NULL,
     
     -- Process information
@@ -127,7 +138,8 @@ CREATE TABLE tracking_history (
     process_input_barcode VARCHAR(255) NULL,
     process_output_barcode VARCHAR(255) NULL,
     
-    -- Complete data parameters
+    -- Complete data parameters (history written before lots existed;
+    -- newer events leave them NULL and reference lot_id instead)
     customer_name VARCHAR(255),
     lot_number VARCHAR(255),
     design_name VARCHAR(255),
@@ -159,8 +171,15 @@ CREATE TABLE tracking_history (
     
     -- Audit fields
     created_by INT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    -- Idempotency key: journal replays skip events already inserted
+    event_uid CHAR(32) NULL,
+    -- Payload of the event (lots.id; not enforced, the table is partitioned)
+    lot_id INT NULL,
     
+    -- Unique keys must contain the partitioning column
+    PRIMARY KEY (id, created_at),
+    UNIQUE KEY uk_event_uid (event_uid, created_at),
     INDEX idx_event_type (event_type),
     INDEX idx_process_code (process_code),
     INDEX idx_input_trolley (input_trolley),
@@ -171,7 +190,101 @@ CREATE TABLE tracking_history (
     INDEX idx_process_barcode (process_barcode),
     INDEX idx_created_at (created_at),
     INDEX idx_status (status),
-    FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL
+    INDEX idx_lot_id (lot_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (
+    PARTITION p202609 VALUES LESS THAN (UNIX_TIMESTAMP('2026-10-01')),
+    PARTITION p202610 VALUES LESS THAN (UNIX_TIMESTAMP('2026-11-01')),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- =====================================================
+-- HISTORY SEARCH TABLE (Full-text search for /api/history/search)
+-- Searchable columns of each history event; maintained by
+-- HistoryRecorder in the same transaction as the history insert
+-- =====================================================
+CREATE TABLE history_search (
+    event_id INT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    customer_name VARCHAR(255),
+    lot_number VARCHAR(255),
+    design_name VARCHAR(255),
+    design_number VARCHAR(255),
+    fabric_quality VARCHAR(255),
+    trolley_barcode VARCHAR(255),
+    process_barcode VARCHAR(255),
+    input_trolley VARCHAR(255),
+    output_trolley VARCHAR(255),
+    process_code VARCHAR(255),
+    process_name VARCHAR(255),
+    PRIMARY KEY (event_id),
+    INDEX idx_created_at (created_at),
+    -- ngram: substring/prefix matches
+    FULLTEXT INDEX ft_history_search (
+        customer_name, lot_number, design_name, design_number, fabric_quality,
+        trolley_barcode, process_barcode, input_trolley, output_trolley,
+        process_code, process_name
+    ) WITH PARSER ngram
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- =====================================================
+-- BARCODE EVENTS TABLE (Barcode -> History Lookup)
+-- One row per barcode column an event mentions; maintained by
+-- HistoryRecorder in the same transaction as the history insert
+-- =====================================================
+CREATE TABLE barcode_events (
+    barcode VARCHAR(255) NOT NULL,
+    role ENUM('trolley', 'process', 'from', 'to', 'input_trolley', 'output_trolley',
+              'process_input', 'process_output') NOT NULL,
+    event_id INT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (barcode, created_at, event_id, role),
+    INDEX idx_event_id (event_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (
+    PARTITION p202609 VALUES LESS THAN (UNIX_TIMESTAMP('2026-10-01')),
+    PARTITION p202610 VALUES LESS THAN (UNIX_TIMESTAMP('2026-11-01')),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+-- =====================================================
+-- HISTORY STATS TABLE (Precomputed /api/history/stats)
+-- Maintained on every history insert; each event type is
+-- spread over slots 0-7 to avoid a single hot row
+-- =====================================================
+CREATE TABLE history_stats (
+    event_type VARCHAR(50) NOT NULL,
+    slot TINYINT UNSIGNED NOT NULL,
+    event_count BIGINT NOT NULL DEFAULT 0,
+    duration_count BIGINT NOT NULL DEFAULT 0,
+    duration_sum BIGINT NOT NULL DEFAULT 0,
+    duration_min INT NULL,
+    duration_max INT NULL,
+    PRIMARY KEY (event_type, slot)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- =====================================================
+-- EDGE SYNC (central side, see core/edge_sync.py)
+-- Last sequence number applied per edge node, and the outcome
+-- of every op it pushed (idempotent replay + conflict list)
+-- =====================================================
+CREATE TABLE sync_nodes (
+    node_id VARCHAR(100) PRIMARY KEY,
+    last_seq BIGINT NOT NULL DEFAULT 0,
+    last_seen_at TIMESTAMP NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE sync_ingest_log (
+    node_id VARCHAR(100) NOT NULL,
+    seq BIGINT NOT NULL,
+    op VARCHAR(20) NOT NULL,
+    status ENUM('applied', 'conflict', 'rejected') NOT NULL,
+    message VARCHAR(1000) NULL,
+    detail TEXT NULL,
+    occurred_at TIMESTAMP NULL,
+    applied_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (node_id, seq),
+    INDEX idx_status (status, applied_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- =====================================================
@@ -185,6 +298,14 @@ CREATE TABLE settings (
     INDEX idx_setting_key (setting_key)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- Bumped on every settings write; workers reload their cached copy when it changes
+CREATE TABLE settings_version (
+    id TINYINT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT INTO settings_version (id, version) VALUES (1, 1);
+
 -- =====================================================
 -- INSERT DEFAULT SETTINGS
 -- =====================================================
@@ -200,6 +321,58 @@ ON DUPLICATE KEY UPDATE setting_key = setting_key;
 -- HELPER VIEWS
 -- =====================================================
 
+-- View: Trolleys with their lot (compatibility: the pre-lots trolley row)
+CREATE VIEW view_trolleys AS
+SELECT 
+    t.id, t.barcode, t.state, t.lot_id,
+    l.customer_name, l.lot_number, l.design_name, l.design_number,
+    l.grey_width, l.finish_width, l.fabric_quality, l.total_trolley,
+    l.meters, l.matching, l.order_receive_date, l.grey_receive_date,
+    l.remarks, l.pack_instructions,
+    t.attached_at, t.created_at, t.updated_at
+FROM trolley_barcodes t
+LEFT JOIN lots l ON l.id = t.lot_id;
+
+-- View: Process stations with their lot (compatibility: the pre-lots process row)
+CREATE VIEW view_processes AS
+SELECT 
+    p.id, p.barcode, p.process_type, p.state, p.process_name,
+    p.paired_barcode, p.source_trolley_barcode, p.lot_id,
+    l.customer_name, l.lot_number, l.design_name, l.design_number,
+    l.grey_width, l.finish_width, l.fabric_quality, l.total_trolley,
+    l.meters, l.matching, l.order_receive_date, l.grey_receive_date,
+    l.remarks, l.pack_instructions,
+    p.process_start_time, p.process_end_time,
+    p.attached_at, p.created_at, p.updated_at
+FROM process_barcodes p
+LEFT JOIN lots l ON l.id = p.lot_id;
+
+-- View: History with its lot (events from before lots keep their inline copy)
+CREATE VIEW view_history AS
+SELECT 
+    h.id, h.event_type, h.process_code, h.process_name,
+    h.input_trolley, h.output_trolley,
+    h.process_input_barcode, h.process_output_barcode,
+    COALESCE(l.customer_name, h.customer_name) as customer_name,
+    COALESCE(l.lot_number, h.lot_number) as lot_number,
+    COALESCE(l.design_name, h.design_name) as design_name,
+    COALESCE(l.design_number, h.design_number) as design_number,
+    COALESCE(l.grey_width, h.grey_width) as grey_width,
+    COALESCE(l.finish_width, h.finish_width) as finish_width,
+    COALESCE(l.fabric_quality, h.fabric_quality) as fabric_quality,
+    COALESCE(l.total_trolley, h.total_trolley) as total_trolley,
+    COALESCE(l.meters, h.meters) as meters,
+    COALESCE(l.matching, h.matching) as matching,
+    COALESCE(l.order_receive_date, h.order_receive_date) as order_receive_date,
+    COALESCE(l.grey_receive_date, h.grey_receive_date) as grey_receive_date,
+    COALESCE(l.remarks, h.remarks) as remarks,
+    COALESCE(l.pack_instructions, h.pack_instructions) as pack_instructions,
+    h.trolley_barcode, h.process_barcode, h.from_barcode, h.to_barcode,
+    h.process_start_time, h.process_end_time, h.duration_seconds,
+    h.status, h.created_by, h.created_at, h.event_uid, h.lot_id
+FROM tracking_history h
+LEFT JOIN lots l ON l.id = h.lot_id;
+
 -- View: Active Processes (In Progress)
 CREATE VIEW view_active_processes AS
 SELECT 
@@ -207,23 +380,25 @@ SELECT
     pb.process_name,
     pb.process_type,
     pb.state,
-    pb.customer_name,
-    pb.lot_number,
+    l.customer_name,
+    l.lot_number,
     pb.process_start_time,
     TIMESTAMPDIFF(SECOND, pb.process_start_time, NOW()) as elapsed_seconds
 FROM process_barcodes pb
+LEFT JOIN lots l ON l.id = pb.lot_id
 WHERE pb.state = 'IN_PROCESS';
 
 -- View: Full Trolleys
 CREATE VIEW view_full_trolleys AS
 SELECT 
-    barcode,
-    customer_name,
-    lot_number,
-    design_name,
-    attached_at
-FROM trolley_barcodes
-WHERE state = 'FULL';
+    t.barcode,
+    l.customer_name,
+    l.lot_number,
+    l.design_name,
+    t.attached_at
+FROM trolley_barcodes t
+LEFT JOIN lots l ON l.id = t.lot_id
+WHERE t.state = 'FULL';
 
 -- View: Recent History with Duration
 CREATE VIEW view_history_with_duration AS
@@ -0,0 +1,387 @@
+-- =====================================================
+-- TROLLEY TRACKING SYSTEM - EMBEDDED (SQLITE) SCHEMA
+-- Same tables, keys and views as database_schema_fixed.sql for
+-- DB_BACKEND=sqlite; applied automatically to a new SQLITE_PATH file.
+-- Differences from MySQL:
+--   - ENUM columns are TEXT with CHECK constraints
+--   - text keys compare case-insensitively (NOCASE), like utf8mb4_*_ci
+--   - no partitions: history is one table; no FULLTEXT: search scans
+--     history_search within the date window (BOOLEAN_MATCH)
+--   - updated_at is maintained by triggers
+-- =====================================================
+
+-- =====================================================
+-- USERS TABLE
+-- =====================================================
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(255) NOT NULL COLLATE NOCASE,
+    role TEXT NOT NULL DEFAULT 'operator' CHECK (role IN ('admin', 'operator')),
+    password VARCHAR(255) NOT NULL,
+    status TEXT DEFAULT 'active' CHECK (status IN ('active', 'inactive')),
+    last_login TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_users_status ON users (status);
+CREATE INDEX IF NOT EXISTS idx_users_role ON users (role);
+
+-- =====================================================
+-- LOTS TABLE (Order Payload, Stored Once)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS lots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_name VARCHAR(255) NULL,
+    lot_number VARCHAR(255) NULL,
+    design_name VARCHAR(255) NULL,
+    design_number VARCHAR(255) NULL,
+    grey_width VARCHAR(100) NULL,
+    finish_width VARCHAR(100) NULL,
+    fabric_quality VARCHAR(255) NULL,
+    total_trolley INT NULL,
+    meters VARCHAR(100) NULL,
+    matching VARCHAR(100) NULL,
+    order_receive_date DATE NULL,
+    grey_receive_date DATE NULL,
+    remarks TEXT NULL,
+    pack_instructions TEXT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_lots_lot_number ON lots (lot_number);
+CREATE INDEX IF NOT EXISTS idx_lots_customer_name ON lots (customer_name);
+
+-- =====================================================
+-- TROLLEY BARCODES TABLE (Reusable Containers)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS trolley_barcodes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    barcode VARCHAR(255) NOT NULL UNIQUE COLLATE NOCASE,
+    state TEXT DEFAULT 'EMPTY' CHECK (state IN ('EMPTY', 'FULL')),
+    lot_id INT NULL REFERENCES lots(id),
+    attached_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_trolley_barcodes_state ON trolley_barcodes (state);
+CREATE INDEX IF NOT EXISTS idx_trolley_barcodes_lot_id ON trolley_barcodes (lot_id);
+
+-- =====================================================
+-- PROCESS BARCODES TABLE (Process Input/Output)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS process_barcodes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    barcode VARCHAR(255) NOT NULL UNIQUE COLLATE NOCASE,
+    process_type TEXT NOT NULL CHECK (process_type IN ('input', 'output')),
+    state TEXT DEFAULT 'EMPTY' CHECK (state IN ('EMPTY', 'IN_PROCESS', 'COMPLETED')),
+    process_name VARCHAR(255) NULL,
+    paired_barcode VARCHAR(255) NULL COLLATE NOCASE,
+    source_trolley_barcode VARCHAR(255) NULL COLLATE NOCASE,
+    lot_id INT NULL REFERENCES lots(id),
+    process_start_time TIMESTAMP NULL,
+    process_end_time TIMESTAMP NULL,
+    attached_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_process_barcodes_type ON process_barcodes (process_type);
+CREATE INDEX IF NOT EXISTS idx_process_barcodes_state ON process_barcodes (state);
+CREATE INDEX IF NOT EXISTS idx_process_barcodes_paired ON process_barcodes (paired_barcode);
+CREATE INDEX IF NOT EXISTS idx_process_barcodes_source ON process_barcodes (source_trolley_barcode);
+CREATE INDEX IF NOT EXISTS idx_process_barcodes_lot_id ON process_barcodes (lot_id);
+
+-- =====================================================
+-- TRACKING HISTORY TABLE (Complete Audit Trail)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS tracking_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_type TEXT NOT NULL CHECK (event_type IN
+        ('trolley_attached', 'process_input', 'process_output', 'trolley_transferred')),
+    process_code VARCHAR(255) NULL COLLATE NOCASE,
+    process_name VARCHAR(255) NULL,
+    input_trolley VARCHAR(255) NULL COLLATE NOCASE,
+    output_trolley VARCHAR(255) NULL COLLATE NOCASE,
+    process_input_barcode VARCHAR(255) NULL COLLATE NOCASE,
+    process_output_barcode VARCHAR(255) NULL COLLATE NOCASE,
+    customer_name VARCHAR(255),
+    lot_number VARCHAR(255),
+    design_name VARCHAR(255),
+    design_number VARCHAR(255),
+    grey_width VARCHAR(100),
+    finish_width VARCHAR(100),
+    fabric_quality VARCHAR(255),
+    total_trolley INT,
+    meters VARCHAR(100),
+    matching VARCHAR(100),
+    order_receive_date DATE,
+    grey_receive_date DATE,
+    remarks TEXT,
+    pack_instructions TEXT,
+    trolley_barcode VARCHAR(255) COLLATE NOCASE,
+    process_barcode VARCHAR(255) COLLATE NOCASE,
+    from_barcode VARCHAR(255) COLLATE NOCASE,
+    to_barcode VARCHAR(255) COLLATE NOCASE,
+    process_start_time TIMESTAMP NULL,
+    process_end_time TIMESTAMP NULL,
+    duration_seconds INT NULL,
+    status TEXT DEFAULT 'initiated' CHECK (status IN ('initiated', 'in_progress', 'completed', 'transferred')),
+    created_by INT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    event_uid CHAR(32) NULL UNIQUE,
+    lot_id INT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_event_type ON tracking_history (event_type);
+CREATE INDEX IF NOT EXISTS idx_history_process_code ON tracking_history (process_code);
+CREATE INDEX IF NOT EXISTS idx_history_input_trolley ON tracking_history (input_trolley);
+CREATE INDEX IF NOT EXISTS idx_history_output_trolley ON tracking_history (output_trolley);
+CREATE INDEX IF NOT EXISTS idx_history_process_input ON tracking_history (process_input_barcode);
+CREATE INDEX IF NOT EXISTS idx_history_process_output ON tracking_history (process_output_barcode);
+CREATE INDEX IF NOT EXISTS idx_history_trolley_barcode ON tracking_history (trolley_barcode);
+CREATE INDEX IF NOT EXISTS idx_history_process_barcode ON tracking_history (process_barcode);
+CREATE INDEX IF NOT EXISTS idx_history_created_at ON tracking_history (created_at);
+CREATE INDEX IF NOT EXISTS idx_history_status ON tracking_history (status);
+CREATE INDEX IF NOT EXISTS idx_history_lot_id ON tracking_history (lot_id);
+
+-- =====================================================
+-- HISTORY SEARCH TABLE (/api/history/search)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS history_search (
+    event_id INTEGER PRIMARY KEY,
+    created_at TIMESTAMP NOT NULL,
+    customer_name VARCHAR(255),
+    lot_number VARCHAR(255),
+    design_name VARCHAR(255),
+    design_number VARCHAR(255),
+    fabric_quality VARCHAR(255),
+    trolley_barcode VARCHAR(255),
+    process_barcode VARCHAR(255),
+    input_trolley VARCHAR(255),
+    output_trolley VARCHAR(255),
+    process_code VARCHAR(255),
+    process_name VARCHAR(255)
+);
+CREATE INDEX IF NOT EXISTS idx_history_search_created_at ON history_search (created_at);
+
+-- =====================================================
+-- BARCODE EVENTS TABLE (Barcode -> History Lookup)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS barcode_events (
+    barcode VARCHAR(255) NOT NULL COLLATE NOCASE,
+    role TEXT NOT NULL CHECK (role IN ('trolley', 'process', 'from', 'to', 'input_trolley',
+                                       'output_trolley', 'process_input', 'process_output')),
+    event_id INT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (barcode, created_at, event_id, role)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_barcode_events_event_id ON barcode_events (event_id);
+
+-- =====================================================
+-- HISTORY STATS TABLE (Precomputed /api/history/stats)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS history_stats (
+    event_type VARCHAR(50) NOT NULL,
+    slot INT NOT NULL,
+    event_count BIGINT NOT NULL DEFAULT 0,
+    duration_count BIGINT NOT NULL DEFAULT 0,
+    duration_sum BIGINT NOT NULL DEFAULT 0,
+    duration_min INT NULL,
+    duration_max INT NULL,
+    PRIMARY KEY (event_type, slot)
+);
+
+-- =====================================================
+-- EDGE SYNC (core/edge_sync.py)
+-- Edge: transitions waiting for / acknowledged by central.
+-- Central: last seq applied per edge and the outcome of each op
+-- =====================================================
+CREATE TABLE IF NOT EXISTS sync_outbox (
+    seq INTEGER PRIMARY KEY,
+    op VARCHAR(20) NOT NULL,
+    payload TEXT NOT NULL,
+    base TEXT NOT NULL,
+    occurred_at TIMESTAMP NOT NULL,
+    acked_at TIMESTAMP NULL,
+    status TEXT NULL CHECK (status IN ('applied', 'conflict', 'rejected')),
+    message VARCHAR(1000) NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sync_outbox_acked_at ON sync_outbox (acked_at);
+
+CREATE TABLE IF NOT EXISTS sync_nodes (
+    node_id VARCHAR(100) PRIMARY KEY COLLATE NOCASE,
+    last_seq BIGINT NOT NULL DEFAULT 0,
+    last_seen_at TIMESTAMP NULL
+);
+
+CREATE TABLE IF NOT EXISTS sync_ingest_log (
+    node_id VARCHAR(100) NOT NULL COLLATE NOCASE,
+    seq BIGINT NOT NULL,
+    op VARCHAR(20) NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('applied', 'conflict', 'rejected')),
+    message VARCHAR(1000) NULL,
+    detail TEXT NULL,
+    occurred_at TIMESTAMP NULL,
+    applied_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (node_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_sync_ingest_log_status ON sync_ingest_log (status, applied_at);
+
+-- =====================================================
+-- SETTINGS TABLE
+-- =====================================================
+CREATE TABLE IF NOT EXISTS settings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    setting_key VARCHAR(100) NOT NULL UNIQUE COLLATE NOCASE,
+    setting_value TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS settings_version (
+    id INTEGER PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO settings_version (id, version) VALUES (1, 1);
+
+INSERT OR IGNORE INTO settings (setting_key, setting_value) VALUES
+('company_name', 'TFT Industries'),
+('timezone', 'Asia/Karachi'),
+('timezone_offset', '+05:00'),
+('maintenance_mode', 'false'),
+('auto_mirror_enabled', 'true');
+
+-- =====================================================
+-- updated_at (MySQL: ON UPDATE CURRENT_TIMESTAMP)
+-- =====================================================
+CREATE TRIGGER IF NOT EXISTS trg_users_updated_at AFTER UPDATE ON users
+FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE users SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id; END;
+
+CREATE TRIGGER IF NOT EXISTS trg_trolley_barcodes_updated_at AFTER UPDATE ON trolley_barcodes
+FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE trolley_barcodes SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id; END;
+
+CREATE TRIGGER IF NOT EXISTS trg_process_barcodes_updated_at AFTER UPDATE ON process_barcodes
+FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE process_barcodes SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id; END;
+
+CREATE TRIGGER IF NOT EXISTS trg_settings_updated_at AFTER UPDATE ON settings
+FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at
+BEGIN UPDATE settings SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id; END;
+
+-- =====================================================
+-- HELPER VIEWS
+-- =====================================================
+
+CREATE VIEW IF NOT EXISTS view_trolleys AS
+SELECT
+    t.id, t.barcode, t.state, t.lot_id,
+    l.customer_name, l.lot_number, l.design_name, l.design_number,
+    l.grey_width, l.finish_width, l.fabric_quality, l.total_trolley,
+    l.meters, l.matching, l.order_receive_date, l.grey_receive_date,
+    l.remarks, l.pack_instructions,
+    t.attached_at, t.created_at, t.updated_at
+FROM trolley_barcodes t
+LEFT JOIN lots l ON l.id = t.lot_id;
+
+CREATE VIEW IF NOT EXISTS view_processes AS
+SELECT
+    p.id, p.barcode, p.process_type, p.state, p.process_name,
+    p.paired_barcode, p.source_trolley_barcode, p.lot_id,
+    l.customer_name, l.lot_number, l.design_name, l.design_number,
+    l.grey_width, l.finish_width, l.fabric_quality, l.total_trolley,
+    l.meters, l.matching, l.order_receive_date, l.grey_receive_date,
+    l.remarks, l.pack_instructions,
+    p.process_start_time, p.process_end_time,
+    p.attached_at, p.created_at, p.updated_at
+FROM process_barcodes p
+LEFT JOIN lots l ON l.id = p.lot_id;
+
+CREATE VIEW IF NOT EXISTS view_history AS
+SELECT
+    h.id, h.event_type, h.process_code, h.process_name,
+    h.input_trolley, h.output_trolley,
+    h.process_input_barcode, h.process_output_barcode,
+    COALESCE(l.customer_name, h.customer_name) as customer_name,
+    COALESCE(l.lot_number, h.lot_number) as lot_number,
+    COALESCE(l.design_name, h.design_name) as design_name,
+    COALESCE(l.design_number, h.design_number) as design_number,
+    COALESCE(l.grey_width, h.grey_width) as grey_width,
+    COALESCE(l.finish_width, h.finish_width) as finish_width,
+    COALESCE(l.fabric_quality, h.fabric_quality) as fabric_quality,
+    COALESCE(l.total_trolley, h.total_trolley) as total_trolley,
+    COALESCE(l.meters, h.meters) as meters,
+    COALESCE(l.matching, h.matching) as matching,
+    COALESCE(l.order_receive_date, h.order_receive_date) as order_receive_date,
+    COALESCE(l.grey_receive_date, h.grey_receive_date) as grey_receive_date,
+    COALESCE(l.remarks, h.remarks) as remarks,
+    COALESCE(l.pack_instructions, h.pack_instructions) as pack_instructions,
+    h.trolley_barcode, h.process_barcode, h.from_barcode, h.to_barcode,
+    h.process_start_time, h.process_end_time, h.duration_seconds,
+    h.status, h.created_by, h.created_at, h.event_uid, h.lot_id
+FROM tracking_history h
+LEFT JOIN lots l ON l.id = h.lot_id;
+
+CREATE VIEW IF NOT EXISTS view_active_processes AS
+SELECT
+    pb.barcode,
+    pb.process_name,
+    pb.process_type,
+    pb.state,
+    l.customer_name,
+    l.lot_number,
+    pb.process_start_time,
+    CAST(strftime('%s', 'now') - strftime('%s', pb.process_start_time) AS INTEGER) as elapsed_seconds
+FROM process_barcodes pb
+LEFT JOIN lots l ON l.id = pb.lot_id
+WHERE pb.state = 'IN_PROCESS';
+
+CREATE VIEW IF NOT EXISTS view_full_trolleys AS
+SELECT
+    t.barcode,
+    l.customer_name,
+    l.lot_number,
+    l.design_name,
+    t.attached_at
+FROM trolley_barcodes t
+LEFT JOIN lots l ON l.id = t.lot_id
+WHERE t.state = 'FULL';
+
+CREATE VIEW IF NOT EXISTS view_history_with_duration AS
+SELECT
+    id,
+    event_type,
+    process_name,
+    input_trolley,
+    output_trolley,
+    process_start_time,
+    process_end_time,
+    duration_seconds,
+    (duration_seconds / 3600) || 'h ' || ((duration_seconds % 3600) / 60) || 'm ' ||
+        (duration_seconds % 60) || 's' as duration_formatted,
+    status,
+    created_at
+FROM tracking_history
+ORDER BY created_at DESC;
+
+-- =====================================================
+-- SAMPLE DATA FOR TESTING
+-- =====================================================
+
+INSERT OR IGNORE INTO trolley_barcodes (barcode, state) VALUES
+('TR-01', 'EMPTY'),
+('TR-02', 'EMPTY'),
+('TR-03', 'EMPTY'),
+('TR-04', 'EMPTY'),
+('TR-05', 'EMPTY'),
+('TR-06', 'EMPTY'),
+('TR-07', 'EMPTY'),
+('TR-08', 'EMPTY'),
+('TR-09', 'EMPTY'),
+('TR-10', 'EMPTY');
+
+INSERT OR IGNORE INTO process_barcodes (barcode, process_type, state, paired_barcode) VALUES
+('PR-01-in', 'input', 'EMPTY', 'PR-01-out'),
+('PR-01-out', 'output', 'EMPTY', 'PR-01-in'),
+('PR-02-in', 'input', 'EMPTY', 'PR-02-out'),
+('PR-02-out', 'output', 'EMPTY', 'PR-02-in'),
+('PR-03-in', 'input', 'EMPTY', 'PR-03-out'),
+('PR-03-out', 'output', 'EMPTY', 'PR-03-in');
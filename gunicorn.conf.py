@@ -0,0 +1,39 @@
+"""
+Gunicorn settings: gunicorn -c gunicorn.conf.py
+
+The app is built once in the master (preload) and forked into workers.
+create_app() opens nothing, so workers inherit no sockets, files or
+threads; each one starts its own background work in post_fork.
+"""
+
+import multiprocessing
+import os
+
+wsgi_app = 'app:create_app()'
+bind = f"0.0.0.0:{os.getenv('PORT', 5500)}"
+preload_app = True
+
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# SSE streams hold a thread each (see EVENTS_STREAM_MAX_SECONDS)
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# Recycle workers now and then so leaks cannot accumulate
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+
+def post_fork(server, worker):
+    from app import init_worker
+    init_worker()
+
+
+def worker_exit(server, worker):
+    # Push journaled history before the worker goes (the next flusher would replay it anyway)
+    from core.history_recorder import HistoryRecorder, history_journal
+    if HistoryRecorder.journaled():
+        try:
+            history_journal.flush()
+        except Exception as e:
+            print(f"History journal flush on exit failed: {e}")
@@ -0,0 +1,118 @@
+"""
+Maintenance commands for the Trolley Tracking System
+
+Usage:
+    python manage.py backfill-barcode-index [--batch-size N]
+    python manage.py rebuild-stats
+    python manage.py replay-history-journal
+    python manage.py partitions [--ahead N] [--retention-months N]
+    python manage.py sync-push
+    python manage.py sync-resync
+"""
+
+import argparse
+import os
+import sys
+from config.database import db
+from core.history_recorder import HistoryRecorder, history_journal
+from core.history_stats import HistoryStats
+from core.history_partitions import HistoryPartitions
+from core.edge_sync import edge_sync
+
+
+def backfill_barcode_index(args):
+    """Index history rows written before barcode_events existed"""
+    def progress(last_id, max_id):
+        print(f"  indexed history up to id {last_id} / {max_id}")
+
+    inserted = HistoryRecorder.backfill_barcode_index(db, args.batch_size, progress)
+    print(f"✅ barcode_events backfill complete: {inserted} rows added")
+
+
+def rebuild_stats(args):
+    """Recompute history_stats from tracking_history"""
+    event_types = HistoryStats.rebuild(db)
+    print(f"✅ history_stats rebuilt: {event_types} event types counted")
+
+
+def replay_history_journal(args):
+    """Insert history left in journals of workers that are no longer running"""
+    if not history_journal.available:
+        print("History journal is not supported on this platform")
+        return
+    replayed = history_journal.recover()
+    print(f"✅ history journal replay complete: {replayed} events")
+
+
+def partitions(args):
+    """Create upcoming monthly history partitions; archive expired ones"""
+    if db.backend != 'mysql':
+        print(f"Partitions are a MySQL feature; nothing to do for DB_BACKEND={db.backend}")
+        return
+    created = HistoryPartitions.ensure_future(db, args.ahead)
+    for table, name in created:
+        print(f"  created {table}.{name}")
+    archived = HistoryPartitions.archive(db, args.retention_months)
+    for table in archived:
+        print(f"  archived into {table}")
+    print(f"✅ partitions up to date: {len(created)} created, {len(archived)} archived")
+
+
+def sync_push(args):
+    """Push every queued scan of this edge node to central now"""
+    if not edge_sync.enabled:
+        print("Not an edge node (NODE_ROLE=edge); nothing to push")
+        return 1
+    summary = edge_sync.push_all()
+    print(f"✅ pushed {summary['sent']} ops: {summary['applied']} applied, "
+          f"{summary['conflicts']} conflicts, {summary['rejected']} rejected")
+    return 1 if summary['conflicts'] or summary['rejected'] else 0
+
+
+def sync_resync(args):
+    """Skip ops central lost and this edge has pruned, then resume pushing"""
+    if not edge_sync.enabled:
+        print("Not an edge node (NODE_ROLE=edge); nothing to resync")
+        return 1
+    halted = edge_sync.halted()
+    if not halted:
+        print("Sync is not halted; nothing to do")
+        return 0
+    result = edge_sync.resync()
+    print(f"✅ central now at seq {result['lastSeq']} ({result['skipped']} lost ops skipped); pushing resumes")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Trolley Tracking System maintenance')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    backfill = commands.add_parser('backfill-barcode-index', help='Build barcode_events for existing history')
+    backfill.add_argument('--batch-size', type=int, default=5000)
+    backfill.set_defaults(handler=backfill_barcode_index)
+
+    stats = commands.add_parser('rebuild-stats', help='Recompute /api/history/stats counters from scratch')
+    stats.set_defaults(handler=rebuild_stats)
+
+    replay = commands.add_parser('replay-history-journal', help='Insert history from abandoned write-behind journals')
+    replay.set_defaults(handler=replay_history_journal)
+
+    partition = commands.add_parser('partitions', help='Maintain monthly history partitions (run daily)')
+    partition.add_argument('--ahead', type=int, default=int(os.getenv('HISTORY_PARTITIONS_AHEAD', 3)),
+                           help='months to pre-create (default 3)')
+    partition.add_argument('--retention-months', type=int, default=int(os.getenv('HISTORY_RETENTION_MONTHS', 0)),
+                           help='archive months older than this; 0 keeps everything (default)')
+    partition.set_defaults(handler=partitions)
+
+    push = commands.add_parser('sync-push', help='Edge node: push queued scans to central and report conflicts')
+    push.set_defaults(handler=sync_push)
+
+    resync = commands.add_parser('sync-resync', help='Edge node: skip ops central lost and the outbox has pruned, resume pushing')
+    resync.set_defaults(handler=sync_resync)
+
+    args = parser.parse_args(argv)
+    return args.handler(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+-- =====================================================
+-- MIGRATION 001: Full-text search index on tracking_history
+-- Backs /api/history/search (replaces leading-wildcard LIKE scans)
+--
+-- Requires MySQL 5.7.6+ (ngram parser). Adding the first FULLTEXT
+-- index rebuilds the table; run it outside shift hours.
+-- =====================================================
+
+USE trolley_tracking;
+
+ALTER TABLE tracking_history
+    ADD FULLTEXT INDEX ft_history_search (
+        customer_name, lot_number, design_name, design_number, fabric_quality,
+        trolley_barcode, process_barcode, input_trolley, output_trolley,
+        process_code, process_name
+    ) WITH PARSER ngram;
@@ -0,0 +1,19 @@
+-- =====================================================
+-- MIGRATION 002: Barcode -> history lookup table
+-- Backs /api/barcode/search and /api/history/trolley/<barcode>
+--
+-- After applying, index the existing history (safe to re-run):
+--   python manage.py backfill-barcode-index
+-- =====================================================
+
+USE trolley_tracking;
+
+CREATE TABLE IF NOT EXISTS barcode_events (
+    barcode VARCHAR(255) NOT NULL,
+    role ENUM('trolley', 'process', 'from', 'to', 'input_trolley', 'output_trolley',
+              'process_input', 'process_output') NOT NULL,
+    event_id INT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (barcode, created_at, event_id, role),
+    INDEX idx_event_id (event_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
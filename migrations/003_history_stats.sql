@@ -0,0 +1,20 @@
+-- =====================================================
+-- MIGRATION 003: Precomputed history statistics
+-- Backs /api/history/stats
+--
+-- After applying, seed the counters from existing history:
+--   python manage.py rebuild-stats
+-- =====================================================
+
+USE trolley_tracking;
+
+CREATE TABLE IF NOT EXISTS history_stats (
+    event_type VARCHAR(50) NOT NULL,
+    slot TINYINT UNSIGNED NOT NULL,
+    event_count BIGINT NOT NULL DEFAULT 0,
+    duration_count BIGINT NOT NULL DEFAULT 0,
+    duration_sum BIGINT NOT NULL DEFAULT 0,
+    duration_min INT NULL,
+    duration_max INT NULL,
+    PRIMARY KEY (event_type, slot)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,14 @@
+-- =====================================================
+-- MIGRATION 004: Settings version counter
+-- Lets every worker cache settings and reload only on change
+-- =====================================================
+
+USE trolley_tracking;
+
+CREATE TABLE IF NOT EXISTS settings_version (
+    id TINYINT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT INTO settings_version (id, version) VALUES (1, 1)
+ON DUPLICATE KEY UPDATE version = version + 1;
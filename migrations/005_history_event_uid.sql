@@ -0,0 +1,11 @@
+-- =====================================================
+-- MIGRATION 005: Idempotency key for history events
+-- Required by HISTORY_DURABILITY=journal (write-behind replay)
+-- and written by every history insert from this release on
+-- =====================================================
+
+USE trolley_tracking;
+
+ALTER TABLE tracking_history
+    ADD COLUMN event_uid CHAR(32) NULL AFTER created_at,
+    ADD UNIQUE KEY uk_event_uid (event_uid);
@@ -0,0 +1,77 @@
+-- =====================================================
+-- MIGRATION 006: Monthly partitions for tracking_history
+-- and barcode_events
+--
+-- Partitioned InnoDB tables cannot carry FULLTEXT indexes or
+-- foreign keys, so:
+--   * search moves to the new history_search table (backfilled here)
+--   * the created_by -> users(id) foreign key is dropped
+-- Unique keys must contain created_at: PRIMARY KEY (id, created_at).
+--
+-- Every statement rebuilds a table; run it outside shift hours with
+-- the app stopped. The FK name below is MySQL's default; check
+-- SHOW CREATE TABLE tracking_history if yours differs.
+--
+-- Afterwards, create the upcoming months (and schedule it daily):
+--   python manage.py partitions
+-- =====================================================
+
+USE trolley_tracking;
+
+CREATE TABLE IF NOT EXISTS history_search (
+    event_id INT NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    customer_name VARCHAR(255),
+    lot_number VARCHAR(255),
+    design_name VARCHAR(255),
+    design_number VARCHAR(255),
+    fabric_quality VARCHAR(255),
+    trolley_barcode VARCHAR(255),
+    process_barcode VARCHAR(255),
+    input_trolley VARCHAR(255),
+    output_trolley VARCHAR(255),
+    process_code VARCHAR(255),
+    process_name VARCHAR(255),
+    PRIMARY KEY (event_id),
+    INDEX idx_created_at (created_at),
+    FULLTEXT INDEX ft_history_search (
+        customer_name, lot_number, design_name, design_number, fabric_quality,
+        trolley_barcode, process_barcode, input_trolley, output_trolley,
+        process_code, process_name
+    ) WITH PARSER ngram
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+UPDATE tracking_history
+SET created_at = COALESCE(process_end_time, process_start_time, '2000-01-01 00:00:00')
+WHERE created_at IS NULL;
+
+INSERT IGNORE INTO history_search (
+    event_id, created_at, customer_name, lot_number, design_name, design_number, fabric_quality,
+    trolley_barcode, process_barcode, input_trolley, output_trolley, process_code, process_name
+)
+SELECT id, created_at, customer_name, lot_number, design_name, design_number, fabric_quality,
+       trolley_barcode, process_barcode, input_trolley, output_trolley, process_code, process_name
+FROM tracking_history;
+
+ALTER TABLE tracking_history DROP FOREIGN KEY tracking_history_ibfk_1;
+ALTER TABLE tracking_history DROP INDEX ft_history_search;
+
+ALTER TABLE tracking_history
+    MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, created_at),
+    DROP INDEX uk_event_uid,
+    ADD UNIQUE KEY uk_event_uid (event_uid, created_at);
+
+-- Everything older than October 2026 lands in the first partition
+ALTER TABLE tracking_history PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (
+    PARTITION p202609 VALUES LESS THAN (UNIX_TIMESTAMP('2026-10-01')),
+    PARTITION p202610 VALUES LESS THAN (UNIX_TIMESTAMP('2026-11-01')),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
+
+ALTER TABLE barcode_events PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (
+    PARTITION p202609 VALUES LESS THAN (UNIX_TIMESTAMP('2026-10-01')),
+    PARTITION p202610 VALUES LESS THAN (UNIX_TIMESTAMP('2026-11-01')),
+    PARTITION pmax VALUES LESS THAN MAXVALUE
+);
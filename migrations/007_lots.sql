@@ -0,0 +1,201 @@
+-- =====================================================
+-- MIGRATION 007: lots - the order payload stored once
+--
+-- Trolleys, process stations and new history events reference
+-- a lots row by lot_id instead of carrying the 14 payload
+-- columns. This migration:
+--   * creates lots and one lot per FULL trolley / IN_PROCESS
+--     station (a mirrored output shares its input's lot)
+--   * points trolley_barcodes / process_barcodes at them and
+--     drops their payload columns
+--   * adds tracking_history.lot_id; existing history keeps its
+--     inline payload and is read through view_history
+--   * creates the compatibility views the application reads
+--
+-- Run it with the app stopped: the new code needs lot_id and the
+-- old code needs the dropped columns.
+-- =====================================================
+
+USE trolley_tracking;
+
+CREATE TABLE IF NOT EXISTS lots (
+    id INT PRIMARY KEY AUTO_INCREMENT,
+    customer_name VARCHAR(255) NULL,
+    lot_number VARCHAR(255) NULL,
+    design_name VARCHAR(255) NULL,
+    design_number VARCHAR(255) NULL,
+    grey_width VARCHAR(100) NULL,
+    finish_width VARCHAR(100) NULL,
+    fabric_quality VARCHAR(255) NULL,
+    total_trolley INT NULL,
+    meters VARCHAR(100) NULL,
+    matching VARCHAR(100) NULL,
+    order_receive_date DATE NULL,
+    grey_receive_date DATE NULL,
+    remarks TEXT NULL,
+    pack_instructions TEXT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_lot_number (lot_number),
+    INDEX idx_customer_name (customer_name)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Backfill bookkeeping, dropped at the end
+ALTER TABLE lots ADD COLUMN migrated_from VARCHAR(300) NULL, ADD INDEX idx_migrated_from (migrated_from);
+
+ALTER TABLE trolley_barcodes ADD COLUMN lot_id INT NULL AFTER state, ADD INDEX idx_lot_id (lot_id);
+ALTER TABLE process_barcodes ADD COLUMN lot_id INT NULL AFTER source_trolley_barcode, ADD INDEX idx_lot_id (lot_id);
+
+-- Loaded trolleys
+INSERT INTO lots (customer_name, lot_number, design_name, design_number, grey_width, finish_width,
+                  fabric_quality, total_trolley, meters, matching, order_receive_date, grey_receive_date,
+                  remarks, pack_instructions, created_at, migrated_from)
+SELECT customer_name, lot_number, design_name, design_number, grey_width, finish_width,
+       fabric_quality, total_trolley, meters, matching, order_receive_date, grey_receive_date,
+       remarks, pack_instructions, COALESCE(attached_at, CURRENT_TIMESTAMP), CONCAT('trolley:', barcode)
+FROM trolley_barcodes
+WHERE state = 'FULL';
+
+UPDATE trolley_barcodes t
+JOIN lots l ON l.migrated_from = CONCAT('trolley:', t.barcode)
+SET t.lot_id = l.id;
+
+-- Running stations: inputs first, then outputs that do not mirror their input
+INSERT INTO lots (customer_name, lot_number, design_name, design_number, grey_width, finish_width,
+                  fabric_quality, total_trolley, meters, matching, order_receive_date, grey_receive_date,
+                  remarks, pack_instructions, created_at, migrated_from)
+SELECT customer_name, lot_number, design_name, design_number, grey_width, finish_width,
+       fabric_quality, total_trolley, meters, matching, order_receive_date, grey_receive_date,
+       remarks, pack_instructions, COALESCE(attached_at, CURRENT_TIMESTAMP), CONCAT('process:', barcode)
+FROM process_barcodes
+WHERE state = 'IN_PROCESS' AND process_type = 'input';
+
+UPDATE process_barcodes p
+JOIN lots l ON l.migrated_from = CONCAT('process:', p.barcode)
+SET p.lot_id = l.id;
+
+UPDATE process_barcodes o
+JOIN process_barcodes i ON i.barcode = o.paired_barcode
+SET o.lot_id = i.lot_id
+WHERE o.process_type = 'output' AND o.state = 'IN_PROCESS'
+  AND i.state = 'IN_PROCESS' AND i.lot_id IS NOT NULL
+  AND o.source_trolley_barcode <=> i.source_trolley_barcode
+  AND o.lot_number <=> i.lot_number;
+
+INSERT INTO lots (customer_name, lot_number, design_name, design_number, grey_width, finish_width,
+                  fabric_quality, total_trolley, meters, matching, order_receive_date, grey_receive_date,
+                  remarks, pack_instructions, created_at, migrated_from)
+SELECT customer_name, lot_number, design_name, design_number, grey_width, finish_width,
+       fabric_quality, total_trolley, meters, matching, order_receive_date, grey_receive_date,
+       remarks, pack_instructions, COALESCE(attached_at, CURRENT_TIMESTAMP), CONCAT('process:', barcode)
+FROM process_barcodes
+WHERE state = 'IN_PROCESS' AND lot_id IS NULL;
+
+UPDATE process_barcodes p
+JOIN lots l ON l.migrated_from = CONCAT('process:', p.barcode)
+SET p.lot_id = l.id
+WHERE p.lot_id IS NULL;
+
+ALTER TABLE lots DROP INDEX idx_migrated_from, DROP COLUMN migrated_from;
+
+-- Payload now lives in lots only
+ALTER TABLE trolley_barcodes
+    DROP COLUMN customer_name, DROP COLUMN lot_number, DROP COLUMN design_name, DROP COLUMN design_number,
+    DROP COLUMN grey_width, DROP COLUMN finish_width, DROP COLUMN fabric_quality, DROP COLUMN total_trolley,
+    DROP COLUMN meters, DROP COLUMN matching, DROP COLUMN order_receive_date, DROP COLUMN grey_receive_date,
+    DROP COLUMN remarks, DROP COLUMN pack_instructions,
+    ADD FOREIGN KEY (lot_id) REFERENCES lots(id);
+
+ALTER TABLE process_barcodes
+    DROP COLUMN customer_name, DROP COLUMN lot_number, DROP COLUMN design_name, DROP COLUMN design_number,
+    DROP COLUMN grey_width, DROP COLUMN finish_width, DROP COLUMN fabric_quality, DROP COLUMN total_trolley,
+    DROP COLUMN meters, DROP COLUMN matching, DROP COLUMN order_receive_date, DROP COLUMN grey_receive_date,
+    DROP COLUMN remarks, DROP COLUMN pack_instructions,
+    ADD FOREIGN KEY (lot_id) REFERENCES lots(id);
+
+-- History: new events reference their lot; old ones keep the inline copy
+ALTER TABLE tracking_history
+    ADD COLUMN lot_id INT NULL AFTER event_uid,
+    ADD INDEX idx_lot_id (lot_id);
+
+-- Compatibility views (same columns the application read before)
+DROP VIEW IF EXISTS view_active_processes;
+DROP VIEW IF EXISTS view_full_trolleys;
+
+-- View: Trolleys with their lot (compatibility: the pre-lots trolley row)
+CREATE VIEW view_trolleys AS
+SELECT 
+    t.id, t.barcode, t.state, t.lot_id,
+    l.customer_name, l.lot_number, l.design_name, l.design_number,
+    l.grey_width, l.finish_width, l.fabric_quality, l.total_trolley,
+    l.meters, l.matching, l.order_receive_date, l.grey_receive_date,
+    l.remarks, l.pack_instructions,
+    t.attached_at, t.created_at, t.updated_at
+FROM trolley_barcodes t
+LEFT JOIN lots l ON l.id = t.lot_id;
+
+-- View: Process stations with their lot (compatibility: the pre-lots process row)
+CREATE VIEW view_processes AS
+SELECT 
+    p.id, p.barcode, p.process_type, p.state, p.process_name,
+    p.paired_barcode, p.source_trolley_barcode, p.lot_id,
+    l.customer_name, l.lot_number, l.design_name, l.design_number,
+    l.grey_width, l.finish_width, l.fabric_quality, l.total_trolley,
+    l.meters, l.matching, l.order_receive_date, l.grey_receive_date,
+    l.remarks, l.pack_instructions,
+    p.process_start_time, p.process_end_time,
+    p.attached_at, p.created_at, p.updated_at
+FROM process_barcodes p
+LEFT JOIN lots l ON l.id = p.lot_id;
+
+-- View: History with its lot (events from before lots keep their inline copy)
+CREATE VIEW view_history AS
+SELECT 
+    h.id, h.event_type, h.process_code, h.process_name,
+    h.input_trolley, h.output_trolley,
+    h.process_input_barcode, h.process_output_barcode,
+    COALESCE(l.customer_name, h.customer_name) as customer_name,
+    COALESCE(l.lot_number, h.lot_number) as lot_number,
+    COALESCE(l.design_name, h.design_name) as design_name,
+    COALESCE(l.design_number, h.design_number) as design_number,
+    COALESCE(l.grey_width, h.grey_width) as grey_width,
+    COALESCE(l.finish_width, h.finish_width) as finish_width,
+    COALESCE(l.fabric_quality, h.fabric_quality) as fabric_quality,
+    COALESCE(l.total_trolley, h.total_trolley) as total_trolley,
+    COALESCE(l.meters, h.meters) as meters,
+    COALESCE(l.matching, h.matching) as matching,
+    COALESCE(l.order_receive_date, h.order_receive_date) as order_receive_date,
+    COALESCE(l.grey_receive_date, h.grey_receive_date) as grey_receive_date,
+    COALESCE(l.remarks, h.remarks) as remarks,
+    COALESCE(l.pack_instructions, h.pack_instructions) as pack_instructions,
+    h.trolley_barcode, h.process_barcode, h.from_barcode, h.to_barcode,
+    h.process_start_time, h.process_end_time, h.duration_seconds,
+    h.status, h.created_by, h.created_at, h.event_uid, h.lot_id
+FROM tracking_history h
+LEFT JOIN lots l ON l.id = h.lot_id;
+
+-- View: Active Processes (In Progress)
+CREATE VIEW view_active_processes AS
+SELECT 
+    pb.barcode,
+    pb.process_name,
+    pb.process_type,
+    pb.state,
+    l.customer_name,
+    l.lot_number,
+    pb.process_start_time,
+    TIMESTAMPDIFF(SECOND, pb.process_start_time, NOW()) as elapsed_seconds
+FROM process_barcodes pb
+LEFT JOIN lots l ON l.id = pb.lot_id
+WHERE pb.state = 'IN_PROCESS';
+
+-- View: Full Trolleys
+CREATE VIEW view_full_trolleys AS
+SELECT 
+    t.barcode,
+    l.customer_name,
+    l.lot_number,
+    l.design_name,
+    t.attached_at
+FROM trolley_barcodes t
+LEFT JOIN lots l ON l.id = t.lot_id
+WHERE t.state = 'FULL';
@@ -0,0 +1,32 @@
+-- =====================================================
+-- MIGRATION 008: Edge sync ledger (central server)
+--
+-- Edge nodes (NODE_ROLE=edge) push their transitions to
+-- /api/sync/ingest. Central remembers the last sequence number
+-- applied per node and the outcome of every op, so a resent
+-- batch is answered from the log instead of applied twice, and
+-- conflicts stay listed in /api/sync/conflicts.
+-- Edges keep their outbox in their SQLite store
+-- (database_schema_sqlite.sql), not here.
+-- =====================================================
+
+USE trolley_tracking;
+
+CREATE TABLE IF NOT EXISTS sync_nodes (
+    node_id VARCHAR(100) PRIMARY KEY,
+    last_seq BIGINT NOT NULL DEFAULT 0,
+    last_seen_at TIMESTAMP NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS sync_ingest_log (
+    node_id VARCHAR(100) NOT NULL,
+    seq BIGINT NOT NULL,
+    op VARCHAR(20) NOT NULL,
+    status ENUM('applied', 'conflict', 'rejected') NOT NULL,
+    message VARCHAR(1000) NULL,
+    detail TEXT NULL,
+    occurred_at TIMESTAMP NULL,
+    applied_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (node_id, seq),
+    INDEX idx_status (status, applied_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
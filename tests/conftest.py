@@ -0,0 +1,48 @@
+"""
+Test setup: the whole app on DB_BACKEND=sqlite, no MySQL server needed
+
+The environment is set before any application module is imported, since
+config.database, the event bus and edge sync read it at import time.
+Every test session gets a fresh database file and runtime directory.
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_session_dir = tempfile.mkdtemp(prefix='trolley_tests_')
+os.environ.update({
+    'DB_BACKEND': 'sqlite',
+    'SQLITE_PATH': os.path.join(_session_dir, 'trolley_tracking.db'),
+    'TROLLEY_RUNTIME_DIR': os.path.join(_session_dir, 'runtime'),
+    'NODE_ROLE': 'central',
+    'SYNC_TOKEN': 'test-sync-token',
+    'HISTORY_DURABILITY': 'sync',
+    'METRICS_ENABLED': 'false',
+})
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    import app as app_package
+    from app import create_app
+
+    # No background threads: tests drive the registry and sync directly
+    app_package._worker_pid = os.getpid()
+    application = create_app({'TESTING': True})
+    return application
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def runtime_dir():
+    return os.environ['TROLLEY_RUNTIME_DIR']
@@ -0,0 +1,142 @@
+"""
+Edge push against central's /api/sync endpoints, both served from the
+test database: the edge's outbox and central's node log live in
+different tables, and the ops replayed are clears of an EMPTY trolley
+"""
+
+import os
+from datetime import timedelta
+import pytest
+from config.database import db
+from core.edge_sync import EdgeSync, SyncHalted, snapshot
+from core.time_engine import TimeService
+from app.controllers import health_controller
+
+NODE = 'edge-test'
+TOKEN = os.environ['SYNC_TOKEN']
+
+
+@pytest.fixture
+def edge(client):
+    node = EdgeSync(db, role='edge', node_id=NODE, central_url='http://central', token=TOKEN, batch_size=50)
+
+    def post(path, body, compressed=True):
+        headers = {'Content-Type': 'application/json', 'X-Sync-Token': TOKEN}
+        if compressed:
+            headers['Content-Encoding'] = 'deflate'
+        response = client.post(path, data=body, headers=headers)
+        return response.status_code, response.get_json() or {}
+
+    node._post = post
+    db.execute_query('DELETE FROM sync_outbox')
+    db.execute_query('DELETE FROM sync_ingest_log WHERE node_id = %s', (NODE,))
+    db.execute_query('DELETE FROM sync_nodes WHERE node_id = %s', (NODE,))
+    yield node
+    if os.path.exists(node._halt_path()):
+        os.remove(node._halt_path())
+
+
+def record_clears(edge, count):
+    for _ in range(count):
+        with db.transaction() as (cursor, connection):
+            edge.record(cursor, 'clear', {'barcode': 'TR-10'}, [snapshot('trolley', 'TR-10', None)],
+                        TimeService.get_db_timestamp())
+
+
+def central_seq():
+    return db.fetch_one('SELECT last_seq FROM sync_nodes WHERE node_id = %s', (NODE,))['last_seq']
+
+
+def restore_central(last_seq):
+    """Central back to a backup taken after last_seq: its later progress and log are gone"""
+    db.execute_query('UPDATE sync_nodes SET last_seq = %s WHERE node_id = %s', (last_seq, NODE))
+    db.execute_query('DELETE FROM sync_ingest_log WHERE node_id = %s AND seq > %s', (NODE, last_seq))
+
+
+def test_push_applies_in_order_and_resends_are_idempotent(edge):
+    record_clears(edge, 3)
+    summary = edge.push_all()
+    assert summary['sent'] == 3 and summary['applied'] == 3
+    assert central_seq() == 3
+
+    # Lost acknowledgements: the same batch again is answered from central's log
+    db.execute_query('UPDATE sync_outbox SET acked_at = NULL, status = NULL')
+    assert edge.push_all()['applied'] == 3
+    log = db.fetch_one('SELECT COUNT(*) as n FROM sync_ingest_log WHERE node_id = %s', (NODE,))['n']
+    assert log == 3 and central_seq() == 3
+
+
+def test_central_behind_resends_ops_still_in_the_outbox(edge):
+    record_clears(edge, 3)
+    edge.push_all()
+    restore_central(1)
+
+    record_clears(edge, 1)
+    with pytest.raises(RuntimeError) as raised:
+        edge.push_once()
+    assert not isinstance(raised.value, SyncHalted)
+    assert edge.push_all()['applied'] == 3
+    assert central_seq() == 4 and edge.halted() is None
+
+
+def test_central_behind_pruned_ops_halts_until_resync(edge, client, monkeypatch):
+    record_clears(edge, 3)
+    assert edge.push_all()['applied'] == 3
+
+    # Past the retention window: pruned, except the newest row (the next seq continues from it)
+    old = TimeService.get_db_timestamp() - timedelta(days=edge.retention_days + 1)
+    db.execute_query('UPDATE sync_outbox SET acked_at = %s', (old,))
+    edge.prune()
+    assert [row['seq'] for row in db.fetch_all('SELECT seq FROM sync_outbox')] == [3]
+    record_clears(edge, 1)
+    assert db.fetch_one('SELECT MAX(seq) as seq FROM sync_outbox')['seq'] == 4
+
+    restore_central(1)
+
+    with pytest.raises(SyncHalted):
+        edge.push_once()
+    halted = edge.halted()
+    assert halted['expectedSeq'] == 2 and halted['oldestSeq'] == 3
+    assert edge.status()['halted'] == halted
+
+    # Stays halted without asking central again
+    edge._post = lambda *args, **kwargs: pytest.fail('pushed while halted')
+    with pytest.raises(SyncHalted):
+        edge.push_once()
+
+    monkeypatch.setattr(health_controller, 'edge_sync', edge)
+    ready = client.get('/readyz')
+    assert ready.status_code == 503
+    assert ready.get_json()['checks']['sync']['ok'] is False
+
+
+def test_resync_skips_lost_ops_and_resumes(edge, client):
+    record_clears(edge, 3)
+    edge.push_all()
+    db.execute_query("UPDATE sync_outbox SET acked_at = %s",
+                     (TimeService.get_db_timestamp() - timedelta(days=edge.retention_days + 1),))
+    edge.prune()
+    record_clears(edge, 1)
+    restore_central(1)
+    with pytest.raises(SyncHalted):
+        edge.push_once()
+
+    result = edge.resync()
+    assert result['lastSeq'] == 2 and result['skipped'] == 1
+    assert edge.halted() is None
+
+    # Seq 3 was acknowledged before the restore: un-acked and sent again with 4
+    with pytest.raises(RuntimeError):
+        edge.push_once()
+    assert edge.push_all()['applied'] == 2
+    assert central_seq() == 4
+
+
+def test_resync_never_moves_central_back(edge, client):
+    record_clears(edge, 2)
+    edge.push_all()
+    response = client.post('/api/sync/resync', json={'node': NODE, 'lastSeq': 1},
+                           headers={'X-Sync-Token': TOKEN})
+    assert response.status_code == 409
+    assert response.get_json()['expectedSeq'] == 3
+    assert client.post('/api/sync/resync', json={'node': NODE, 'lastSeq': 1}).status_code == 401
@@ -0,0 +1,79 @@
+import json
+import threading
+import uuid
+import pytest
+from core import event_bus as event_bus_module
+from core.event_bus import EventBus, READ_CHUNK_BYTES, EVENT_MAX_TEXT
+
+
+@pytest.fixture
+def bus():
+    return EventBus(name=f'test-{uuid.uuid4().hex}')
+
+
+def read_with_deadline(bus, after, seconds=5):
+    """bus.read in a thread: a read that never returns fails instead of hanging the suite"""
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(value=bus.read(after)), daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), 'EventBus.read did not return'
+    return result['value']
+
+
+def append_raw(bus, data):
+    with open(bus._path(1), 'ab') as handle:
+        handle.write(data)
+
+
+def test_read_resumes_from_returned_id(bus):
+    bus.publish('trolley.cleared', {'trolley': 'TR-01'})
+    events, after, resync = read_with_deadline(bus, '0:0')
+    assert [event['data']['trolley'] for event in events] == ['TR-01'] and not resync
+
+    bus.publish('trolley.cleared', {'trolley': 'TR-02'})
+    events, _, _ = read_with_deadline(bus, after)
+    assert [event['data']['trolley'] for event in events] == ['TR-02']
+
+
+def test_read_steps_over_a_line_longer_than_one_chunk(bus):
+    bus.publish('trolley.cleared', {'trolley': 'TR-01'})
+    # Urdu text: json.dumps escapes each character to six bytes
+    remarks = 'ریمارکس' * (READ_CHUNK_BYTES // 20)
+    append_raw(bus, json.dumps({'type': 'trolley.attached', 'data': {'remarks': remarks}}).encode() + b'\n')
+    assert len(remarks) * 6 > READ_CHUNK_BYTES
+    bus.publish('trolley.cleared', {'trolley': 'TR-02'})
+
+    events, after, resync = read_with_deadline(bus, '0:0')
+    assert [event['type'] for event in events] == ['trolley.cleared', 'trolley.attached', 'trolley.cleared']
+    assert events[1]['data']['remarks'] == remarks
+    assert not resync
+    assert read_with_deadline(bus, after)[0] == []
+
+
+def test_read_waits_for_the_end_of_a_long_line_being_written(bus):
+    bus.publish('trolley.cleared', {'trolley': 'TR-01'})
+    append_raw(bus, b'{"type": "trolley.attached", "data": {"remarks": "' + b'x' * (READ_CHUNK_BYTES * 2))
+
+    events, after, _ = read_with_deadline(bus, '0:0')
+    assert [event['type'] for event in events] == ['trolley.cleared']
+    assert read_with_deadline(bus, after)[0] == []
+
+    append_raw(bus, b'"}}\n')
+    events, _, _ = read_with_deadline(bus, after)
+    assert [event['type'] for event in events] == ['trolley.attached']
+
+
+def test_publish_shortens_long_text(bus):
+    bus.publish('trolley.attached', {'trolley': 'TR-01', 'history': {'id': 1, 'remarks': 'ر' * 40000}})
+    event = read_with_deadline(bus, '0:0')[0][0]
+    assert event['data']['trolley'] == 'TR-01'
+    assert len(event['data']['history']['remarks']) == EVENT_MAX_TEXT + 1
+
+
+def test_publish_drops_the_history_row_of_an_oversized_event(bus, monkeypatch):
+    monkeypatch.setattr(event_bus_module, 'EVENT_MAX_BYTES', 1024)
+    history = {f'field_{index}': 'x' * EVENT_MAX_TEXT for index in range(20)}
+    bus.publish('trolley.attached', {'trolley': 'TR-01', 'history': history})
+    event = read_with_deadline(bus, '0:0')[0][0]
+    assert event['data'] == {'trolley': 'TR-01', 'truncated': True}
@@ -0,0 +1,56 @@
+import sqlite3
+import pytest
+from config.sqlite_backend import translate, boolean_match
+
+
+@pytest.mark.parametrize('mysql, sqlite', [
+    ('SELECT * FROM t WHERE a = %s AND b = %s', 'SELECT * FROM t WHERE a = ? AND b = ?'),
+    ("SELECT DATE_FORMAT(c, '%%Y') FROM t WHERE a = %s", "SELECT DATE_FORMAT(c, '%Y') FROM t WHERE a = ?"),
+    ('SELECT state FROM t WHERE a = %s FOR UPDATE', 'SELECT state FROM t WHERE a = ?'),
+    ('SELECT state FROM t WHERE a = %s\n            FOR   UPDATE', 'SELECT state FROM t WHERE a = ?'),
+    ('INSERT IGNORE INTO t (a) VALUES (%s)', 'INSERT OR IGNORE INTO t (a) VALUES (?)'),
+    ('insert  ignore into t (a) values (%s)', 'INSERT OR IGNORE into t (a) values (?)'),
+    (
+        'INSERT INTO t (k, v) VALUES (%s, %s) ON DUPLICATE KEY UPDATE v = VALUES(v), n = n + 1',
+        'INSERT INTO t (k, v) VALUES (?, ?) ON CONFLICT DO UPDATE SET v = excluded.v, n = n + 1',
+    ),
+    (
+        'SELECT id FROM h WHERE MATCH(a, b) AGAINST (%s IN BOOLEAN MODE) > 0',
+        'SELECT id FROM h WHERE BOOLEAN_MATCH(?, a, b) > 0',
+    ),
+    (
+        'SELECT MATCH (a, b) AGAINST ( %s  in boolean mode ) as score FROM h',
+        'SELECT BOOLEAN_MATCH(?, a, b) as score FROM h',
+    ),
+])
+def test_translate(mysql, sqlite):
+    assert translate(mysql) == sqlite
+
+
+def test_translate_without_parameters_keeps_percent_signs():
+    # mysql-connector only expands %s / %% when parameters are passed
+    assert translate("SELECT '%%' FROM t", substitute=False) == "SELECT '%%' FROM t"
+
+
+def test_translate_leaves_quoted_for_update_alone():
+    assert translate("SELECT * FROM t WHERE note = 'FOR UPDATE'") == "SELECT * FROM t WHERE note = 'FOR UPDATE'"
+
+
+def test_translated_upsert_runs_on_sqlite():
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE t (k TEXT PRIMARY KEY, v TEXT, n INTEGER DEFAULT 0)')
+    sql = translate('INSERT INTO t (k, v) VALUES (%s, %s) ON DUPLICATE KEY UPDATE v = VALUES(v), n = n + 1')
+    connection.execute(sql, ('a', 'first'))
+    connection.execute(sql, ('a', 'second'))
+    assert connection.execute('SELECT v, n FROM t').fetchall() == [('second', 1)]
+
+
+@pytest.mark.parametrize('expression, values, score', [
+    ('+"ali" +"tr-01"', ('Ali Textiles', 'TR-01'), 2),
+    ('+"ali" +"tr-09"', ('Ali Textiles', 'TR-01'), 0),
+    ('"ali" "tr-09"', ('Ali Textiles', 'TR-01'), 1),
+    ('+"ali" -"tr-01"', ('Ali Textiles', 'TR-01'), 0),
+    ('+"tr-0"', (None, 'TR-01'), 1),
+])
+def test_boolean_match(expression, values, score):
+    assert boolean_match(expression, *values) == score
@@ -0,0 +1,111 @@
+from config.database import db
+from app.controllers import history_controller
+
+
+def attach(client, trolley, lot_number, **fields):
+    response = client.post('/api/trolley/attach', json=dict(
+        barcode=trolley, customerName='Ali Textiles', lotNumber=lot_number,
+        designName='Rose', meters='1200', **fields
+    ))
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_attach_input_output_is_traced_through_history(client):
+    attach(client, 'TR-01', 'LOT-100')
+
+    response = client.post('/api/process/input', json={
+        'trolleyBarcode': 'TR-01', 'processBarcode': 'PR-01-in', 'processName': 'Dyeing'
+    })
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['data']['state'] == 'IN_PROCESS'
+
+    active = client.get('/api/process/active').get_json()
+    assert {station['barcode'] for station in active['data']} >= {'PR-01-in', 'PR-01-out'}
+
+    response = client.post('/api/process/output', json={'outputBarcode': 'PR-01-out', 'trolleyBarcode': 'TR-02'})
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['data']['destination'] == 'TR-02'
+
+    # State moved with the lot
+    assert client.get('/api/trolley/check/TR-01').get_json()['state'] == 'EMPTY'
+    assert client.get('/api/trolley/check/TR-02').get_json()['state'] == 'FULL'
+    active = client.get('/api/process/active').get_json()
+    assert not {station['barcode'] for station in active['data']} & {'PR-01-in', 'PR-01-out'}
+
+    history = client.get('/api/history/all').get_json()
+    lot_events = [row['event_type'] for row in history['data'] if row['lot_number'] == 'LOT-100']
+    assert lot_events == ['process_output', 'process_input', 'trolley_attached']
+
+    search = client.get('/api/history/search?query=LOT-100').get_json()
+    assert search['success'] and search['count'] == 3
+    assert client.get('/api/history/search?query=LOT-999').get_json()['count'] == 0
+
+    trolley = client.get('/api/history/trolley/TR-02').get_json()
+    assert [row['event_type'] for row in trolley['data']] == ['process_output']
+
+    lineage = client.get('/api/history/trolley/TR-01/lineage').get_json()
+    journey = lineage['data'][0]
+    assert journey['lotNumber'] == 'LOT-100'
+    assert journey['path'] == ['TR-01', 'PR-01', 'TR-02']
+    assert journey['complete'] is False
+
+    found = client.get('/api/barcode/search/TR-02').get_json()
+    assert found['found'] and found['barcodeType'] == 'trolley'
+
+
+def test_journey_is_complete_once_the_trolley_is_cleared(client):
+    attach(client, 'TR-03', 'LOT-200')
+    assert client.post('/api/process/input', json={
+        'trolleyBarcode': 'TR-03', 'processBarcode': 'PR-02-in', 'processName': 'Washing'
+    }).status_code == 200
+    assert client.post('/api/process/output', json={
+        'outputBarcode': 'PR-02-out', 'trolleyBarcode': 'TR-04'
+    }).status_code == 200
+    assert client.post('/api/trolley/clear/TR-04').status_code == 200
+
+    journey = client.get('/api/history/trolley/TR-04/lineage').get_json()['data'][0]
+    assert journey['lotNumber'] == 'LOT-200'
+    assert journey['complete'] is True
+    assert [hop['type'] for hop in journey['hops']] == ['trolley', 'process', 'trolley']
+
+
+def test_process_input_needs_a_full_trolley(client):
+    response = client.post('/api/process/input', json={
+        'trolleyBarcode': 'TR-09', 'processBarcode': 'PR-03-in', 'processName': 'Dyeing'
+    })
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_trolley_history_pages_with_a_cursor(client):
+    for number in range(5):
+        attach(client, 'TR-05', f'LOT-30{number}')
+
+    pages, cursor = [], None
+    while True:
+        url = '/api/history/trolley/TR-05?limit=2' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url).get_json()
+        assert page['success'], page
+        pages.append([row['id'] for row in page['data']])
+        cursor = page['nextCursor']
+        assert page['hasMore'] is (cursor is not None)
+        if not cursor:
+            break
+
+    assert [len(ids) for ids in pages] == [2, 2, 1]
+    ids = [event_id for ids in pages for event_id in ids]
+    assert ids == sorted(ids, reverse=True) and len(set(ids)) == 5
+
+    # Exactly `limit` rows: nothing more to fetch
+    exact = client.get('/api/history/trolley/TR-05?limit=5').get_json()
+    assert exact['count'] == 5 and exact['hasMore'] is False and exact['nextCursor'] is None
+
+
+def test_history_total_counts_the_default_window(client):
+    # Totals are cached per window for TOTAL_CACHE_TTL; earlier tests filled it
+    history_controller._total_cache.clear()
+    page = client.get('/api/history/all?limit=1').get_json()
+    assert page['window']['isDefault'] is True
+    total = db.fetch_one('SELECT COUNT(*) as total FROM tracking_history')['total']
+    assert page['pagination']['total'] == total